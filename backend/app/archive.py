@@ -0,0 +1,321 @@
+# app/archive.py
+"""
+Buyurtmalarni arxiv jadvallariga ko'chirish (orders/payments/attachments/comments
+-> *_archive). Issiq jadvallar kichik qoladi, ro'yxat va statistika tezlashadi.
+
+Arxivga tushadi:
+- soft-delete qilinganiga ARCHIVE_DELETED_AFTER_DAYS kundan oshgan buyurtmalar;
+- topshirilgan, to'liq to'langan va ARCHIVE_CLOSED_AFTER_DAYS kundan eski buyurtmalar.
+VerifiedDoc bog'langan buyurtmalar ko'chirilmaydi (tekshiruv sahifasi ishlashi kerak).
+
+Har bir batch bitta tranzaksiya: INSERT ... SELECT arxivga, keyin DELETE.
+Fayllar diskda qoladi — faqat metadata ko'chadi.
+
+    python -m app.archive --dry-run
+    python -m app.archive --batch 500 --max-batches 10
+    python -m app.archive --restore 123
+"""
+import argparse
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, delete, func, insert, literal, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import (
+    ARCHIVE_BATCH_SIZE,
+    ARCHIVE_CLOSED_AFTER_DAYS,
+    ARCHIVE_DELETED_AFTER_DAYS,
+)
+from app.events import publish
+
+# bolalar avval (ko'chirishda ham, o'chirishda ham), orders oxirida
+CHILDREN = (
+    (models.Comment.__table__, models.comments_archive),
+    (models.Attachment.__table__, models.attachments_archive),
+    (models.Payment.__table__, models.payments_archive),
+)
+ORDERS = (models.Order.__table__, models.orders_archive)
+
+
+class RestoreConflict(Exception):
+    pass
+
+
+def _candidates(now: datetime):
+    O = models.Order
+    deleted_cut = now - timedelta(days=ARCHIVE_DELETED_AFTER_DAYS)
+    closed_cut = now - timedelta(days=ARCHIVE_CLOSED_AFTER_DAYS)
+    verified = select(models.VerifiedDoc.order_id).where(
+        models.VerifiedDoc.order_id.isnot(None))
+    return (
+        select(O.id)
+        .where(
+            or_(
+                O.deleted_at < deleted_cut,
+                and_(
+                    O.deleted_at.is_(None),
+                    O.status == models.OrderStatus.topshirildi,
+                    O.payment_state == models.PaymentState.PAID,
+                    O.created_at < closed_cut,
+                ),
+            ),
+            O.id.not_in(verified),
+        )
+        .order_by(O.id)
+    )
+
+
+def _copy(db: Session, src, dst, where, stamp: datetime) -> int:
+    names = [c.name for c in src.columns]
+    res = db.execute(
+        insert(dst).from_select(
+            names + ["archived_at"],
+            select(*[src.c[n] for n in names], literal(stamp, dst.c.archived_at.type))
+            .where(where),
+        )
+    )
+    return res.rowcount or 0
+
+
+def archive_batch(db: Session, ids: list, stamp: datetime) -> dict:
+    """Berilgan buyurtmalarni bolalari bilan arxivga ko'chiradi (commit qilmaydi)."""
+    moved = {}
+    for src, dst in CHILDREN:
+        moved[src.name] = _copy(db, src, dst, src.c.order_id.in_(ids), stamp)
+    moved["orders"] = _copy(db, ORDERS[0], ORDERS[1], ORDERS[0].c.id.in_(ids), stamp)
+    for src, _ in CHILDREN:
+        db.execute(delete(src).where(src.c.order_id.in_(ids)))
+    db.execute(delete(ORDERS[0]).where(ORDERS[0].c.id.in_(ids)))
+    return moved
+
+
+def run_archive(db: Session, batch_size: int = ARCHIVE_BATCH_SIZE,
+                max_batches: Optional[int] = None, dry_run: bool = False) -> dict:
+    now = datetime.utcnow()
+    if dry_run:
+        total = db.scalar(select(func.count()).select_from(_candidates(now).subquery()))
+        return {"dry_run": True, "candidates": total or 0}
+
+    totals = {"orders": 0, "payments": 0, "attachments": 0, "comments": 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(db.scalars(_candidates(now).limit(batch_size)))
+        if not ids:
+            break
+        try:
+            moved = archive_batch(db, ids, now)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        batches += 1
+        for k, v in moved.items():
+            totals[k] += v
+        publish("orders.archived", order_ids=ids)
+    return {"dry_run": False, "batches": batches, "moved": totals}
+
+
+def restore_order(db: Session, order_id: int) -> Optional[dict]:
+    """
+    Oxirgi arxivlangan nusxani issiq jadvallarga qaytaradi (deleted_at tozalanadi).
+    Topilmasa None; id band bo'lsa RestoreConflict.
+    """
+    A = models.orders_archive
+    row = db.execute(
+        select(A.c.archive_id, A.c.archived_at)
+        .where(A.c.id == order_id)
+        .order_by(A.c.archive_id.desc())
+        .limit(1)
+    ).first()
+    if row is None:
+        return None
+    if db.get(models.Order, order_id) is not None:
+        raise RestoreConflict(f"Order #{order_id} allaqachon mavjud")
+
+    restored = {}
+    try:
+        # avval orders (FK), keyin bolalar — shu arxivlash batch'idagi yozuvlar
+        for src, dst in (ORDERS,) + CHILDREN:
+            names = [c.name for c in src.columns]
+            if dst is A:
+                where = dst.c.archive_id == row.archive_id
+            else:
+                where = and_(dst.c.order_id == order_id, dst.c.archived_at == row.archived_at)
+            res = db.execute(
+                insert(src).from_select(names, select(*[dst.c[n] for n in names]).where(where)))
+            restored[src.name] = res.rowcount or 0
+            db.execute(delete(dst).where(where))
+        db.execute(
+            update(models.Order.__table__)
+            .where(models.Order.__table__.c.id == order_id)
+            .values(deleted_at=None))
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise RestoreConflict(f"Order #{order_id}: id to'qnashuvi ({e.orig})")
+    publish("order.restored", order_id=order_id)
+    return restored
+
+
+# ---------------- o'qish (include_archived) ----------------
+
+
+def _names_join(A):
+    C, B, U = models.Client.__table__, models.Branch.__table__, models.User.__table__
+    return (
+        A.outerjoin(C, C.c.id == A.c.client_id)
+        .outerjoin(B, B.c.id == A.c.branch_id)
+        .outerjoin(U, U.c.id == A.c.manager_id),
+        C, B, U,
+    )
+
+
+def get_archived_order(db: Session, order_id: int) -> Optional[dict]:
+    """get_order() bilan bir xil shakl + archived/archived_at."""
+    A = models.orders_archive
+    src, C, B, U = _names_join(A)
+    o = db.execute(
+        select(A, C.c.full_name.label("client_name"), C.c.phone.label("client_phone"),
+               B.c.name.label("branch_name"), U.c.full_name.label("manager_name"))
+        .select_from(src)
+        .where(A.c.id == order_id)
+        .order_by(A.c.archive_id.desc())
+        .limit(1)
+    ).first()
+    if o is None:
+        return None
+
+    P, AT = models.payments_archive, models.attachments_archive
+    same_batch = lambda t: and_(t.c.order_id == order_id, t.c.archived_at == o.archived_at)
+    payments = db.execute(select(P).where(same_batch(P)).order_by(P.c.id)).all()
+    attachments = db.execute(select(AT).where(same_batch(AT)).order_by(AT.c.id)).all()
+
+    total = float(o.total_amount or 0)
+    paid = float(sum((p.amount or 0) for p in payments))
+    state = getattr(o.payment_state, "value", None) or "UNPAID"
+    from app.routers.orders import PAYMENT_STATE_LABELS
+    return {
+        "id": o.id,
+        "archived": True,
+        "archived_at": o.archived_at.strftime("%Y-%m-%d %H:%M") if o.archived_at else None,
+        "deleted": o.deleted_at is not None,
+        "client_name": o.client_name,
+        "client_phone": o.client_phone,
+        "created_at": o.created_at.strftime("%Y-%m-%d") if o.created_at else None,
+        "payment_status": PAYMENT_STATE_LABELS.get(state, state),
+        "payment_state": state,
+        "customer_type": getattr(o.customer_type, "value", None),
+        "doc_type": o.doc_type,
+        "country": o.country,
+        "branch": o.branch_name,
+        "manager": o.manager_name,
+        "deadline": o.deadline.strftime("%Y-%m-%d") if o.deadline else None,
+        "total_amount": total,
+        "paid_sum": paid,
+        "balance": total - paid,
+        "payment_method": getattr(o.payment_method, "value", None),
+        "status": getattr(o.status, "value", o.status),
+        "attachments": [
+            {
+                "id": a.id,
+                "display_name": a.original_name or a.filename,
+                "mime": a.mime,
+                "size": a.size or 0,
+                "created_at": a.created_at.strftime("%Y-%m-%d") if a.created_at else None,
+            }
+            for a in attachments
+        ],
+        "payments": [
+            {
+                "id": p.id,
+                "amount": float(p.amount or 0),
+                "method": getattr(p.method, "value", None),
+                "paid_at": p.paid_at.strftime("%Y-%m-%d") if p.paid_at else None,
+                "note": p.note,
+            }
+            for p in payments
+        ],
+    }
+
+
+def list_archived(db: Session, q: Optional[str], page: int, size: int) -> dict:
+    A, P = models.orders_archive, models.payments_archive
+    src, C, B, U = _names_join(A)
+    paid = (
+        select(P.c.order_id, P.c.archived_at,
+               func.coalesce(func.sum(P.c.amount), 0).label("paid"))
+        .group_by(P.c.order_id, P.c.archived_at)
+        .subquery()
+    )
+    src = src.outerjoin(paid, and_(paid.c.order_id == A.c.id,
+                                   paid.c.archived_at == A.c.archived_at))
+    stmt = select(
+        A.c.id, A.c.archived_at, A.c.deleted_at, A.c.created_at, A.c.status,
+        A.c.total_amount, func.coalesce(paid.c.paid, 0).label("paid"),
+        C.c.full_name.label("client_name"), C.c.phone.label("client_phone"),
+        B.c.name.label("branch_name"), U.c.full_name.label("manager_name"),
+    ).select_from(src)
+    if q:
+        like = f"%{q.strip()}%"
+        stmt = stmt.where(or_(C.c.full_name.ilike(like), C.c.phone.ilike(like)))
+
+    total = db.scalar(select(func.count()).select_from(stmt.subquery())) or 0
+    rows = db.execute(
+        stmt.order_by(A.c.archived_at.desc(), A.c.id.desc())
+        .offset((page - 1) * size).limit(size)
+    ).all()
+    return {
+        "total": total,
+        "page": page,
+        "size": size,
+        "rows": [
+            {
+                "id": r.id,
+                "archived_at": r.archived_at.strftime("%Y-%m-%d %H:%M") if r.archived_at else None,
+                "deleted": r.deleted_at is not None,
+                "client_name": r.client_name,
+                "client_phone": r.client_phone,
+                "branch": r.branch_name,
+                "manager": r.manager_name,
+                "created_at": r.created_at.strftime("%Y-%m-%d") if r.created_at else None,
+                "status": getattr(r.status, "value", r.status),
+                "total_amount": float(r.total_amount or 0),
+                "paid_sum": float(r.paid or 0),
+                "balance": float(r.total_amount or 0) - float(r.paid or 0),
+            }
+            for r in rows
+        ],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Buyurtmalarni arxivga ko'chirish")
+    ap.add_argument("--batch", type=int, default=ARCHIVE_BATCH_SIZE)
+    ap.add_argument("--max-batches", type=int, default=None)
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--restore", type=int, default=None, help="order id ni qaytarish")
+    args = ap.parse_args()
+
+    from app.database import SessionLocal, init_db
+    from app import cache
+    from app.events import bus
+    init_db()
+    # API keshlari bu jarayon yozuvlarini ham ko'rsin (EVENTS_BROKER_URL orqali)
+    cache.install(SessionLocal)
+    bus.start()
+    db = SessionLocal()
+    try:
+        if args.restore is not None:
+            res = restore_order(db, args.restore)
+            print("topilmadi" if res is None else f"qaytarildi: {res}")
+        else:
+            print(run_archive(db, args.batch, args.max_batches, args.dry_run))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
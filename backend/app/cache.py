@@ -0,0 +1,174 @@
+# app/cache.py
+"""
+Jarayon ichidagi kesh: TTL + jadvallar "avlod" (generation) hisoblagichlari.
+
+Har bir kesh yozuvi qaysi jadvallarga tayanishini biladi (masalan orders,
+payments). Session commit bo'lganda o'zgargan jadvallarning avlodi oshadi va
+ularga tayangan yozuvlar keyingi o'qishda eskirgan hisoblanadi — TTL tugashini
+kutish shart emas.
+
+O'zgargan jadvallar ikki yo'l bilan yig'iladi:
+- after_flush: session.new / dirty / deleted obyektlari;
+- do_orm_execute: session.execute(update/insert/delete(...)) DML so'rovlari.
+
+Bir nechta worker bo'lsa commit'dan keyin "_cache.invalidate" hodisasi event
+bus (EVENTS_BROKER_URL) orqali boshqa workerlarga yetkaziladi. Yozadigan har bir
+jarayon (API, python -m app.worker, CLI'lar) install() ni chaqirishi kerak.
+Brokersiz ko'p jarayonli o'rnatishda keshlar o'chiq (CACHE_ENABLED, config.py).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable
+
+from sqlalchemy import event
+
+from app.config import CACHE_ENABLED, EVENTS_BROKER_URL
+from app.events import bus
+
+INVALIDATE_EVENT = "_cache.invalidate"
+
+_gen_lock = threading.Lock()
+_generations: dict = {}
+
+
+def generation(*tables: str) -> tuple:
+    with _gen_lock:
+        return tuple(_generations.get(t, 0) for t in tables)
+
+
+def bump(tables: Iterable[str]) -> None:
+    with _gen_lock:
+        for t in tables:
+            _generations[t] = _generations.get(t, 0) + 1
+
+
+class TTLCache:
+    """LRU + TTL. Qiymat jadvallar avlodi bilan birga saqlanadi."""
+
+    def __init__(self, name: str, tables: Iterable[str], ttl: float = 60, maxsize: int = 256):
+        self.name = name
+        self.tables = tuple(tables)
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+
+    def get_or_set(self, key: Hashable, fn: Callable[[], object]):
+        if not CACHE_ENABLED:
+            return fn()
+        gen = generation(*self.tables)
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] == gen and item[1] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[2]
+            self.misses += 1
+        # hisoblash lock'siz: parallel so'rovlar bir-birini kutmaydi
+        value = fn()
+        with self._lock:
+            self._data[key] = (gen, now + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._data)
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "enabled": CACHE_ENABLED,
+            "tables": list(self.tables),
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+_caches: list = []
+
+
+def all_stats() -> list:
+    return [c.stats() for c in _caches]
+
+
+def metric_lines() -> list:
+    """metrics.registry.register() uchun: /metrics da keshlar hit/miss va hajmi."""
+    stats = all_stats()
+    out = []
+    for name, key, typ, help_ in (
+        ("crm_cache_hits_total", "hits", "counter", "Cache hits"),
+        ("crm_cache_misses_total", "misses", "counter", "Cache misses"),
+        ("crm_cache_entries", "size", "gauge", "Entries currently cached"),
+        ("crm_cache_hit_ratio", "hit_rate", "gauge", "Hits / (hits + misses)"),
+    ):
+        out.append(f"# HELP {name} {help_}")
+        out.append(f"# TYPE {name} {typ}")
+        for st in stats:
+            out.append(f'{name}{{cache="{st["name"]}"}} {st[key] or 0}')
+    return out
+
+
+# ---------------- Session hooks ----------------
+
+
+def _dirty(session) -> set:
+    return session.info.setdefault("cache_dirty_tables", set())
+
+
+def _after_flush(session, flush_context):
+    dirty = _dirty(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__table__", None)
+        if table is not None:
+            dirty.add(table.name)
+
+
+def _do_orm_execute(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, "table", None)
+        name = getattr(table, "name", None)
+        if name:
+            _dirty(state.session).add(name)
+
+
+def _after_commit(session):
+    tables = session.info.pop("cache_dirty_tables", None)
+    if not tables:
+        return
+    bump(tables)
+    if EVENTS_BROKER_URL:
+        bus.publish(INVALIDATE_EVENT, origin=bus.origin, tables=sorted(tables))
+
+
+def _after_rollback(session):
+    session.info.pop("cache_dirty_tables", None)
+
+
+def _on_event(ev) -> None:
+    # boshqa worker commit qildi — o'zimizniki allaqachon hisobga olingan
+    if ev.type == INVALIDATE_EVENT and ev.data.get("origin") != bus.origin:
+        bump(ev.data.get("tables") or ())
+
+
+def install(session_factory) -> None:
+    """SessionLocal'ga hooklarni ulaydi (main.py dan bir marta)."""
+    event.listen(session_factory, "after_flush", _after_flush)
+    event.listen(session_factory, "do_orm_execute", _do_orm_execute)
+    event.listen(session_factory, "after_commit", _after_commit)
+    event.listen(session_factory, "after_rollback", _after_rollback)
+    bus.add_listener(_on_event)
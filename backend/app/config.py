@@ -38,7 +38,6 @@ DATABASE_URL = _normalize_sqlite_url(RAW_DB_URL)
 # === Uploads ===
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 UPLOAD_DIR = (BACKEND_ROOT / UPLOAD_DIR).resolve().as_posix()
-Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
 
 # Ограничения и утилиты
 MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "15"))
@@ -70,8 +69,98 @@ CORS_ALLOW_CREDENTIALS = _get_bool("CORS_ALLOW_CREDENTIALS", True)
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 API_PREFIX = os.getenv("API_PREFIX", "/api")
 MAX_FILES_PER_UPLOAD = int(os.getenv("MAX_FILES_PER_UPLOAD", "10"))
+# POST /orders/{id}/upload/batch: bir vaqtda yoziladigan fayllar
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+# Yuklangan JPEG/PNG ni fon vazifasida normalizatsiya (EXIF burish, metadata olib
+# tashlash, kichraytirish, qayta siqish) — app/images.py
+IMAGE_NORMALIZE = _get_bool("IMAGE_NORMALIZE", False)
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", "3000"))   # uzun tomon, px
+IMAGE_MAX_DPI = int(os.getenv("IMAGE_MAX_DPI", "300"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "82"))
+IMAGE_KEEP_ORIGINAL = _get_bool("IMAGE_KEEP_ORIGINAL", False)
+# shundan katta (w*h) rasmlar ochilmaydi — decompression bomb / worker OOM
+IMAGE_MAX_DECODE_PIXELS = int(os.getenv("IMAGE_MAX_DECODE_PIXELS", "64000000"))
+# Bo'laklab yuklash (/orders/{id}/uploads): katta fayllar uchun alohida limit
+CHUNKED_UPLOAD_MAX_MB = int(os.getenv("CHUNKED_UPLOAD_MAX_MB", "200"))
+UPLOAD_CHUNK_MAX_MB = int(os.getenv("UPLOAD_CHUNK_MAX_MB", "8"))
+UPLOAD_SESSION_TTL_HOURS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))    # oxirgi bo'lakdan keyin
+UPLOAD_SESSION_CLEANUP_SEC = float(os.getenv("UPLOAD_SESSION_CLEANUP_SEC", "3600"))
 VERIFY_BASE_URL = os.getenv("VERIFY_BASE_URL", "http://127.0.0.1:8000/verify")
+# PATCH /orders/bulk da bir so'rovdagi maksimal id soni
+BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", "500"))
+# POST /payments/import: nechta qatordan keyin INSERT qilinadi
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+# GET /orders/export: DB dan bir martada olinadigan qatorlar (yield_per)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# SSE hodisalari (/orders/events)
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", "1000"))
+EVENTS_HEARTBEAT_SEC = float(os.getenv("EVENTS_HEARTBEAT_SEC", "15"))
+# bir nechta worker uchun: tcp://127.0.0.1:8765 (python -m app.events_broker)
+EVENTS_BROKER_URL = os.getenv("EVENTS_BROKER_URL", "")
+
+# /metrics va Server-Timing (standart o'chiq)
+METRICS_ENABLED = _get_bool("METRICS_ENABLED", False)
+
+# Sekin so'rovlar jurnali: chegaradan (ms) uzun SQL + EXPLAIN; 0 = o'chiq
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_SAMPLES = int(os.getenv("SLOW_QUERY_SAMPLES", "100"))
+
+# Talab bo'yicha profillash (X-Profile: 1, faqat admin). Natijalar UPLOAD_DIR yonida.
+# Diagnostika — standart o'chiq (METRICS_ENABLED kabi)
+PROFILER_ENABLED = _get_bool("PROFILER_ENABLED", False)
+PROFILE_DIR = os.getenv("PROFILE_DIR") or (Path(UPLOAD_DIR).parent / "profiles").as_posix()
+PROFILE_SAMPLE_MS = float(os.getenv("PROFILE_SAMPLE_MS", "1"))
+
+# /dashboard/summary keshi (soniya); yozuvlarda avtomatik yangilanadi
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "60"))
+# GET /orders va /orders/by-date natijalari keshi (filtrlar bo'yicha kalit); 0 = o'chiq
+ORDERS_CACHE_TTL = float(os.getenv("ORDERS_CACHE_TTL", "30"))
+ORDERS_CACHE_SIZE = int(os.getenv("ORDERS_CACHE_SIZE", "256"))
+
+# Fon vazifalari (app/jobs.py). Alohida worker: python -m app.worker
+JOBS_EMBEDDED_WORKER = _get_bool("JOBS_EMBEDDED_WORKER", True)  # API jarayoni ichida ham ishlatish
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+JOB_POLL_SEC = float(os.getenv("JOB_POLL_SEC", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SEC = float(os.getenv("JOB_BACKOFF_SEC", "5"))      # 5, 10, 20, ... (eksponensial)
+JOB_LEASE_SEC = int(os.getenv("JOB_LEASE_SEC", "300"))          # worker o'lsa shundan keyin qayta olinadi
+
+# Jarayon ichidagi keshlar (dashboard, orders.list, refdata). Boshqa jarayonning
+# yozuvlari (uvicorn --workers, alohida python -m app.worker) faqat EVENTS_BROKER_URL
+# orqali yetib keladi — brokersiz ular TTL tugaguncha ko'rinmaydi.
+# auto: broker bor yoki API yagona jarayon bo'lsa (WEB_CONCURRENCY<=1 va vazifalar
+# ichki workerda) yoqiladi; 1 — har doim (eskirish TTL bilan chegaralangan), 0 — o'chiq.
+_cache_mode = os.getenv("CACHE_ENABLED", "auto").strip().lower()
+if _cache_mode == "auto":
+    CACHE_ENABLED = bool(EVENTS_BROKER_URL) or (
+        int(os.getenv("WEB_CONCURRENCY", "1") or 1) <= 1 and JOBS_EMBEDDED_WORKER)
+else:
+    CACHE_ENABLED = _get_bool("CACHE_ENABLED", True)
+
+# Arxiv (python -m app.archive): o'chirilgan va eski yopilgan buyurtmalar
+ARCHIVE_DELETED_AFTER_DAYS = int(os.getenv("ARCHIVE_DELETED_AFTER_DAYS", "30"))
+ARCHIVE_CLOSED_AFTER_DAYS = int(os.getenv("ARCHIVE_CLOSED_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+# Fayl ombori tekshiruvi (python -m app.storage scan)
+STORAGE_SCAN_WORKERS = int(os.getenv("STORAGE_SCAN_WORKERS", "8"))
+STORAGE_SCAN_BATCH = int(os.getenv("STORAGE_SCAN_BATCH", "1000"))
+# yangi fayl qatori hali commit bo'lmagan bo'lishi mumkin — shundan yosh fayllar "yetim" emas
+STORAGE_ORPHAN_MIN_AGE_SEC = int(os.getenv("STORAGE_ORPHAN_MIN_AGE_SEC", "3600"))
+# ab/cd/ ga ko'chirish: bir batchdagi qatorlar va fon vazifasida batchlar orasidagi pauza
+STORAGE_MIGRATE_BATCH = int(os.getenv("STORAGE_MIGRATE_BATCH", "500"))
+STORAGE_MIGRATE_PAUSE_SEC = float(os.getenv("STORAGE_MIGRATE_PAUSE_SEC", "1"))
+STORAGE_QUARANTINE_DIR = os.getenv("STORAGE_QUARANTINE_DIR") or (Path(UPLOAD_DIR) / ".quarantine").as_posix()
+
+# Старт: печатать PRAGMA/URL базы при запуске (по умолчанию выкл.)
+DB_DIAGNOSTICS = _get_bool("DB_DIAGNOSTICS", False)
 
 # Папка для QR
 QR_DIR = (BACKEND_ROOT / "qr").resolve()
-QR_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def ensure_dirs() -> None:
+    """Создаёт рабочие папки. Вызывается из lifespan, а не при импорте."""
+    Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
+    QR_DIR.mkdir(parents=True, exist_ok=True)
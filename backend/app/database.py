@@ -1,6 +1,13 @@
-from sqlalchemy import create_engine, text
+import enum
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker
-from app.config import DATABASE_URL
+from app.config import DATABASE_URL, SLOW_QUERY_MS, SLOW_QUERY_SAMPLES
 # ВАЖНО: чтобы все модели были импортированы до create_all()
 from app.models import Base
 
@@ -13,6 +20,8 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+log = logging.getLogger(__name__)
+
 
 def get_session():
     db = SessionLocal()
@@ -22,42 +31,200 @@ def get_session():
         db.close()
 
 
-def _ensure_sqlite_columns():
+# Старые строки без kind считаем "other", а не дефолтом модели
+_LEGACY_DEFAULTS = {("attachments", "kind"): "'other'"}
+
+
+def _sql_default(column):
+    """Скалярный default колонки как SQL-литерал (для ALTER TABLE ... DEFAULT)."""
+    if column.server_default is not None and isinstance(
+            getattr(column.server_default, "arg", None), str):
+        return f"'{column.server_default.arg}'"
+    value = getattr(column.default, "arg", None)
+    if column.default is None or not column.default.is_scalar:
+        return None
+    if isinstance(value, enum.Enum):
+        value = value.name  # Enum-колонки хранят имя
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return None
+
+
+def _ensure_sqlite_columns(conn, existing_tables):
     """
-    Dev-хелпер: если в SQLite нет колонки attachments.kind — добавим.
-    Безопасно для пустой/небольшой dev-базы. В проде делайте Alembic.
+    Dev-хелпер: добавляет в SQLite колонки, которых нет в старой базе
+    (create_all существующие таблицы не меняет). NOT NULL не ставим —
+    SQLite не любит NOT NULL без дефолта. В проде делайте Alembic.
     """
-    if not DATABASE_URL.startswith("sqlite:///"):
+    if conn.dialect.name != "sqlite":
         return
-    with engine.begin() as conn:
-        cols = conn.execute(text("PRAGMA table_info(attachments);")).fetchall()
-        have_kind = any((c[1] == "kind") for c in cols)  # c[1] = name
-        if not have_kind:
-            # добавляем с DEFAULT, т.к. SQLite не любит NOT NULL без дефолта
-            conn.execute(
-                text("ALTER TABLE attachments ADD COLUMN kind TEXT DEFAULT 'other';"))
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        have = {c[1] for c in conn.execute(text(f"PRAGMA table_info({table.name});"))}
+        for col in table.columns:
+            if col.name in have:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(conn.dialect)}"
+            default = _LEGACY_DEFAULTS.get((table.name, col.name)) or _sql_default(col)
+            if default is not None:
+                ddl += f" DEFAULT {default}"
+            conn.execute(text(ddl))
+
+
+# Индексы, убранные из моделей: на старых базах их удаляем, чтобы не
+# замедляли запись (ix_orders_debt_aging — долг теперь считается по payments).
+_DROPPED_INDEXES = {"orders": ("ix_orders_debt_aging",)}
+
+
+def _ensure_indexes(conn, existing_tables):
+    """Новые индексы моделей на уже существующих таблицах (create_all их не трогает)."""
+    insp = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        have = {ix["name"] for ix in insp.get_indexes(table.name)}
+        for name in _DROPPED_INDEXES.get(table.name, ()):
+            if name in have:
+                conn.execute(text(f"DROP INDEX {name}"))
+        for idx in table.indexes:
+            if idx.name not in have:
+                idx.create(conn)
+
+
+def begin_write(db) -> None:
+    """
+    Блокировка на запись с начала транзакции. SQLite: BEGIN IMMEDIATE —
+    второй писатель ждёт (busy timeout) вместо SQLITE_BUSY при commit'е.
+    В Postgres ничего не делает — там блокируют строки (SELECT ... FOR UPDATE).
+    """
+    conn = db.connection()
+    if conn.dialect.name != "sqlite":
+        return
+    if not conn.connection.dbapi_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
 
 
 def init_db():
-    # Создаст таблицы, если их ещё нет (не меняет существующие)
-    Base.metadata.create_all(bind=engine)
-    # Пропатчит недостающую колонку (dev)
-    _ensure_sqlite_columns()
+    """
+    Одна проверка схемы при старте: список таблиц читается один раз,
+    создаются только отсутствующие, затем (SQLite) недостающие колонки
+    и недостающие индексы.
+    """
+    with engine.begin() as conn:
+        existing = set(inspect(conn).get_table_names())
+        missing = [t for t in Base.metadata.sorted_tables if t.name not in existing]
+        if missing:
+            # checkfirst: в Postgres ENUM-типы могут уже существовать (общие с другими таблицами)
+            Base.metadata.create_all(conn, tables=missing)
+        _ensure_sqlite_columns(conn, existing)
+        _ensure_indexes(conn, existing)
+
+
+# --- Медленные запросы (SLOW_QUERY_MS > 0) ---
+# Последние SLOW_QUERY_SAMPLES штук лежат в кольцевом буфере,
+# смотреть через GET /admin/slow-queries.
+slow_queries = deque(maxlen=max(1, SLOW_QUERY_SAMPLES))
+_slow_lock = threading.Lock()
 
 
-# --- Диагностика при старте ---
-try:
-    with engine.connect() as conn:
-        print("DB URL (effective):", DATABASE_URL)
-        try:
+def _redact(value):
+    """Строки/байты не пишем в лог как есть — только тип и длину."""
+    if isinstance(value, dict):
+        return {k: _redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_redact(v) for v in value]
+    if isinstance(value, str):
+        return f"<str:{len(value)}>"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<bytes:{len(value)}>"
+    if isinstance(value, (int, float)) or value is None:
+        return value
+    return f"<{type(value).__name__}>"
+
+
+def _explain(cursor, statement, parameters):
+    """План запроса отдельным курсором на том же соединении (только SELECT)."""
+    if not statement.lstrip().lower().startswith(("select", "with")):
+        return None
+    if engine.dialect.name == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    elif engine.dialect.name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        prefix = "EXPLAIN "
+    cur = cursor.connection.cursor()
+    try:
+        cur.execute(prefix + statement, parameters)
+        rows = cur.fetchall()
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        cur.close()
+    if engine.dialect.name == "sqlite":
+        # (id, parent, notused, detail)
+        return [str(r[-1]) for r in rows]
+    return [str(r[0]) for r in rows]
+
+
+def _slow_before(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._slow_t0 = time.perf_counter()
+
+
+def _slow_after(conn, cursor, statement, parameters, context, executemany):
+    t0 = getattr(context, "_slow_t0", None)
+    if t0 is None:
+        return
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+
+    from app.metrics import current_request
+    req = current_request.get()
+    sample = {
+        "ts": datetime.utcnow().isoformat(timespec="seconds"),
+        "duration_ms": round(elapsed_ms, 2),
+        "route": f"{req.scope.get('method')} {req.route}" if req else None,
+        "statement": statement,
+        "params": _redact(parameters),
+        "plan": None if executemany else _explain(cursor, statement, parameters),
+    }
+    with _slow_lock:
+        slow_queries.append(sample)
+    short = " ".join(statement.split())[:200]
+    log.warning("slow query %sms [%s]: %s", sample["duration_ms"], sample["route"], short)
+
+
+def slow_query_samples():
+    with _slow_lock:
+        return list(reversed(slow_queries))
+
+
+def clear_slow_queries():
+    with _slow_lock:
+        slow_queries.clear()
+
+
+if SLOW_QUERY_MS > 0:
+    event.listen(engine, "before_cursor_execute", _slow_before)
+    event.listen(engine, "after_cursor_execute", _slow_after)
+
+
+def print_diagnostics():
+    """Диагностика базы (DB_DIAGNOSTICS=1), вызывается из lifespan."""
+    try:
+        with engine.connect() as conn:
+            print("DB URL (effective):", DATABASE_URL)
+            if conn.dialect.name != "sqlite":
+                return
             print("PRAGMA database_list:", conn.execute(
                 text("PRAGMA database_list;")).all())
-        except Exception:
-            pass  # не sqlite — ок
-        try:
             print("attachments columns (runtime):", conn.execute(
                 text("PRAGMA table_info(attachments);")).all())
-        except Exception:
-            pass
-except Exception as e:
-    print("DB connection diagnostic failed:", e)
+    except Exception as e:
+        print("DB connection diagnostic failed:", e)
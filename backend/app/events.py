@@ -0,0 +1,313 @@
+# app/events.py
+"""
+Buyurtmalar o'zgarishlari uchun jarayon ichidagi pub/sub.
+
+Yozuvchi endpointlar commit'dan keyin `publish(...)` chaqiradi, `/orders/events`
+SSE oqimi esa `bus.subscribe()` orqali eshitadi. Oxirgi EVENTS_BUFFER_SIZE ta
+hodisa halqa buferda turadi — `Last-Event-ID` bilan qayta ulanganda shu yerdan
+davom ettiriladi.
+
+Bir nechta uvicorn worker bo'lsa EVENTS_BROKER_URL (masalan
+tcp://127.0.0.1:8765) berib `python -m app.events_broker` ni ishga tushiring:
+shunda id'larni broker beradi va hamma worker bir xil oqimni ko'radi.
+
+id'lar "davr" (epoch) ichida ketma-ket: broker har ishga tushganda yangi epoch
+oladi, brokersiz (yoki u uzilganda) publish o'zining lokal epoch'ini ochadi.
+Epoch almashganda bufer tozalanadi va SSE mijozlar "reset" oladi. SSE id —
+"<epoch>-<id>".
+"""
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from uuid import uuid4
+
+from app.config import EVENTS_BUFFER_SIZE, EVENTS_BROKER_URL
+
+log = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+@dataclass
+class Event:
+    id: int
+    type: str
+    data: dict
+    ts: float = field(default_factory=time.time)
+    epoch: str = ""
+
+    @property
+    def internal(self) -> bool:
+        """'_' bilan boshlangan turlar faqat serverlar uchun (SSE'ga chiqmaydi)."""
+        return self.type.startswith("_")
+
+    def to_sse(self) -> str:
+        payload = json.dumps(
+            {"type": self.type, "ts": self.ts, **self.data}, ensure_ascii=False, default=str)
+        return f"id: {self.epoch}-{self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class Subscription:
+    """Bitta SSE ulanish navbati. Istalgan threaddan xavfsiz to'ldiriladi."""
+
+    def __init__(self, bus: "EventBus", loop: asyncio.AbstractEventLoop):
+        self._bus = bus
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # navbat to'lib qolsa True bo'ladi — o'quvchi buferdan qayta tiklaydi
+        self.lagged = False
+
+    def _put(self, ev: Event):
+        try:
+            self._queue.put_nowait(ev)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    def push(self, ev: Event):
+        try:
+            self._loop.call_soon_threadsafe(self._put, ev)
+        except RuntimeError:
+            # loop yopilgan — ulanish allaqachon uzilgan
+            self._bus.unsubscribe(self)
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, buffer_size: int = 1000, broker_url: str = ""):
+        self._lock = threading.Lock()
+        self._buffer: deque = deque(maxlen=max(1, buffer_size))
+        self._last_id = 0
+        self._subs: set = set()
+        self._listeners: list = []
+        self._broker: Optional["_BrokerClient"] = None
+        self._broker_url = broker_url
+        self.origin = uuid4().hex
+        self.epoch = self._local_epoch()
+        # brokerdan olingan oxirgi (epoch, id) — dublikatlar va qayta ulanish uchun
+        self._broker_epoch: Optional[str] = None
+        self._broker_seq = 0
+
+    @staticmethod
+    def _local_epoch() -> str:
+        return "l" + uuid4().hex[:12]
+
+    def _reset(self, epoch: str) -> None:
+        """Yangi id fazosi (lock ostida chaqiriladi): eski bufer boshqa davrniki."""
+        log.info("events epoch %s -> %s", self.epoch, epoch)
+        self.epoch = epoch
+        self._last_id = 0
+        self._buffer.clear()
+
+    # ---- publish / deliver ----
+
+    def publish(self, type_: str, **data: Any) -> None:
+        """Hodisani e'lon qiladi. Endpointlar buni commit'dan keyin chaqiradi."""
+        broker = self._get_broker()
+        if broker is not None and broker.send(
+                {"origin": self.origin, "type": type_, "data": data}):
+            return  # id'ni broker beradi va hodisa bizga qaytib keladi
+        # id berish va buferga qo'shish bitta kritik bo'limda — parallel
+        # publish'lar (threadpool endpointlar) bir xil id olmaydi
+        with self._lock:
+            if not self.epoch.startswith("l"):
+                # broker id'lari bilan bitta hisoblagichni bo'lishmaymiz
+                self._reset(self._local_epoch())
+            self._last_id += 1
+            ev = Event(id=self._last_id, type=type_, data=data, epoch=self.epoch)
+            self._buffer.append(ev)
+            subs = list(self._subs)
+            listeners = list(self._listeners)
+        self._fanout(ev, subs, listeners)
+
+    def _deliver(self, ev: Event) -> None:
+        """Brokerdan kelgan hodisa (id va epoch'ni broker bergan)."""
+        with self._lock:
+            if ev.epoch == self._broker_epoch and ev.id <= self._broker_seq:
+                return  # dublikat (broker qayta yuborgan)
+            self._broker_epoch, self._broker_seq = ev.epoch, ev.id
+            if ev.epoch != self.epoch:
+                self._reset(ev.epoch)  # broker qayta ishga tushgan yoki lokal rejimdan qaytdik
+            self._last_id = ev.id
+            self._buffer.append(ev)
+            subs = list(self._subs)
+            listeners = list(self._listeners)
+        self._fanout(ev, subs, listeners)
+
+    @staticmethod
+    def _fanout(ev: Event, subs: list, listeners: list) -> None:
+        for fn in listeners:
+            try:
+                fn(ev)
+            except Exception:
+                log.exception("event listener failed: %s", ev.type)
+        for s in subs:
+            s.push(ev)
+
+    def add_listener(self, fn) -> None:
+        """Jarayon ichidagi obunachi (masalan kesh): fn(event) har bir hodisada chaqiriladi."""
+        with self._lock:
+            self._listeners.append(fn)
+
+    # ---- read side ----
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def position(self) -> tuple:
+        """(epoch, last_id) — bir vaqtda o'qilgan."""
+        with self._lock:
+            return self.epoch, self._last_id
+
+    def broker_position(self) -> tuple:
+        with self._lock:
+            return self._broker_epoch, self._broker_seq
+
+    def since(self, last_id: int, epoch: Optional[str]) -> Optional[list]:
+        """
+        epoch/last_id dan keyingi hodisalar. Boshqa davr yoki bufer bu nuqtani
+        qamrab olmasa None (mijoz ro'yxatni to'liq qayta yuklashi kerak).
+        """
+        with self._lock:
+            if epoch != self.epoch:
+                return None
+            if last_id > self._last_id:
+                return None  # boshqa "davr" id'si (worker qayta ishga tushgan)
+            if last_id == self._last_id:
+                return []
+            if not self._buffer or self._buffer[0].id > last_id + 1:
+                return None
+            return [ev for ev in self._buffer if ev.id > last_id]
+
+    def subscribe(self) -> Subscription:
+        self._get_broker()
+        sub = Subscription(self, asyncio.get_running_loop())
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "epoch": self.epoch,
+                "last_id": self._last_id,
+                "buffered": len(self._buffer),
+                "subscribers": len(self._subs),
+                "broker": self._broker_url or None,
+                "broker_connected": bool(self._broker and self._broker.connected),
+            }
+
+    # ---- broker ----
+
+    def start(self) -> None:
+        """Brokerga ulanishni oldindan ochadi (app startup'da chaqiriladi)."""
+        broker = self._get_broker()
+        if broker is not None:
+            broker.wait_connected(timeout=2)
+
+    def _get_broker(self) -> Optional["_BrokerClient"]:
+        if not self._broker_url:
+            return None
+        if self._broker is None:
+            with self._lock:
+                if self._broker is None:
+                    self._broker = _BrokerClient(self, self._broker_url)
+                    self._broker.start()
+        return self._broker
+
+
+def parse_broker_url(url: str) -> tuple:
+    """'tcp://host:port' -> (host, port)"""
+    rest = url.split("://", 1)[-1]
+    host, _, port = rest.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class _BrokerClient(threading.Thread):
+    """
+    app.events_broker ga ulanadigan fon thread. Protokol — qatorma-qator JSON.
+    Ulanish uzilsa qayta ulanadi va o'tkazib yuborilgan hodisalarni so'raydi.
+    """
+
+    def __init__(self, bus: EventBus, url: str):
+        super().__init__(name="events-broker-client", daemon=True)
+        self._bus = bus
+        self._addr = parse_broker_url(url)
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self.connected = False
+        self._ready = threading.Event()
+
+    def wait_connected(self, timeout: float) -> bool:
+        return self._ready.wait(timeout)
+
+    def send(self, msg: dict) -> bool:
+        line = (json.dumps(msg, ensure_ascii=False, default=str) + "\n").encode()
+        with self._send_lock:
+            if not self.connected or self._sock is None:
+                return False
+            try:
+                self._sock.sendall(line)
+                return True
+            except OSError:
+                self.connected = False
+                return False
+
+    def run(self):
+        backoff = 0.5
+        while True:
+            try:
+                sock = socket.create_connection(self._addr, timeout=5)
+                sock.settimeout(None)
+                with self._send_lock:
+                    self._sock = sock
+                    epoch, seq = self._bus.broker_position()
+                    sock.sendall((json.dumps({"hello": seq, "epoch": epoch}) + "\n").encode())
+                    self.connected = True
+                self._ready.set()
+                backoff = 0.5
+                log.info("events broker connected: %s:%s", *self._addr)
+                for raw in sock.makefile("rb"):
+                    msg = json.loads(raw)
+                    self._bus._deliver(Event(
+                        id=int(msg["id"]), type=msg["type"],
+                        data=msg.get("data") or {}, ts=msg.get("ts") or time.time(),
+                        epoch=str(msg.get("epoch") or "")))
+            except (OSError, ValueError) as e:
+                log.warning("events broker unavailable (%s), retry in %.1fs", e, backoff)
+            finally:
+                self.connected = False
+                with self._send_lock:
+                    if self._sock is not None:
+                        try:
+                            self._sock.close()
+                        except OSError:
+                            pass
+                        self._sock = None
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 10)
+
+
+bus = EventBus(EVENTS_BUFFER_SIZE, EVENTS_BROKER_URL)
+
+
+def publish(type_: str, **data: Any) -> None:
+    bus.publish(type_, **data)
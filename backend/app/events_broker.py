@@ -0,0 +1,103 @@
+# app/events_broker.py
+"""
+Bir nechta uvicorn worker uchun oddiy lokal hodisa brokeri (Redis o'rniga).
+
+    python -m app.events_broker --host 127.0.0.1 --port 8765
+
+Workerlar EVENTS_BROKER_URL=tcp://127.0.0.1:8765 bilan ulanadi. Broker har bir
+hodisaga ketma-ket id beradi, uni hamma ulanishlarga tarqatadi va oxirgi
+EVENTS_BUFFER_SIZE tasini saqlaydi: qayta ulangan worker {"hello": last_id,
+"epoch": ...} yuboradi va o'tkazib yuborganlarini oladi. id'lar har ishga
+tushishda 1 dan boshlanadi, shuning uchun har hodisada broker epoch'i bor —
+workerlar yangi epoch'ni ko'rib o'z hisoblagichini tashlaydi.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from uuid import uuid4
+
+from app.config import EVENTS_BUFFER_SIZE
+
+log = logging.getLogger("events_broker")
+
+
+class Broker:
+    def __init__(self, buffer_size: int):
+        self.seq = 0
+        self.epoch = uuid4().hex[:12]
+        self.buffer: deque = deque(maxlen=max(1, buffer_size))
+        self.clients: set = set()
+
+    def _line(self, msg: dict) -> bytes:
+        return (json.dumps(msg, ensure_ascii=False) + "\n").encode()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        self.clients.add(writer)
+        log.info("worker connected: %s (%d total)", peer, len(self.clients))
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                try:
+                    msg = json.loads(raw)
+                except ValueError:
+                    continue
+
+                if "hello" in msg:
+                    # boshqa epoch'dagi id bizda ma'nosiz — butun buferni beramiz
+                    last = int(msg["hello"] or 0) if msg.get("epoch") == self.epoch else 0
+                    for ev in self.buffer:
+                        if ev["id"] > last:
+                            writer.write(self._line(ev))
+                    await writer.drain()
+                    continue
+
+                self.seq += 1
+                ev = {
+                    "id": self.seq,
+                    "epoch": self.epoch,
+                    "type": msg.get("type"),
+                    "data": msg.get("data") or {},
+                    "origin": msg.get("origin"),
+                    "ts": time.time(),
+                }
+                self.buffer.append(ev)
+                line = self._line(ev)
+                for w in list(self.clients):
+                    try:
+                        w.write(line)
+                    except Exception:
+                        self.clients.discard(w)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+            log.info("worker disconnected: %s", peer)
+
+
+async def serve(host: str, port: int, buffer_size: int):
+    broker = Broker(buffer_size)
+    server = await asyncio.start_server(broker.handle, host, port)
+    log.info("events broker listening on %s:%s", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lingua CRM events broker")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--buffer", type=int, default=EVENTS_BUFFER_SIZE)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(serve(args.host, args.port, args.buffer))
+
+
+if __name__ == "__main__":
+    main()
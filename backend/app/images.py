@@ -0,0 +1,98 @@
+# app/images.py
+"""
+Telefon rasmlarini (JPEG/PNG) saqlashdan keyin normalizatsiya qilish.
+
+- EXIF bo'yicha burish (exif_transpose), so'ng barcha metadata tashlanadi;
+- uzun tomon IMAGE_MAX_PIXELS dan yoki DPI IMAGE_MAX_DPI dan katta bo'lsa kichraytiriladi;
+- JPEG IMAGE_JPEG_QUALITY bilan (progressive), PNG optimize bilan qayta yoziladi.
+
+Format o'zgarmaydi (mime/kengaytma bir xil qoladi) va fayl o'sha kalit ostida
+almashtiriladi. Upload endpointlari IMAGE_NORMALIZE=1 bo'lsa "image.normalize"
+vazifasini qo'yadi — javob kutmaydi, ish worker pool'da (app/tasks.py).
+Burish/kichraytirish/EXIF bo'lmasa va natija kichik chiqmasa fayl almashtirilmaydi.
+Sarlavhadagi o'lcham IMAGE_MAX_DECODE_PIXELS dan katta bo'lsa rasm yechilmaydi.
+"""
+import io
+import logging
+import os
+from typing import Optional
+
+from app.config import (
+    IMAGE_JPEG_QUALITY,
+    IMAGE_MAX_DECODE_PIXELS,
+    IMAGE_MAX_DPI,
+    IMAGE_MAX_PIXELS,
+    IMAGE_NORMALIZE,
+)
+
+log = logging.getLogger(__name__)
+
+MIMES = {"image/jpeg": "JPEG", "image/png": "PNG"}
+
+
+def wants_normalize(mime: Optional[str]) -> bool:
+    return mime in MIMES
+
+
+def normalize(path: str, mime: str) -> Optional[bytes]:
+    """Yangi fayl baytlari yoki None (o'zgartirish foydasiz)."""
+    from PIL import Image, ImageOps  # og'ir — faqat workerda yuklanadi
+
+    # Pillow o'zi ham 2x dan kattasida DecompressionBombError beradi
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_DECODE_PIXELS or None
+    fmt = MIMES[mime]
+    try:
+        src = Image.open(path)
+    except Image.DecompressionBombError as e:
+        log.warning("image too large to normalize: %s (%s)", path, e)
+        return None  # qayta urinish foydasiz
+    with src:
+        # open() faqat sarlavhani o'qiydi — piksel yechishdan oldin tekshiramiz
+        if IMAGE_MAX_DECODE_PIXELS and src.width * src.height > IMAGE_MAX_DECODE_PIXELS:
+            log.warning("image too large to normalize (%sx%s): %s", src.width, src.height, path)
+            return None
+        src.load()
+        dpi = src.info.get("dpi")
+        # EXIF (GPS, qurilma va h.k.) bor bo'lsa fayl baribir qayta yoziladi
+        changed = bool(src.info.get("exif")) or src.getexif().get(0x0112, 1) != 1
+        img = ImageOps.exif_transpose(src)
+
+    scale = 1.0
+    long_side = max(img.size)
+    if IMAGE_MAX_PIXELS and long_side > IMAGE_MAX_PIXELS:
+        scale = IMAGE_MAX_PIXELS / long_side
+    src_dpi = float(max(dpi)) if dpi else 0.0
+    if IMAGE_MAX_DPI and src_dpi > IMAGE_MAX_DPI:
+        scale = min(scale, IMAGE_MAX_DPI / src_dpi)
+    if scale < 1.0:
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(size, Image.LANCZOS)
+        changed = True
+
+    out = io.BytesIO()
+    # exif/icc/pnginfo berilmaydi — metadata yangi faylga o'tmaydi
+    params = {}
+    if src_dpi:
+        new_dpi = round(min(src_dpi * scale, IMAGE_MAX_DPI or src_dpi))
+        params["dpi"] = (new_dpi, new_dpi)
+    if fmt == "JPEG":
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(out, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True, **params)
+    else:
+        img.save(out, "PNG", optimize=True, **params)
+    data = out.getvalue()
+    if not changed and len(data) >= os.path.getsize(path):
+        return None
+    return data
+
+
+def queue_normalize(db, attachments) -> None:
+    """Yangi (flush qilingan) Attachment'lar uchun vazifa — upload bilan bitta commit."""
+    if not IMAGE_NORMALIZE:
+        return
+    from app.jobs import enqueue
+
+    for a in attachments:
+        if wants_normalize(a.mime):
+            enqueue(db, "image.normalize", {"attachment_id": a.id})
@@ -0,0 +1,247 @@
+# app/jobs.py
+"""
+Ilova bazasidagi (jobs jadvali) doimiy fon vazifalari navbati.
+
+    enqueue(db, "qr.render", {...})   # chaqiruvchining tranzaksiyasida —
+                                      # ma'lumot bilan birga commit bo'ladi
+    python -m app.worker              # alohida worker (yoki JOBS_EMBEDDED_WORKER)
+
+Navbatdan olish bitta UPDATE ... RETURNING: Postgres'da ichki SELECT
+`FOR UPDATE SKIP LOCKED` bilan (bir nechta worker bir-birini kutmaydi),
+SQLite'da yozuvchilar baribir ketma-ket. Olingan vazifa JOB_LEASE_SEC ga
+"ijaraga" beriladi — worker o'lib qolsa, muddat o'tgach boshqasi oladi.
+Xatoda JOB_BACKOFF_SEC * 2^(urinish-1) kutib qayta uriniladi,
+JOB_MAX_ATTEMPTS dan keyin status=failed.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import and_, event, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import (
+    JOB_BACKOFF_SEC,
+    JOB_CONCURRENCY,
+    JOB_LEASE_SEC,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_SEC,
+)
+
+log = logging.getLogger(__name__)
+
+STATUSES = ("queued", "running", "done", "failed")
+
+_handlers: dict = {}
+_wake = threading.Event()
+
+
+def handler(kind: str):
+    """@handler("qr.render") — fn(db, payload) vazifani bajaradi (xato -> qayta urinish)."""
+    def deco(fn: Callable[[Session, dict], None]):
+        _handlers[kind] = fn
+        return fn
+    return deco
+
+
+def enqueue(db: Session, kind: str, payload: Optional[dict] = None, *,
+            delay: float = 0, max_attempts: int = JOB_MAX_ATTEMPTS) -> models.Job:
+    """Vazifani sessiyaga qo'shadi (commit chaqiruvchida). id flush'dan keyin bor."""
+    job = models.Job(
+        kind=kind,
+        payload=json.dumps(payload or {}, ensure_ascii=False, default=str),
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.add(job)
+    db.flush()
+    db.info["jobs_enqueued"] = True
+    return job
+
+
+def _after_commit(session):
+    if session.info.pop("jobs_enqueued", False):
+        _wake.set()  # shu jarayondagi worker poll'ni kutmasin
+
+
+def install(session_factory) -> None:
+    event.listen(session_factory, "after_commit", _after_commit)
+
+
+def claim(db: Session, worker_id: str, limit: int) -> list:
+    """Navbatdan `limit` tagacha vazifani atomar oladi."""
+    J = models.Job
+    now = datetime.utcnow()
+    # ijarasi tugagan va urinishlari tugagan — worker'ni o'ldirayotgan bo'lishi
+    # mumkin (masalan, katta rasmda OOM), qayta olinmaydi
+    db.execute(
+        update(J)
+        .where(J.status == "running", J.locked_until < now, J.attempts >= J.max_attempts)
+        .values(status="failed", finished_at=now, locked_by=None, locked_until=None,
+                last_error="lease expired on the last attempt (worker died?)")
+    )
+    ready = (
+        select(J.id)
+        .where(or_(
+            and_(J.status == "queued", J.run_at <= now),
+            # ijarasi tugagan "running" — worker o'lgan
+            and_(J.status == "running", J.locked_until < now, J.attempts < J.max_attempts),
+        ))
+        .order_by(J.run_at, J.id)
+        .limit(limit)
+    )
+    if db.bind.dialect.name == "postgresql":
+        ready = ready.with_for_update(skip_locked=True)
+    stmt = (
+        update(J)
+        .where(J.id.in_(ready.scalar_subquery()))
+        .values(status="running", locked_by=worker_id,
+                locked_until=now + timedelta(seconds=JOB_LEASE_SEC),
+                attempts=J.attempts + 1)
+        .returning(J.id, J.kind, J.payload, J.attempts, J.max_attempts)
+    )
+    rows = db.execute(stmt).all()
+    db.commit()
+    return rows
+
+
+def _finish(db: Session, job_id: int, worker_id: str, **values) -> None:
+    J = models.Job
+    db.execute(
+        update(J)
+        .where(J.id == job_id, J.locked_by == worker_id, J.status == "running")
+        .values(locked_by=None, locked_until=None, **values)
+    )
+    db.commit()
+
+
+def run_one(session_factory, worker_id: str, row) -> None:
+    fn = _handlers.get(row.kind)
+    db = session_factory()
+    try:
+        if fn is None:
+            raise LookupError(f"handler yo'q: {row.kind}")
+        fn(db, json.loads(row.payload or "{}"))
+        db.commit()
+        _finish(db, row.id, worker_id, status="done", finished_at=datetime.utcnow(),
+                last_error=None)
+    except Exception as e:
+        db.rollback()
+        err = f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=5)}"
+        if row.attempts >= row.max_attempts:
+            log.error("job %s (%s) failed permanently: %s", row.id, row.kind, e)
+            _finish(db, row.id, worker_id, status="failed", finished_at=datetime.utcnow(),
+                    last_error=err)
+        else:
+            delay = JOB_BACKOFF_SEC * (2 ** (row.attempts - 1))
+            log.warning("job %s (%s) attempt %s failed, retry in %.0fs: %s",
+                        row.id, row.kind, row.attempts, delay, e)
+            _finish(db, row.id, worker_id, status="queued", last_error=err,
+                    run_at=datetime.utcnow() + timedelta(seconds=delay))
+    finally:
+        db.close()
+
+
+class Worker:
+    """
+    Poll + ThreadPoolExecutor. Bo'sh joy bo'lgandagina navbatdan oladi, shuning
+    uchun bir vaqtda `concurrency` tadan ortiq vazifa ishlamaydi.
+    """
+
+    def __init__(self, session_factory, concurrency: int = JOB_CONCURRENCY,
+                 poll: float = JOB_POLL_SEC):
+        self.session_factory = session_factory
+        self.concurrency = max(1, concurrency)
+        self.poll = poll
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{id(self) % 10000}"
+        self._stop = threading.Event()
+        self._busy = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _done(self, _fut):
+        with self._lock:
+            self._busy -= 1
+        _wake.set()
+
+    def run(self, once: bool = False) -> None:
+        """once=True: navbat bo'shaguncha ishlab chiqadi (CLI/test uchun)."""
+        pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix="job")
+        log.info("job worker %s started (concurrency=%s)", self.id, self.concurrency)
+        try:
+            while not self._stop.is_set():
+                with self._lock:
+                    free = self.concurrency - self._busy
+                rows = []
+                if free > 0:
+                    db = self.session_factory()
+                    try:
+                        rows = claim(db, self.id, free)
+                    except Exception:
+                        log.exception("job claim failed")
+                        db.rollback()
+                    finally:
+                        db.close()
+                for row in rows:
+                    with self._lock:
+                        self._busy += 1
+                    pool.submit(run_one, self.session_factory, self.id, row)\
+                        .add_done_callback(self._done)
+                if once and not rows:
+                    with self._lock:
+                        idle = self._busy == 0
+                    if idle:
+                        break
+                if not rows or free <= len(rows):
+                    _wake.wait(self.poll)
+                    _wake.clear()
+        finally:
+            pool.shutdown(wait=True)
+            log.info("job worker %s stopped", self.id)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run, name="job-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        _wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def job_dict(j) -> dict:
+    return {
+        "id": j.id,
+        "kind": j.kind,
+        "status": j.status,
+        "attempts": j.attempts,
+        "max_attempts": j.max_attempts,
+        "run_at": j.run_at.isoformat(timespec="seconds") if j.run_at else None,
+        "created_at": j.created_at.isoformat(timespec="seconds") if j.created_at else None,
+        "finished_at": j.finished_at.isoformat(timespec="seconds") if j.finished_at else None,
+        "last_error": j.last_error,
+    }
+
+
+def ensure_job(session_factory, kind: str, payload: Optional[dict] = None, delay: float = 0) -> None:
+    """Davriy (o'zini qayta qo'yadigan) vazifa navbatda bo'lmasa qo'yadi — startupda."""
+    J = models.Job
+    db = session_factory()
+    try:
+        exists = db.scalar(
+            select(J.id).where(J.kind == kind, J.status.in_(("queued", "running"))).limit(1))
+        if exists is None:
+            enqueue(db, kind, payload, delay=delay)
+            db.commit()
+    finally:
+        db.close()
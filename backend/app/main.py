@@ -1,13 +1,17 @@
 ﻿# app/main.py
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, PlainTextResponse
 import os
 
-from app.database import engine
-from app import models
-from app.database import init_db
+from app.database import engine, SessionLocal
+from app import cache, jobs, models, refdata, storage, tasks  # noqa: F401 (tasks: handlerlar)
+from app.events import bus as events_bus
+from app import metrics, profiling
+from app.database import init_db, print_diagnostics
 from app.routers import comments
 
 # config – mavjud bo‘lmasa ham ishlashi uchun fallbacklar qo‘yamiz
@@ -17,19 +21,58 @@ try:
         QR_DIR,
         CORS_ALLOW_ORIGINS,
         CORS_ALLOW_CREDENTIALS,
+        METRICS_ENABLED,
+        SLOW_QUERY_MS,
+        PROFILER_ENABLED,
+        DB_DIAGNOSTICS,
+        JOBS_EMBEDDED_WORKER,
+        ensure_dirs,
     )
 except Exception:
     UPLOAD_DIR = "./uploads"
     QR_DIR = "./qr"
     CORS_ALLOW_ORIGINS = None
     CORS_ALLOW_CREDENTIALS = True
+    METRICS_ENABLED = False
+    SLOW_QUERY_MS = 0
+    PROFILER_ENABLED = False
+    DB_DIAGNOSTICS = False
+    JOBS_EMBEDDED_WORKER = False
+
+    def ensure_dirs():
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        os.makedirs(QR_DIR, exist_ok=True)
 
 # routerlar
-from app.routers import auth, clients, orders, payments, attachments
+from app.routers import auth, clients, orders, payments, attachments, events, admin, dashboard, jobs as jobs_router, upload_sessions
 # verify router ichida prefix bo‘lsa, shu holatda qoladi
 from app.routers.verify import router as verify_router
 
-app = FastAPI(title="Lingua CRM API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Import paytida hech narsa qilinmaydi: papkalar, sxema tekshiruvi,
+    # diagnostika va broker ulanishi shu yerda, bir marta.
+    ensure_dirs()
+    init_db()
+    if DB_DIAGNOSTICS:
+        print_diagnostics()
+    # bir nechta worker bo'lsa brokerga ulanib olamiz (EVENTS_BROKER_URL)
+    events_bus.start()
+    # fon vazifalari (QR, fayl o'chirish); alohida jarayon: python -m app.worker
+    jobs.ensure_job(SessionLocal, "uploads.cleanup")
+    # filial/foydalanuvchi nomlari keshi (keyin branches/users yozuvlarida yangilanadi)
+    with SessionLocal() as db:
+        refdata.load(db)
+    worker = jobs.Worker(SessionLocal) if JOBS_EMBEDDED_WORKER else None
+    if worker:
+        worker.start()
+    yield
+    if worker:
+        worker.stop()
+
+
+app = FastAPI(title="Lingua CRM API", version="1.0.0", lifespan=lifespan)
 
 # CORS
 default_allowed = ["http://localhost:5173", "http://127.0.0.1:5173"]
@@ -43,12 +86,26 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=allow_credentials,
+    # frontend o'qishi kerak bo'lgan javob sarlavhalari
+    expose_headers=["X-Next-Cursor", "Upload-Offset"],
 )
 
-# DB jadvallarini yaratish (agar yo‘q bo‘lsa)
-models.Base.metadata.create_all(bind=engine)
-init_db()  # ← добавь эту строку
+# So'rov/SQL metrikalari (METRICS_ENABLED=1). Sekin so'rovlar jurnali ham
+# route nomini shu middleware'dan oladi.
+if METRICS_ENABLED or SLOW_QUERY_MS > 0:
+    app.add_middleware(metrics.MetricsMiddleware, record=METRICS_ENABLED)
+if METRICS_ENABLED:
+    metrics.instrument_engine(engine, models.Base)
 
+# Kesh: commit'dan keyin o'zgargan jadvallar avlodini oshiradi
+cache.install(SessionLocal)
+metrics.registry.register(cache.metric_lines)
+# enqueue + commit -> shu jarayondagi worker darhol uyg'onadi
+jobs.install(SessionLocal)
+
+# X-Profile: 1 (faqat admin) — bitta so'rovni cProfile + sampler bilan yozib olish
+if PROFILER_ENABLED:
+    app.add_middleware(profiling.ProfilerMiddleware)
 
 # Routerlarni ulash
 app.include_router(auth.router)
@@ -57,15 +114,21 @@ app.include_router(orders.router)
 app.include_router(payments.router)
 app.include_router(attachments.router)
 app.include_router(comments.router)
+app.include_router(events.router)
+app.include_router(admin.router)
+app.include_router(dashboard.router)
+app.include_router(jobs_router.router)
+app.include_router(upload_sessions.router)
 # verify_router ichida APIRouter(prefix="/verify") bo‘lishi kutiladi
 app.include_router(verify_router)
 
-# Statik fayllar (katalog mavjud bo‘lsa ulaymiz)
-if os.path.isdir(UPLOAD_DIR):
-    app.mount("/files", StaticFiles(directory=UPLOAD_DIR), name="files")
+if PROFILER_ENABLED:
+    profiling.instrument_routes(app)
 
-if os.path.isdir(QR_DIR):
-    app.mount("/qr", StaticFiles(directory=QR_DIR), name="qr")
+# Statik fayllar (kataloglar lifespan'da yaratiladi)
+# eski tekis URL lar ham ishlaydi (fayl ab/cd/ ga ko'chgan bo'lsa)
+app.mount("/files", storage.UploadStaticFiles(directory=UPLOAD_DIR, check_dir=False), name="files")
+app.mount("/qr", StaticFiles(directory=QR_DIR, check_dir=False), name="qr")
 
 # Root -> /docs
 
@@ -80,3 +143,9 @@ def root():
 @app.get("/health")
 def health():
     return {"ok": True}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.registry.render(),
+                             media_type="text/plain; version=0.0.4")
@@ -0,0 +1,247 @@
+# app/metrics.py
+"""
+So'rovlar bo'yicha vaqt va SQL statistikasi (METRICS_ENABLED=1 bo'lganda).
+
+- MetricsMiddleware: har bir so'rov uchun route shabloni (/orders/{order_id:int}),
+  kechikish gistogrammasi, javob hajmi; `Server-Timing` sarlavhasini qo'shadi.
+- instrument_engine(): SQLAlchemy engine hodisalari orqali so'rov ichidagi
+  statementlar soni, DB vaqti, INSERT/UPDATE/DELETE ta'sir qilgan qatorlar
+  (rowcount) va ORM yuklagan obyektlarni hisoblaydi. Core select() qaytargan
+  qatorlar sanalmaydi — drayverlar SELECT uchun rowcount bermaydi.
+- render(): /metrics uchun Prometheus text format.
+
+O'chiq bo'lsa middleware ham, engine hooklar ham ulanmaydi — qo'shimcha xarajat yo'q.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestStats:
+    """Bitta so'rov davomida yig'iladigan qiymatlar (contextvar orqali)."""
+    __slots__ = ("scope", "start", "statements", "db_time", "dml_cursors", "objects_loaded")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        # INSERT/UPDATE/DELETE kursorlari: ... RETURNING da (SQLite) rowcount
+        # qatorlar o'qilgandan keyin to'ladi, shuning uchun so'rov oxirida yig'amiz
+        self.dml_cursors: list = []
+        self.objects_loaded = 0
+
+    @property
+    def rows_affected(self) -> int:
+        total = 0
+        for cursor in self.dml_cursors:
+            rowcount = getattr(cursor, "rowcount", -1)
+            if rowcount is not None and rowcount >= 0:
+                total += rowcount
+        return total
+
+    @property
+    def route(self) -> str:
+        return route_template(self.scope)
+
+    def server_timing(self) -> str:
+        total = (time.perf_counter() - self.start) * 1000
+        return (f'db;dur={self.db_time * 1000:.1f};desc="{self.statements} queries", '
+                f'app;dur={total:.1f}')
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request", default=None)
+
+
+def route_template(scope: dict) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    return "unmatched"
+
+
+class _RouteStats:
+    __slots__ = ("count", "buckets", "latency_sum", "statements", "db_time",
+                 "rows_affected", "objects_loaded", "bytes", "statuses")
+
+    def __init__(self):
+        self.count = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows_affected = 0
+        self.objects_loaded = 0
+        self.bytes = 0
+        self.statuses: dict = {}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: dict = {}
+        self._collectors: list = []
+
+    def observe(self, route: str, method: str, status: int, elapsed: float,
+                stats: RequestStats, nbytes: int) -> None:
+        with self._lock:
+            rs = self._routes.get((route, method))
+            if rs is None:
+                rs = self._routes[(route, method)] = _RouteStats()
+            rs.count += 1
+            rs.latency_sum += elapsed
+            for i, le in enumerate(LATENCY_BUCKETS):
+                if elapsed <= le:
+                    rs.buckets[i] += 1
+            rs.statements += stats.statements
+            rs.db_time += stats.db_time
+            rs.rows_affected += stats.rows_affected
+            rs.objects_loaded += stats.objects_loaded
+            rs.bytes += nbytes
+            rs.statuses[status] = rs.statuses.get(status, 0) + 1
+
+    def register(self, collector: Callable[[], list]) -> None:
+        """Boshqa modullar (kesh va h.k.) o'z qatorlarini qo'shishi uchun."""
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                f"{method} {route}": {
+                    "count": rs.count,
+                    "latency_avg_ms": round(rs.latency_sum / rs.count * 1000, 2) if rs.count else 0,
+                    "statements_per_request": round(rs.statements / rs.count, 2) if rs.count else 0,
+                    "db_time_ms": round(rs.db_time * 1000, 2),
+                    "rows_affected": rs.rows_affected,
+                    "objects_loaded": rs.objects_loaded,
+                    "bytes": rs.bytes,
+                }
+                for (route, method), rs in self._routes.items()
+            }
+
+    def render(self) -> str:
+        out = []
+
+        def head(name, typ, help_):
+            out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} {typ}")
+
+        with self._lock:
+            items = sorted(self._routes.items())
+
+            head("crm_http_request_duration_seconds", "histogram",
+                 "Request latency by route template")
+            for (route, method), rs in items:
+                lbl = f'route="{route}",method="{method}"'
+                for le, n in zip(LATENCY_BUCKETS, rs.buckets):
+                    out.append(f'crm_http_request_duration_seconds_bucket{{{lbl},le="{le}"}} {n}')
+                out.append(f'crm_http_request_duration_seconds_bucket{{{lbl},le="+Inf"}} {rs.count}')
+                out.append(f"crm_http_request_duration_seconds_sum{{{lbl}}} {rs.latency_sum:.6f}")
+                out.append(f"crm_http_request_duration_seconds_count{{{lbl}}} {rs.count}")
+
+            head("crm_http_requests_total", "counter", "Requests by route and status")
+            for (route, method), rs in items:
+                for status, n in sorted(rs.statuses.items()):
+                    out.append(
+                        f'crm_http_requests_total{{route="{route}",method="{method}",status="{status}"}} {n}')
+
+            for name, attr, help_ in (
+                ("crm_db_statements_total", "statements", "SQL statements executed"),
+                ("crm_db_time_seconds_total", "db_time", "Time spent in SQL statements"),
+                ("crm_db_rows_affected_total", "rows_affected",
+                 "Rows affected by INSERT/UPDATE/DELETE (cursor rowcount)"),
+                ("crm_db_orm_objects_loaded_total", "objects_loaded", "ORM objects loaded"),
+                ("crm_http_response_bytes_total", "bytes", "Response body bytes"),
+            ):
+                head(name, "counter", help_)
+                for (route, method), rs in items:
+                    val = getattr(rs, attr)
+                    val = f"{val:.6f}" if isinstance(val, float) else val
+                    out.append(f'{name}{{route="{route}",method="{method}"}} {val}')
+
+        for collector in list(self._collectors):
+            out.extend(collector())
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    """Sof ASGI middleware (BaseHTTPMiddleware'dan arzonroq)."""
+
+    def __init__(self, app, record: bool = True):
+        self.app = app
+        # record=False: faqat current_request o'rnatiladi (sekin so'rovlar jurnali uchun)
+        self.record = record
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if not self.record:
+            token = current_request.set(RequestStats(scope))
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                current_request.reset(token)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = 500
+        nbytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status, nbytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append(
+                    "Server-Timing", stats.server_timing())
+            elif message["type"] == "http.response.body":
+                nbytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            registry.observe(stats.route, scope["method"], status,
+                             time.perf_counter() - stats.start, stats, nbytes)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._crm_t0 = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request.get()
+    if stats is None or context is None:
+        return
+    stats.statements += 1
+    stats.db_time += time.perf_counter() - getattr(context, "_crm_t0", time.perf_counter())
+    # SELECT uchun rowcount drayverga bog'liq (SQLite: -1), shuning uchun faqat DML
+    if context.isinsert or context.isupdate or context.isdelete:
+        stats.dml_cursors.append(cursor)
+
+
+def _on_load(target, context):
+    stats = current_request.get()
+    if stats is not None:
+        stats.objects_loaded += 1
+
+
+def instrument_engine(engine, base) -> None:
+    """Engine va ORM hodisalariga ulanadi. Faqat METRICS_ENABLED bo'lsa chaqiriladi."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(base, "load", _on_load, propagate=True)
@@ -1,6 +1,6 @@
 # app/models.py
 from sqlalchemy import (
-    Column, Integer, String, ForeignKey, Date, DateTime, Enum, Numeric, Text, func, Boolean
+    Column, Integer, String, ForeignKey, Date, DateTime, Enum, Numeric, Text, func, Boolean, Table, Index, text
 )
 from sqlalchemy.orm import declarative_base, relationship
 from uuid import uuid4
@@ -87,13 +87,16 @@ class Comment(Base):
     __tablename__ = "comments"
     id = Column(Integer, primary_key=True)
     order_id = Column(Integer, ForeignKey(
-        "orders.id", ondelete="CASCADE"), index=True, nullable=False)
+        "orders.id", ondelete="CASCADE"), nullable=False)
     author = Column(Text, nullable=True)          # можно хранить имя/логин
     text = Column(Text, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
 
     order = relationship("Order", backref="comments")
 
+    # cursor-пагинация (order_id, id < before_id) и счётчики для списка заказов
+    __table_args__ = (Index("ix_comments_order_id_id", "order_id", "id"),)
+
 
 class Order(Base):
     __tablename__ = "orders"
@@ -114,8 +117,8 @@ class Order(Base):
     country = Column(String)
     payment_method = Column(Enum(PayMethod))
 
-    created_at = Column(DateTime, server_default=func.now())
-    deadline = Column(Date)
+    created_at = Column(DateTime, server_default=func.now(), index=True)
+    deadline = Column(Date, index=True)
 
     total_amount = Column(Numeric(12, 2), default=0)
     notes = Column(Text)
@@ -124,6 +127,16 @@ class Order(Base):
     payment_state = Column(Enum(PaymentState), default=PaymentState.UNPAID)
     deleted_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        # /dashboard/summary: ochiq (topshirilmagan) buyurtmalar
+        Index(
+            "ix_orders_open",
+            "branch_id", "manager_id", "status", "deadline",
+            postgresql_where=text("deleted_at IS NULL AND status != 'topshirildi'"),
+            sqlite_where=text("deleted_at IS NULL AND status != 'topshirildi'"),
+        ),
+    )
+
     payments = relationship(
         "Payment",
         back_populates="order",
@@ -149,8 +162,16 @@ class Payment(Base):
 
     amount = Column(Numeric(12, 2), nullable=False)
     method = Column(Enum(PayMethod), nullable=False)
-    paid_at = Column(Date, server_default=func.current_date())
+    paid_at = Column(Date, server_default=func.current_date(), index=True)
     note = Column(String)
+    # Idempotency-Key sarlavhasi: qayta yuborilgan POST ikkinchi to'lov yaratmaydi
+    idempotency_key = Column(String(64), nullable=True, unique=True, index=True)
+
+    __table_args__ = (
+        # payments_sum_subquery(): SUM(amount) GROUP BY order_id — faqat indeksdan
+        # o'qiladi (debt-aging, facets, debt_only ro'yxat, dashboard qarzi)
+        Index("ix_payments_order_amount", "order_id", "amount"),
+    )
 
 
 class Attachment(Base):
@@ -158,18 +179,28 @@ class Attachment(Base):
     id = Column(Integer, primary_key=True)
 
     order_id = Column(ForeignKey(
-        "orders.id", ondelete="CASCADE"), nullable=False, index=True)
+        "orders.id", ondelete="CASCADE"), nullable=False)
     order = relationship("Order", back_populates="attachments")
 
     kind = Column(Enum(AttachmentKind),
                   default=AttachmentKind.translation, nullable=False)
-    filename = Column(String(255), nullable=False)
+    filename = Column(String(255), nullable=False, index=True)
+    # UPLOAD_DIR ga nisbatan yo'l ("abc.pdf", "orders/5/abc.pdf"); eski qatorlarda bo'sh
+    storage_key = Column(String(512), nullable=True, unique=True, index=True)
+    checksum_sha256 = Column(String(64), nullable=True)
     original_name = Column(String(255), nullable=True)
     mime = Column(String(100), nullable=True)
     size = Column(Integer, nullable=True)
+    # rasm normalizatsiyasi (app/images.py): asl hajm va (IMAGE_KEEP_ORIGINAL bo'lsa) asl fayl
+    original_size = Column(Integer, nullable=True)
+    original_key = Column(String(512), nullable=True)
+    normalized_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
     uploaded_by = Column(ForeignKey("users.id"), nullable=True)
 
+    # order_id bo'yicha ro'yxat, (order_id, kind) filtri va oxirgi fayl (max id)
+    __table_args__ = (Index("ix_attachments_order_id_kind_id", "order_id", "kind", "id"),)
+
 
 class VerifiedDoc(Base):
     __tablename__ = "verified_docs"
@@ -188,3 +219,64 @@ class VerifiedDoc(Base):
 
     is_active = Column(Boolean, default=True)
     qr_filename = Column(String, nullable=True)
+
+
+
+class Job(Base):
+    """Fon vazifalari navbati (app/jobs.py, python -m app.worker)."""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(64), nullable=False)
+    payload = Column(Text, nullable=False, default="{}")   # JSON
+    status = Column(String(16), nullable=False, default="queued")  # queued|running|done|failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, server_default=func.now())
+    locked_by = Column(String(64), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+    # navbatdan olish: status + run_at bo'yicha
+    __table_args__ = (Index("ix_jobs_status_run_at", "status", "run_at"),)
+
+
+class UploadSession(Base):
+    """Bo'laklab (resumable) yuklash sessiyasi; qism fayl UPLOAD_DIR/.sessions/<id>.part"""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True, default=lambda: uuid4().hex)
+    order_id = Column(ForeignKey("orders.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(Enum(AttachmentKind), nullable=False, default=AttachmentKind.translation)
+    original_name = Column(String(255), nullable=True)
+    mime = Column(String(100), nullable=True)
+    ext = Column(String(16), nullable=True)
+    size = Column(Integer, nullable=False)             # e'lon qilingan umumiy hajm
+    received = Column(Integer, nullable=False, default=0)  # joriy offset
+    sha256 = Column(String(64), nullable=True)         # mijoz bergan (ixtiyoriy) — finalda tekshiriladi
+    created_at = Column(DateTime, server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+# ---------------- Archive ----------------
+# Arxiv jadvallari: asl ustunlar (FK/unique/server_default'siz) + archived_at.
+# O'z surrogate kaliti bor — SQLite id'ni qayta ishlatsa ham to'qnashmaydi.
+# Ko'chirish/qaytarish: app/archive.py
+
+
+def _archive_table(source: Table) -> Table:
+    cols = [Column("archive_id", Integer, primary_key=True)]
+    for c in source.columns:
+        cols.append(Column(c.name, c.type, nullable=True,
+                           # storage_key/original_key/filename: storage scan (fayl -> qator)
+                           index=c.name in ("id", "order_id", "storage_key",
+                                            "original_key", "filename")))
+    cols.append(Column("archived_at", DateTime, nullable=False, index=True))
+    return Table(f"{source.name}_archive", Base.metadata, *cols)
+
+
+orders_archive = _archive_table(Order.__table__)
+payments_archive = _archive_table(Payment.__table__)
+attachments_archive = _archive_table(Attachment.__table__)
+comments_archive = _archive_table(Comment.__table__)
@@ -0,0 +1,207 @@
+# app/profiling.py
+"""
+Bitta so'rovni talab bo'yicha profillash (faqat admin uchun).
+
+So'rovga `X-Profile: 1` sarlavhasi yoki `?__profile=1` qo'shilsa va token egasi
+admin bo'lsa, endpoint cProfile ostida ishlaydi, parallel ravishda o'sha thread
+stack'i PROFILE_SAMPLE_MS oralig'ida namunalanadi. Natija PROFILE_DIR ga yoziladi:
+
+    <id>.pstats     — `python -m pstats` / snakeviz uchun
+    <id>.collapsed  — flamegraph.pl / speedscope uchun "a;b;c N" qatorlar
+    <id>.txt        — cumulative bo'yicha top-40
+
+Javobda `X-Profile-Id: <id>` qaytadi. Sync endpointlar threadpool'da ishlagani
+uchun profiler endpoint funksiyasining o'zini o'rab oladi (instrument_routes),
+middleware esa faqat so'rovni belgilaydi va fayllarni yozadi.
+"""
+import cProfile
+import functools
+import inspect
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+
+from app.config import PROFILE_DIR, PROFILE_SAMPLE_MS
+
+
+class ProfileSession:
+    def __init__(self):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid4().hex[:8]}"
+        self.profile: Optional[cProfile.Profile] = None
+        self.stacks: Counter = Counter()
+        self.elapsed = 0.0
+
+    def run(self, fn, *args, **kwargs):
+        """fn ni joriy threadda profiler ostida bajaradi."""
+        sampler = _Sampler(threading.get_ident(), self.stacks)
+        prof = cProfile.Profile()
+        t0 = time.perf_counter()
+        sampler.start()
+        prof.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            prof.disable()
+            sampler.stop()
+            self.elapsed += time.perf_counter() - t0
+            self.profile = prof
+
+    async def run_async(self, fn, *args, **kwargs):
+        sampler = _Sampler(threading.get_ident(), self.stacks)
+        prof = cProfile.Profile()
+        t0 = time.perf_counter()
+        sampler.start()
+        prof.enable()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            prof.disable()
+            sampler.stop()
+            self.elapsed += time.perf_counter() - t0
+            self.profile = prof
+
+    def write(self, request_line: str) -> None:
+        if self.profile is None:
+            return  # endpointgacha yetib bormadi (404 va h.k.)
+        out = Path(PROFILE_DIR)
+        out.mkdir(parents=True, exist_ok=True)
+        self.profile.dump_stats(out / f"{self.id}.pstats")
+        with open(out / f"{self.id}.collapsed", "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        buf = io.StringIO()
+        buf.write(f"{request_line}\nelapsed: {self.elapsed * 1000:.1f} ms, "
+                  f"samples: {sum(self.stacks.values())}\n\n")
+        pstats.Stats(self.profile, stream=buf).sort_stats("cumulative").print_stats(40)
+        (out / f"{self.id}.txt").write_text(buf.getvalue(), encoding="utf-8")
+
+
+class _Sampler(threading.Thread):
+    """Berilgan threadning stack'ini davriy yozib boradi (collapsed format)."""
+
+    def __init__(self, target_tid: int, stacks: Counter):
+        super().__init__(name="profile-sampler", daemon=True)
+        self._tid = target_tid
+        self._stacks = stacks
+        self._stop_evt = threading.Event()
+        self._interval = max(PROFILE_SAMPLE_MS, 0.1) / 1000
+
+    def run(self):
+        while not self._stop_evt.wait(self._interval):
+            frame = sys._current_frames().get(self._tid)
+            if frame is None:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            self._stacks[";".join(reversed(parts))] += 1
+
+    def stop(self):
+        self._stop_evt.set()
+        self.join(timeout=1)
+
+
+_active: ContextVar[Optional[ProfileSession]] = ContextVar("active_profile", default=None)
+
+
+def _wrap_endpoint(fn):
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            session = _active.get()
+            if session is None:
+                return await fn(*args, **kwargs)
+            return await session.run_async(fn, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        session = _active.get()
+        if session is None:
+            return fn(*args, **kwargs)
+        return session.run(fn, *args, **kwargs)
+    return wrapper
+
+
+def instrument_routes(app) -> None:
+    """Barcha APIRoute endpointlarini o'raydi. Routerlar ulangandan keyin chaqiring."""
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not getattr(route.dependant.call, "_profiled", False):
+            route.dependant.call = _wrap_endpoint(route.dependant.call)
+            route.dependant.call._profiled = True
+
+
+def _wants_profile(scope) -> bool:
+    for k, v in scope.get("headers") or ():
+        if k == b"x-profile" and v not in (b"", b"0"):
+            return True
+    qs = scope.get("query_string") or b""
+    return b"__profile=" in qs and b"__profile=0" not in qs
+
+
+def _bearer_token(scope) -> Optional[str]:
+    for k, v in scope.get("headers") or ():
+        if k == b"authorization":
+            parts = v.decode("latin-1").split(" ", 1)
+            if len(parts) == 2 and parts[0].lower() == "bearer":
+                return parts[1].strip()
+    return None
+
+
+def _is_admin(token: Optional[str]) -> bool:
+    if not token:
+        return False
+    from app import models
+    from app.database import SessionLocal
+    from app.utils.security import decode_token
+
+    uid = decode_token(token)
+    if not uid:
+        return False
+    db = SessionLocal()
+    try:
+        user = db.get(models.User, uid)
+        return bool(user and user.role == models.Role.admin)
+    finally:
+        db.close()
+
+
+class ProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not await run_in_threadpool(_is_admin, _bearer_token(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession()
+        token = _active.set(session)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", session.id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _active.reset(token)
+            line = f"{scope['method']} {scope['path']}?{(scope.get('query_string') or b'').decode('latin-1')}"
+            await run_in_threadpool(session.write, line)
@@ -0,0 +1,102 @@
+# app/refdata.py
+"""
+Ma'lumotnoma (reference data) keshi: filiallar va foydalanuvchilar (id -> nom/rol).
+
+Jadvallar kichik va kam o'zgaradi, lekin har bir buyurtma qatorida
+o.branch.name / o.manager.full_name relationship yuklashni talab qilardi.
+Endi butun jadval jarayon xotirasida bitta snapshot sifatida turadi:
+
+    refs = refdata.get(db)
+    refs.branch_name(o.branch_id), refs.user_name(o.manager_id)
+
+Startupda yuklanadi (load), keyin branches/users jadvallariga yozuv commit
+bo'lganda cache.generation oshadi va keyingi get() snapshotni qayta o'qiydi
+(boshqa workerlardagi yozuvlar — "_cache.invalidate" hodisasi orqali).
+"""
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import cache, models
+from app.config import CACHE_ENABLED
+
+TABLES = ("branches", "users")
+
+
+class Snapshot:
+    __slots__ = ("generation", "loaded_at", "branches", "users")
+
+    def __init__(self, generation: tuple, branches: dict, users: dict):
+        self.generation = generation
+        self.loaded_at = time.time()
+        self.branches = branches   # id -> name
+        self.users = users         # id -> (full_name, role)
+
+    def branch_name(self, branch_id: Optional[int]) -> Optional[str]:
+        return self.branches.get(branch_id)
+
+    def user_name(self, user_id: Optional[int]) -> Optional[str]:
+        u = self.users.get(user_id)
+        return u[0] if u else None
+
+    def user_role(self, user_id: Optional[int]) -> Optional[str]:
+        u = self.users.get(user_id)
+        return u[1] if u else None
+
+
+_snapshot: Optional[Snapshot] = None
+_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_stats = {"loads": 0, "hits": 0, "reloads": 0}
+
+
+def load(db: Session) -> Snapshot:
+    """Jadvallarni to'liq o'qiydi. Avlod o'qishdan oldin olinadi — yuklash
+    paytidagi yozuv keyingi get() da yana qayta yuklashga olib keladi."""
+    global _snapshot
+    gen = cache.generation(*TABLES)
+    branches = dict(db.execute(select(models.Branch.id, models.Branch.name)).all())
+    users = {
+        uid: (name, getattr(role, "value", role))
+        for uid, name, role in db.execute(
+            select(models.User.id, models.User.full_name, models.User.role))
+    }
+    snap = Snapshot(gen, branches, users)
+    with _lock:
+        _snapshot = snap
+        _stats["loads"] += 1
+    return snap
+
+
+def get(db: Session) -> Snapshot:
+    if not CACHE_ENABLED:
+        return load(db)  # kesh o'chiq: har so'rovda ikki kichik SELECT
+    snap = _snapshot
+    if snap is not None and snap.generation == cache.generation(*TABLES):
+        _stats["hits"] += 1
+        return snap
+    # bir vaqtda kelgan so'rovlar bitta qayta yuklashni kutadi
+    with _reload_lock:
+        snap = _snapshot
+        if snap is not None and snap.generation == cache.generation(*TABLES):
+            return snap
+        if snap is not None:
+            _stats["reloads"] += 1
+        return load(db)
+
+
+def stats() -> dict:
+    snap = _snapshot
+    return {
+        "tables": list(TABLES),
+        "enabled": CACHE_ENABLED,
+        "loaded": snap is not None,
+        "generation": list(snap.generation) if snap else None,
+        "loaded_at": snap.loaded_at if snap else None,
+        "branches": len(snap.branches) if snap else 0,
+        "users": len(snap.users) if snap else 0,
+        **_stats,
+    }
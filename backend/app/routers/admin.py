@@ -0,0 +1,95 @@
+# app/routers/admin.py
+import os
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import archive, cache, jobs, models, refdata
+from app.config import SLOW_QUERY_MS, SLOW_QUERY_SAMPLES, PROFILE_DIR
+from app.database import get_session, slow_query_samples, clear_slow_queries
+from app.utils.security import require_admin
+
+router = APIRouter(prefix="/admin", tags=["admin"],
+                   dependencies=[Depends(require_admin)])
+
+
+@router.get("/slow-queries")
+def slow_queries(limit: int = 50):
+    """Oxirgi sekin SQL so'rovlar (yangilari birinchi), EXPLAIN rejasi bilan."""
+    rows = slow_query_samples()
+    return {
+        "enabled": SLOW_QUERY_MS > 0,
+        "threshold_ms": SLOW_QUERY_MS,
+        "capacity": SLOW_QUERY_SAMPLES,
+        "total": len(rows),
+        "rows": rows[:max(0, limit)],
+    }
+
+
+@router.delete("/slow-queries", status_code=204)
+def reset_slow_queries():
+    clear_slow_queries()
+
+
+@router.get("/profiles")
+def list_profiles(limit: int = 50):
+    """X-Profile bilan yozilgan profillar (yangilari birinchi)."""
+    if not os.path.isdir(PROFILE_DIR):
+        return {"rows": []}
+    names = sorted(
+        (n for n in os.listdir(PROFILE_DIR) if n.endswith(".pstats")), reverse=True)
+    return {"rows": [n[:-len(".pstats")] for n in names[:max(0, limit)]]}
+
+
+@router.get("/profiles/{name}")
+def download_profile(name: str):
+    """<id>.pstats | <id>.collapsed | <id>.txt"""
+    safe = os.path.basename(name)
+    if not safe.endswith((".pstats", ".collapsed", ".txt")):
+        raise HTTPException(400, "Noto'g'ri fayl turi")
+    path = os.path.join(PROFILE_DIR, safe)
+    if not os.path.exists(path):
+        raise HTTPException(404, "Profile not found")
+    return FileResponse(path, filename=safe)
+
+
+@router.post("/archive/run")
+def run_archive(dry_run: bool = False, max_batches: int = 10,
+                db: Session = Depends(get_session)):
+    """Arxivlash (dry_run=true — faqat nomzodlar soni). Katta hajm uchun CLI: python -m app.archive"""
+    return archive.run_archive(db, max_batches=max_batches, dry_run=dry_run)
+
+
+@router.post("/archive/{order_id}/restore")
+def restore_archived_order(order_id: int, db: Session = Depends(get_session)):
+    try:
+        restored = archive.restore_order(db, order_id)
+    except archive.RestoreConflict as e:
+        raise HTTPException(409, str(e))
+    if restored is None:
+        raise HTTPException(404, "Arxivda topilmadi")
+    return {"ok": True, "restored": restored}
+
+
+@router.post("/storage/migrate", status_code=202)
+def start_storage_migration(db: Session = Depends(get_session)):
+    """Eski fayllarni ab/cd/ ga ko'chirishni fon vazifasi sifatida boshlaydi (batchma-batch)."""
+    J = models.Job
+    running = db.scalar(
+        select(J.id).where(J.kind == "storage.migrate", J.status.in_(("queued", "running"))).limit(1))
+    if running:
+        raise HTTPException(409, f"Migratsiya allaqachon navbatda: job {running}")
+    job = jobs.enqueue(db, "storage.migrate", {"after": 0})
+    db.commit()
+    return {"ok": True, "job_id": job.id}
+
+
+@router.get("/refdata")
+def refdata_stats():
+    """Filial/foydalanuvchi ma'lumotnoma keshi: hajmi, yuklashlar, hit soni."""
+    st = refdata.stats()
+    gen = list(cache.generation(*refdata.TABLES))
+    return {**st, "current_generation": gen, "stale": st["generation"] != gen}
@@ -6,7 +6,9 @@ from sqlalchemy.orm import Session
 
 from app.database import get_session
 from app import models
-from app.config import UPLOAD_DIR
+from app.events import publish
+from app.jobs import enqueue
+from app.storage import resolve
 
 router = APIRouter(prefix="/attachments", tags=["attachments"])
 
@@ -16,11 +18,11 @@ def download_attachment(attachment_id: int, db: Session = Depends(get_session)):
     if not att:
         raise HTTPException(404, "Attachment not found")
 
-    # serverda saqlangan nomni normalizatsiya qilamiz
-    stored_name = os.path.basename(att.filename or "")
-    path = os.path.join(UPLOAD_DIR, stored_name)
-    if not os.path.exists(path):
+    # serverda saqlangan yo'l (storage_key, eski tekis filename yoki ab/cd/ ga ko'chgani)
+    path = resolve(att)
+    if not path:
         raise HTTPException(404, "File missing")
+    stored_name = os.path.basename(path)
 
     media_type = att.mime or (mimetypes.guess_type(stored_name)[0] or "application/octet-stream")
     # FileResponse 'filename=' Content-Disposition headerini togri qoyadi
@@ -32,12 +34,13 @@ def delete_attachment(attachment_id: int, db: Session = Depends(get_session)):
     if not att:
         raise HTTPException(404, "Attachment not found")
 
-    stored_name = os.path.basename(att.filename or "")
-    path = os.path.join(UPLOAD_DIR, stored_name)
-    try:
-        if os.path.exists(path):
-            os.remove(path)
-    finally:
-        db.delete(att)
-        db.commit()
+    order_id = att.order_id
+    path = resolve(att)
+    # avval qator, fayl esa commit'dan keyin fon vazifasida o'chiriladi —
+    # commit muvaffaqiyatsiz bo'lsa fayl joyida qoladi
+    db.delete(att)
+    if path:
+        enqueue(db, "file.delete", {"path": path})
+    db.commit()
+    publish("attachment.deleted", order_id=order_id, attachment_id=attachment_id)
     return None  # 204
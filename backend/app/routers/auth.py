@@ -1,13 +1,11 @@
 # app/routers/auth.py
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from app.database import get_session, engine
+from app.database import get_session
 from app import models
 from app.utils.security import verify_pw, create_token, hash_pw
 
-# Eslatma: create_all ni aslida startupda chaqirish yaxshiroq,
-# lekin hozircha ishlashi uchun qoldirdik.
-models.Base.metadata.create_all(bind=engine)
+# Jadvallar app lifespan'ida bir marta tekshiriladi (database.init_db)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -1,18 +1,58 @@
 # app/routers/comments.py
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from app.database import get_session
 from app import models, schemas
+from app.events import publish
 
 router = APIRouter(prefix="/orders/{order_id}/comments", tags=["comments"])
 
+
+NO_COMMENTS = {"comments_count": 0, "last_comment_at": None}
+
+
+def comment_stats(db: Session, order_ids) -> dict:
+    """
+    order_id -> {comments_count, last_comment_at} sahifadagi buyurtmalar uchun,
+    bitta GROUP BY (ix_comments_order_id_id). Ro'yxat qatorlariga qo'shiladi.
+    """
+    if not order_ids:
+        return {}
+    rows = db.execute(
+        select(models.Comment.order_id, func.count(), func.max(models.Comment.created_at))
+        .where(models.Comment.order_id.in_(order_ids))
+        .group_by(models.Comment.order_id)
+    )
+    return {
+        oid: {
+            "comments_count": cnt,
+            "last_comment_at": last.strftime("%Y-%m-%d %H:%M") if last else None,
+        }
+        for oid, cnt, last in rows
+    }
+
 @router.get("", response_model=list[schemas.CommentOut])
-def list_comments(order_id: int, db: Session = Depends(get_session)):
-    order = db.get(models.Order, order_id)
-    if not order:
+def list_comments(
+    order_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before_id: Optional[int] = Query(None, description="X-Next-Cursor qiymati"),
+    db: Session = Depends(get_session),
+):
+    """Yangilari birinchi. Keyingi sahifa bo'lsa X-Next-Cursor sarlavhasi qaytadi."""
+    if not db.get(models.Order, order_id):
         raise HTTPException(404, "Order not found")
-    return db.query(models.Comment).filter(models.Comment.order_id == order_id)\
-             .order_by(models.Comment.id.desc()).all()
+    q = select(models.Comment).where(models.Comment.order_id == order_id)
+    if before_id is not None:
+        q = q.where(models.Comment.id < before_id)
+    rows = list(db.scalars(q.order_by(models.Comment.id.desc()).limit(limit + 1)))
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows
 
 @router.post("", response_model=schemas.CommentOut)
 def add_comment(order_id: int, payload: schemas.CommentCreate, db: Session = Depends(get_session)):
@@ -20,6 +60,7 @@ def add_comment(order_id: int, payload: schemas.CommentCreate, db: Session = Dep
         raise HTTPException(404, "Order not found")
     c = models.Comment(order_id=order_id, text=payload.text.strip(), author=payload.author)
     db.add(c); db.commit(); db.refresh(c)
+    publish("comment.added", order_id=order_id, comment_id=c.id)
     return c
 
 @router.delete("/{comment_id}", status_code=204)
@@ -28,3 +69,4 @@ def delete_comment(order_id: int, comment_id: int, db: Session = Depends(get_ses
     if not c or c.order_id != order_id:
         raise HTTPException(404, "Comment not found")
     db.delete(c); db.commit()
+    publish("comment.deleted", order_id=order_id, comment_id=comment_id)
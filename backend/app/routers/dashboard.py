@@ -0,0 +1,168 @@
+# app/routers/dashboard.py
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import and_, case, func, literal_column, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.cache import TTLCache
+from app.config import DASHBOARD_CACHE_TTL
+from app.database import get_session
+from app.routers.orders import payments_sum_subquery
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+# Bitta yozuv kuniga: hamma filial/menejerlar uchun bir marta hisoblanadi,
+# har bir foydalanuvchi faqat o'z qismini filtrlab oladi.
+_summary_cache = TTLCache(
+    "dashboard.summary",
+    tables=("orders", "payments", "branches", "users"),
+    ttl=DASHBOARD_CACHE_TTL,
+    maxsize=4,
+)
+
+OPEN_STATUSES = [s.value for s in models.OrderStatus if s != models.OrderStatus.topshirildi]
+# qisman indeks (ix_orders_open) sharti bilan so'zma-so'z bir xil bo'lishi kerak
+_OPEN_CLAUSE = literal_column("orders.status") != literal_column("'topshirildi'")
+
+
+def _empty() -> dict:
+    return {
+        "open": {s: 0 for s in OPEN_STATUSES},
+        "open_total": 0,
+        "due_today": 0,
+        "due_week": 0,
+        "overdue": 0,
+        "outstanding": 0.0,
+        "revenue": {"today": 0.0, "week": 0.0, "month": 0.0},
+    }
+
+
+def _add(dst: dict, src: dict) -> None:
+    for s, n in src["open"].items():
+        dst["open"][s] += n
+    for k in ("open_total", "due_today", "due_week", "overdue", "outstanding"):
+        dst[k] += src[k]
+    for k, v in src["revenue"].items():
+        dst["revenue"][k] += v
+
+
+def _compute(db: Session, today: date) -> dict:
+    O, P = models.Order, models.Payment
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=6)
+    month_start = today.replace(day=1)
+
+    cells: dict = {}
+
+    def cell(branch_id, manager_id):
+        return cells.setdefault((branch_id, manager_id), _empty())
+
+    # 1) ochiq buyurtmalar: status bo'yicha soni + muddatlar
+    open_q = (
+        select(
+            O.branch_id, O.manager_id, O.status,
+            func.count(),
+            func.sum(case((O.deadline == today, 1), else_=0)),
+            func.sum(case((and_(O.deadline >= today, O.deadline <= week_end), 1), else_=0)),
+            func.sum(case((O.deadline < today, 1), else_=0)),
+        )
+        .where(O.deleted_at.is_(None), _OPEN_CLAUSE)
+        .group_by(O.branch_id, O.manager_id, O.status)
+    )
+    for b_id, m_id, status, cnt, due_today, due_week, overdue in db.execute(open_q):
+        c = cell(b_id, m_id)
+        c["open"][status.value] += cnt
+        c["open_total"] += cnt
+        c["due_today"] += int(due_today or 0)
+        c["due_week"] += int(due_week or 0)
+        c["overdue"] += int(overdue or 0)
+
+    # 2) qoldiq qarz: to'lovlar yig'indisidan (ix_payments_order_amount),
+    # debt-aging va qarzdorlar ro'yxati bilan bir xil hisob
+    payments_sum = payments_sum_subquery()
+    total_col = func.coalesce(O.total_amount, 0)
+    paid_col = func.coalesce(payments_sum.c.paid_amount, 0)
+    debt_q = (
+        select(O.branch_id, O.manager_id, func.sum(total_col - paid_col))
+        .outerjoin(payments_sum, payments_sum.c.order_id == O.id)
+        .where(O.deleted_at.is_(None), total_col > paid_col)
+        .group_by(O.branch_id, O.manager_id)
+    )
+    for b_id, m_id, amount in db.execute(debt_q):
+        cell(b_id, m_id)["outstanding"] += float(amount or 0)
+
+    # 3) tushum: faqat shu oy/hafta to'lovlari (payments.paid_at indeksi)
+    since = min(week_start, month_start)
+    rev_q = (
+        select(
+            O.branch_id, O.manager_id,
+            func.sum(case((P.paid_at == today, P.amount), else_=0)),
+            func.sum(case((P.paid_at >= week_start, P.amount), else_=0)),
+            func.sum(case((P.paid_at >= month_start, P.amount), else_=0)),
+        )
+        .join(O, O.id == P.order_id)
+        .where(P.paid_at >= since, P.paid_at <= today, O.deleted_at.is_(None))
+        .group_by(O.branch_id, O.manager_id)
+    )
+    for b_id, m_id, r_today, r_week, r_month in db.execute(rev_q):
+        rev = cell(b_id, m_id)["revenue"]
+        rev["today"] += float(r_today or 0)
+        rev["week"] += float(r_week or 0)
+        rev["month"] += float(r_month or 0)
+
+    branch_names = dict(db.execute(select(models.Branch.id, models.Branch.name)).all())
+    manager_names = dict(db.execute(select(models.User.id, models.User.full_name)).all())
+
+    totals = _empty()
+    branches: dict = {}
+    managers: dict = {}
+    for (b_id, m_id), c in cells.items():
+        _add(totals, c)
+        b = branches.setdefault(b_id, {"branch_id": b_id, "branch": branch_names.get(b_id), **_empty()})
+        _add(b, c)
+        m = managers.setdefault(m_id, {"manager_id": m_id, "manager": manager_names.get(m_id),
+                                       "branches": [], **_empty()})
+        _add(m, c)
+        if b_id not in m["branches"]:
+            m["branches"].append(b_id)
+
+    return {
+        "as_of": str(today),
+        "week": [str(week_start), str(week_end)],
+        "generated_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "totals": totals,
+        "branches": sorted(branches.values(), key=lambda x: (x["branch"] or "")),
+        "managers": sorted(managers.values(), key=lambda x: (x["manager"] or "")),
+    }
+
+
+@router.get("/summary")
+def dashboard_summary(
+    branch_id: Optional[int] = None,
+    manager_id: Optional[int] = None,
+    db: Session = Depends(get_session),
+):
+    """
+    Filial va menejerlar kesimida KPI: ochiq buyurtmalar (status bo'yicha),
+    bugun/shu hafta muddati, muddati o'tganlar, bugun/hafta/oy tushumi va qoldiq.
+    Uchta agregat so'rov, natija DASHBOARD_CACHE_TTL soniya keshda turadi va
+    orders/payments yozilganda darhol eskiradi.
+    """
+    today = date.today()
+    data = _summary_cache.get_or_set(today, lambda: _compute(db, today))
+    if branch_id is None and manager_id is None:
+        return data
+    branches = [b for b in data["branches"]
+                if branch_id is None or b["branch_id"] == branch_id]
+    managers = [m for m in data["managers"]
+                if (manager_id is None or m["manager_id"] == manager_id)
+                and (branch_id is None or branch_id in m["branches"])]
+    # totals — tanlangan menejer (yoki filial) bo'yicha
+    picked = managers if manager_id is not None else branches
+    totals = _empty()
+    for item in picked:
+        _add(totals, item)
+    return {**data, "totals": totals, "branches": branches, "managers": managers}
@@ -0,0 +1,94 @@
+# app/routers/events.py
+from typing import Optional
+
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.config import EVENTS_HEARTBEAT_SEC
+from app.events import bus
+
+router = APIRouter(prefix="/orders", tags=["events"])
+
+# mijoz buferdan davom ettira olmasa — ro'yxatni to'liq qayta yuklashi kerak
+RESET_FRAME = "event: reset\ndata: {}\n\n"
+
+
+def _parse_last_id(*values: Optional[str]) -> Optional[tuple]:
+    """"<epoch>-<id>" -> (epoch, id). Epoch'siz eski id — (None, id), ya'ni reset."""
+    for v in values:
+        if v is None or v == "":
+            continue
+        epoch, _, n = v.rpartition("-")
+        try:
+            return epoch or None, int(n)
+        except ValueError:
+            return None
+    return None
+
+
+@router.get("/events")
+async def order_events(
+    request: Request,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+    since: Optional[str] = Query(default=None, description="Last-Event-ID o'rniga"),
+):
+    """
+    Buyurtmalar o'zgarishlari oqimi (text/event-stream).
+    Hodisalar: order.status, order.payment_state, order.payment_method,
+    payment.added, payments.imported, order.deleted, orders.bulk,
+    orders.archived, order.restored, attachment.added/deleted,
+    comment.added/deleted.
+    """
+    # obunani buferni o'qishdan oldin ochamiz — oradagi hodisa yo'qolmasin
+    sub = bus.subscribe()
+    last = _parse_last_id(last_event_id, since)
+    epoch, last_sent = bus.position()
+    backlog = []
+    if last is not None:
+        backlog = bus.since(last[1], last[0])
+        if backlog:
+            epoch, last_sent = last
+
+    async def stream():
+        nonlocal epoch, last_sent, backlog
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                if backlog is None:
+                    yield RESET_FRAME
+                    epoch, last_sent = bus.position()
+                    backlog = []
+                for ev in backlog:
+                    if ev.id > last_sent:
+                        last_sent = ev.id
+                        if not ev.internal:
+                            yield ev.to_sse()
+                backlog = []
+
+                if await request.is_disconnected():
+                    break
+                ev = await sub.get(timeout=EVENTS_HEARTBEAT_SEC)
+                if sub.lagged:
+                    # navbat to'lib qoldi: buferdan tiklaymiz
+                    sub.lagged = False
+                    backlog = bus.since(last_sent, epoch)
+                    continue
+                if ev is None:
+                    yield ": ping\n\n"
+                    continue
+                if ev.epoch != epoch:
+                    # broker qayta ishga tushdi / lokal rejim: id'lar qaytadan boshlanadi
+                    yield RESET_FRAME
+                    epoch, last_sent = ev.epoch, 0
+                if ev.id > last_sent:
+                    last_sent = ev.id
+                    if not ev.internal:
+                        yield ev.to_sse()
+        finally:
+            sub.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,64 @@
+# app/routers/jobs.py
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import get_session
+from app.jobs import STATUSES, job_dict
+from app.utils.security import get_current_user, require_admin
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("")
+def list_jobs(
+    status: str | None = None,
+    kind: str | None = None,
+    limit: int = 50,
+    db: Session = Depends(get_session),
+    _: models.User = Depends(require_admin),
+):
+    """Navbat holati: status bo'yicha sonlar + oxirgi vazifalar."""
+    if status is not None and status not in STATUSES:
+        raise HTTPException(422, f"status: {', '.join(STATUSES)}")
+    J = models.Job
+    counts = dict.fromkeys(STATUSES, 0)
+    counts.update(db.execute(select(J.status, func.count()).group_by(J.status)).all())
+    q = select(J).order_by(J.id.desc()).limit(max(1, min(limit, 500)))
+    if status:
+        q = q.where(J.status == status)
+    if kind:
+        q = q.where(J.kind == kind)
+    return {"counts": counts, "rows": [job_dict(j) for j in db.scalars(q)]}
+
+
+@router.get("/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_session),
+            _: models.User = Depends(get_current_user)):
+    job = db.get(models.Job, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job_dict(job)
+
+
+@router.post("/{job_id}/retry")
+def retry_job(job_id: int, db: Session = Depends(get_session),
+              _: models.User = Depends(require_admin)):
+    """failed vazifani urinishlar hisobini nollab qayta navbatga qo'yadi."""
+    J = models.Job
+    res = db.execute(
+        update(J)
+        .where(J.id == job_id, J.status == "failed")
+        .values(status="queued", attempts=0, run_at=datetime.utcnow(), finished_at=None)
+    )
+    if res.rowcount == 0:
+        db.rollback()
+        if not db.get(J, job_id):
+            raise HTTPException(404, "Job not found")
+        raise HTTPException(409, "Faqat failed holatdagi vazifani qayta ishga tushirish mumkin")
+    db.info["jobs_enqueued"] = True
+    db.commit()
+    return job_dict(db.get(J, job_id))
@@ -2,26 +2,53 @@
 # app/routers/orders.py
 from datetime import date, datetime, timedelta
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import csv
+import io
+import logging
 import os
-from uuid import uuid4
+import tempfile
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Form
-from sqlalchemy import func, cast, Date as SA_Date, or_, and_
+from fastapi.responses import StreamingResponse
+from sqlalchemy import (
+    func, cast, case, literal, Date as SA_Date, Integer, String, or_, and_, select,
+    tuple_, union_all, update
+)
 from sqlalchemy.orm import Session
 
-from app.database import get_session
-from app import models, schemas
+from app.database import get_session, SessionLocal
+from app import archive, images, models, refdata, schemas, storage
+from app.events import publish
+from app.routers.comments import NO_COMMENTS, comment_stats
 from pydantic import BaseModel, constr
 from app.config import (
-    UPLOAD_DIR,
     ALLOWED_MIME,
     ALLOWED_EXT,
     MAX_UPLOAD_MB,
+    MAX_FILES_PER_UPLOAD,
+    UPLOAD_CONCURRENCY,
+    EXPORT_BATCH_SIZE,
+    ORDERS_CACHE_SIZE,
+    ORDERS_CACHE_TTL,
     sanitize_filename,
 )
+from app.cache import TTLCache
 
 router = APIRouter(prefix="/orders", tags=["orders"])
+log = logging.getLogger(__name__)
+
+# list_orders / orders_by_date javoblari. Qatorlarda mijoz, filial, menejer
+# nomlari, oxirgi fayl va izohlar soni ham bor — shu jadvallarning har qanday
+# commit'i kalitlarni eskirtiradi (cache.generation).
+_list_cache = TTLCache(
+    "orders.list",
+    tables=("orders", "payments", "attachments", "comments", "clients", "branches", "users"),
+    ttl=ORDERS_CACHE_TTL,
+    maxsize=ORDERS_CACHE_SIZE,
+)
 
 PAYMENT_STATE_LABELS = {
     "UNPAID": "to'lanmagan",
@@ -59,37 +86,164 @@ def paid_sum(db: Session, order_id: int) -> float:
         or 0
     )
 
+
+def last_attachments(db: Session, order_ids) -> dict:
+    """order_id -> oxirgi fayl {id, display_name, size}; sahifa uchun bitta so'rov."""
+    if not order_ids:
+        return {}
+    A = models.Attachment
+    last_ids = (
+        select(func.max(A.id))
+        .where(A.order_id.in_(order_ids))
+        .group_by(A.order_id)
+    )
+    rows = db.execute(
+        select(A.order_id, A.id, A.original_name, A.filename, A.size)
+        .where(A.id.in_(last_ids))
+    )
+    return {
+        r.order_id: {
+            "id": r.id,
+            "display_name": r.original_name or r.filename,
+            "size": (r.size or 0),
+        }
+        for r in rows
+    }
+
+
+def payments_sum_subquery():
+    """order_id -> jami to'lov (LEFT JOIN uchun)."""
+    return (
+        select(
+            models.Payment.order_id.label("order_id"),
+            func.coalesce(func.sum(models.Payment.amount),
+                          0).label("paid_amount"),
+        )
+        .group_by(models.Payment.order_id)
+        .subquery()
+    )
+
+
+@dataclass
+class OrderFilters:
+    """
+    list_orders / export uchun umumiy filtrlar (Depends() orqali query
+    parametrlardan yig'iladi).
+    """
+    q: Optional[str] = None
+    # deadline bo‘yicha oraliq filtr
+    deadline_from: Optional[date] = None
+    deadline_to: Optional[date] = None
+    # Yaratilgan sana bo‘yicha ham ixtiyoriy filtr (frontend hozir foydalanmayapti, lekin foydali)
+    created_from: Optional[date] = None
+    created_to: Optional[date] = None
+    # boshqa filtrlashlar
+    debt_only: bool = False
+    payment_state: Optional[str] = None  # 'UNPAID'|'PARTIAL'|'PAID'
+
+    def clauses(self, paid_amount_col, total_amount_col) -> list:
+        """WHERE shartlari. So'rovda Client JOIN qilingan bo'lishi kerak."""
+        conds = [models.Order.deleted_at.is_(None)]
+
+        if self.q:
+            like = f"%{self.q}%"
+            conds.append(
+                (models.Client.full_name.ilike(like)) |
+                (models.Client.phone.ilike(like))
+            )
+
+        # deadline bo‘yicha
+        if self.deadline_from:
+            conds.append(models.Order.deadline >= self.deadline_from)
+        if self.deadline_to:
+            conds.append(models.Order.deadline <= self.deadline_to)
+
+        # created_at bo‘yicha (datetime -> kun diapazoni)
+        if self.created_from:
+            start_dt = datetime.combine(self.created_from, datetime.min.time())
+            conds.append(models.Order.created_at >= start_dt)
+        if self.created_to:
+            end_dt = datetime.combine(
+                self.created_to, datetime.min.time()) + timedelta(days=1)
+            conds.append(models.Order.created_at < end_dt)
+
+        # qarzdorlar (paid_amount ustuni mavjudligiga tayangan holda)
+        if self.debt_only:
+            conds.append(total_amount_col > paid_amount_col)
+
+        # payment_state filtri
+        payment_state = self.payment_state
+        if payment_state in ("UNPAID", "PARTIAL", "PAID"):
+            from app.models import PaymentState as _PS
+            stored_filter = models.Order.payment_state == _PS[payment_state]
+
+            if payment_state == "UNPAID":
+                computed_filter = and_(
+                    models.Order.payment_state.is_(None),
+                    paid_amount_col <= 0,
+                )
+            elif payment_state == "PAID":
+                computed_filter = and_(
+                    models.Order.payment_state.is_(None),
+                    or_(
+                        total_amount_col <= 0,
+                        paid_amount_col + 0.01 >= total_amount_col,
+                    ),
+                )
+            else:  # PARTIAL
+                computed_filter = and_(
+                    models.Order.payment_state.is_(None),
+                    paid_amount_col > 0,
+                    paid_amount_col + 0.01 < total_amount_col,
+                )
+
+            conds.append(or_(stored_filter, computed_filter))
+
+        return conds
+
+    def cache_key(self) -> tuple:
+        """Natija keshi kaliti: ta'sirsiz farqlar (bo'sh q, noma'lum holat) bir xil kalit beradi."""
+        return (
+            self.q or None,
+            self.deadline_from, self.deadline_to,
+            self.created_from, self.created_to,
+            bool(self.debt_only),
+            self.payment_state if self.payment_state in ("UNPAID", "PARTIAL", "PAID") else None,
+        )
+
+
+def _sort_column(sort_by: str, sort_dir: str):
+    sort_col = getattr(models.Order, sort_by, models.Order.id)
+    if sort_dir.lower() == "desc":
+        sort_col = sort_col.desc()
+    return sort_col
+
+
+def _sort_key(sort_by: str, sort_dir: str) -> tuple:
+    return (sort_by if hasattr(models.Order, sort_by) else "id",
+            "desc" if sort_dir.lower() == "desc" else "asc")
+
 # ---------------- endpoints ----------------
 
 
 @router.get("")
 def list_orders(
     db: Session = Depends(get_session),
-    q: Optional[str] = None,
-    # deadline bo‘yicha oraliq filtr
-    deadline_from: Optional[date] = None,
-    deadline_to: Optional[date] = None,
-    # Yaratilgan sana bo‘yicha ham ixtiyoriy filtr (frontend hozir foydalanmayapti, lekin foydali)
-    created_from: Optional[date] = None,
-    created_to: Optional[date] = None,
-    # boshqa filtrlashlar
-    debt_only: bool = False,
-    payment_state: Optional[str] = None,  # 'UNPAID'|'PARTIAL'|'PAID'
+    filters: OrderFilters = Depends(),
     # pagination & sorting
     page: int = 1,
     size: int = 50,
     sort_by: str = "id",
     sort_dir: str = "desc",
 ):
-    payments_sum = (
-        db.query(
-            models.Payment.order_id.label("order_id"),
-            func.coalesce(func.sum(models.Payment.amount),
-                          0).label("paid_amount"),
-        )
-        .group_by(models.Payment.order_id)
-        .subquery()
-    )
+    key = ("list", filters.cache_key(), page, size, _sort_key(sort_by, sort_dir))
+    return _list_cache.get_or_set(
+        key, lambda: _list_orders(db, filters, page, size, sort_by, sort_dir))
+
+
+def _list_orders(db: Session, filters: OrderFilters, page: int, size: int,
+                 sort_by: str, sort_dir: str) -> dict:
+    payments_sum = payments_sum_subquery()
 
     paid_amount_col = func.coalesce(payments_sum.c.paid_amount, 0)
     total_amount_col = func.coalesce(models.Order.total_amount, 0)
@@ -99,65 +253,10 @@ def list_orders(
         .join(models.Client)
         .outerjoin(payments_sum, payments_sum.c.order_id == models.Order.id)
     )
-    qs = qs.filter(models.Order.deleted_at.is_(None))
-
-    if q:
-        like = f"%{q}%"
-        qs = qs.filter(
-            (models.Client.full_name.ilike(like)) |
-            (models.Client.phone.ilike(like))
-        )
-
-    # deadline bo‘yicha
-    if deadline_from:
-        qs = qs.filter(models.Order.deadline >= deadline_from)
-    if deadline_to:
-        qs = qs.filter(models.Order.deadline <= deadline_to)
-
-    # created_at bo‘yicha (datetime -> kun diapazoni)
-    if created_from:
-        start_dt = datetime.combine(created_from, datetime.min.time())
-        qs = qs.filter(models.Order.created_at >= start_dt)
-    if created_to:
-        end_dt = datetime.combine(
-            created_to, datetime.min.time()) + timedelta(days=1)
-        qs = qs.filter(models.Order.created_at < end_dt)
-
-    # qarzdorlar (paid_amount ustuni mavjudligiga tayangan holda)
-    if debt_only:
-        qs = qs.filter(total_amount_col > paid_amount_col)
-
-    # payment_state filtri
-    if payment_state in ("UNPAID", "PARTIAL", "PAID"):
-        from app.models import PaymentState as _PS
-        stored_filter = models.Order.payment_state == _PS[payment_state]
-
-        if payment_state == "UNPAID":
-            computed_filter = and_(
-                models.Order.payment_state.is_(None),
-                paid_amount_col <= 0,
-            )
-        elif payment_state == "PAID":
-            computed_filter = and_(
-                models.Order.payment_state.is_(None),
-                or_(
-                    total_amount_col <= 0,
-                    paid_amount_col + 0.01 >= total_amount_col,
-                ),
-            )
-        else:  # PARTIAL
-            computed_filter = and_(
-                models.Order.payment_state.is_(None),
-                paid_amount_col > 0,
-                paid_amount_col + 0.01 < total_amount_col,
-            )
-
-        qs = qs.filter(or_(stored_filter, computed_filter))
+    qs = qs.filter(*filters.clauses(paid_amount_col, total_amount_col))
 
     # sort
-    sort_col = getattr(models.Order, sort_by, models.Order.id)
-    if sort_dir.lower() == "desc":
-        sort_col = sort_col.desc()
+    sort_col = _sort_column(sort_by, sort_dir)
     total_count = qs.order_by(None).count()
 
     rows = (
@@ -167,6 +266,9 @@ def list_orders(
         .all()
     )
 
+    comments = comment_stats(db, [o.id for o, _ in rows])
+    last_atts = last_attachments(db, [o.id for o, _ in rows])
+    refs = refdata.get(db)  # filial/menejer nomlari — JOIN/yuklashsiz
     items = []
     for o, paid in rows:
         order_total = float(o.total_amount or 0)
@@ -181,15 +283,6 @@ def list_orders(
 
         status = PAYMENT_STATE_LABELS.get(state_value, state_value)
 
-        last_att = None
-        if getattr(o, "attachments", None):
-            a = o.attachments[-1]
-            last_att = {
-                "id": a.id,
-                "display_name": a.original_name or a.filename,
-                "size": (a.size or 0),
-            }
-
         items.append(
             {
                 "id": o.id,
@@ -201,26 +294,316 @@ def list_orders(
                 "customer_type": getattr(o.customer_type, "value", None),
                 "doc_type": o.doc_type,
                 "country": o.country,
-                "branch": o.branch.name if o.branch else None,
-                "manager": o.manager.full_name if o.manager else None,
+                "branch": refs.branch_name(o.branch_id),
+                "manager": refs.user_name(o.manager_id),
                 "deadline": o.deadline.strftime("%Y-%m-%d") if o.deadline else None,
                 "total_amount": order_total,
                 "paid_sum": paid_val,
                 "balance": balance,
                 "payment_method": getattr(o.payment_method, "value", None),
                 "status": getattr(o.status, "value", o.status),
-                "last_attachment": last_att,
+                "last_attachment": last_atts.get(o.id),
+                **comments.get(o.id, NO_COMMENTS),
             }
         )
 
     return {"total": total_count, "rows": items, "page": page, "size": size}
 
 
+FACETS = ("status", "payment_state", "branch", "manager", "customer_type", "doc_type", "country")
+
+
+def _facet_base(filters: OrderFilters):
+    """Filtrlangan buyurtmalar: har bir facet uchun bitta ustun (CTE)."""
+    O = models.Order
+    payments_sum = payments_sum_subquery()
+    paid_amount_col = func.coalesce(payments_sum.c.paid_amount, 0)
+    total_amount_col = func.coalesce(O.total_amount, 0)
+    # resolve_payment_state() va OrderFilters.clauses() bilan bir xil qoidalar
+    state = case(
+        (O.payment_state.is_not(None), cast(O.payment_state, String)),
+        (paid_amount_col <= 0, "UNPAID"),
+        (or_(total_amount_col <= 0, paid_amount_col + 0.01 >= total_amount_col), "PAID"),
+        else_="PARTIAL",
+    )
+    return (
+        select(
+            cast(O.status, String).label("status"),
+            state.label("payment_state"),
+            O.branch_id.label("branch"),
+            O.manager_id.label("manager"),
+            cast(O.customer_type, String).label("customer_type"),
+            O.doc_type.label("doc_type"),
+            O.country.label("country"),
+        )
+        .join_from(O, models.Client)
+        .outerjoin(payments_sum, payments_sum.c.order_id == O.id)
+        .where(*filters.clauses(paid_amount_col, total_amount_col))
+        .cte("facet_orders")
+    )
+
+
+def _facet_rows(db: Session, filters: OrderFilters):
+    """(facet | None=jami, qiymat, soni) — bitta so'rov."""
+    base = _facet_base(filters)
+    cols = [base.c[f] for f in FACETS]
+    if db.bind.dialect.name == "postgresql":
+        # GROUPING(a, b, ...) bitmaskasi: guruhlanmagan ustun biti 1; () — jami
+        full = (1 << len(cols)) - 1
+        stmt = (
+            select(*cols, func.grouping(*cols).label("g"), func.count().label("n"))
+            .group_by(func.grouping_sets(*[tuple_(c) for c in cols], tuple_()))
+        )
+        for row in db.execute(stmt):
+            if row.g == full:
+                yield None, None, row.n
+                continue
+            i = next(i for i in range(len(cols)) if not row.g >> (len(cols) - 1 - i) & 1)
+            yield FACETS[i], row[i], row.n
+        return
+    # SQLite: CTE bir necha marta ishlatilgani uchun bir marta materiallashtiriladi
+    # (3.35+), har bir facet — shu natija ustida GROUP BY
+    parts = [
+        select(literal(f).label("facet"), cast(c, String).label("value"), func.count().label("n"))
+        .group_by(c)
+        for f, c in zip(FACETS, cols)
+    ]
+    parts.append(select(literal(None, String), literal(None, String), func.count()).select_from(base))
+    for facet, value, n in db.execute(union_all(*parts)):
+        yield facet, value, n
+
+
+def _facet_label(facet: str, value, refs):
+    """(qiymat, ko'rsatiladigan nom). Enum ustunlari DB da nomi bilan saqlanadi."""
+    if value is None:
+        return None, None
+    if facet == "status":
+        v = models.OrderStatus[value].value if value in models.OrderStatus.__members__ else value
+        return v, v
+    if facet == "customer_type":
+        v = models.CustomerType[value].value if value in models.CustomerType.__members__ else value
+        return v, v
+    if facet == "payment_state":
+        return value, PAYMENT_STATE_LABELS.get(value, value)
+    if facet == "branch":
+        return int(value), refs.branch_name(int(value))
+    if facet == "manager":
+        return int(value), refs.user_name(int(value))
+    return value, value
+
+
+def _order_facets(db: Session, filters: OrderFilters) -> dict:
+    refs = refdata.get(db)
+    total = 0
+    facets = {f: [] for f in FACETS}
+    for facet, value, n in _facet_rows(db, filters):
+        if facet is None:
+            total = n
+            continue
+        v, label = _facet_label(facet, value, refs)
+        facets[facet].append({"value": v, "label": label, "count": n})
+    for items in facets.values():
+        items.sort(key=lambda x: (-x["count"], str(x["value"])))
+    return {"total": total, "facets": facets}
+
+
+@router.get("/facets")
+def order_facets(
+    db: Session = Depends(get_session),
+    filters: OrderFilters = Depends(),
+):
+    """
+    Orders sahifasi filtrlari uchun qiymatlar soni (list_orders bilan bir xil
+    filtrlar): status, payment_state, branch, manager, customer_type, doc_type,
+    country. Postgres'da GROUPING SETS, SQLite'da UNION ALL — bitta so'rov;
+    natija ro'yxat keshida (_list_cache).
+    """
+    return _list_cache.get_or_set(("facets", filters.cache_key()),
+                                  lambda: _order_facets(db, filters))
+
+
+EXPORT_COLUMNS = [
+    "id", "client_name", "client_phone", "created_at", "status",
+    "payment_state", "payment_status", "customer_type", "doc_type", "country",
+    "branch", "manager", "deadline", "total_amount", "paid_sum", "balance",
+    "payment_method",
+]
+
+
+def _export_rows(filters: OrderFilters, sort_by: str, sort_dir: str):
+    """
+    Eksport qatorlari generatori. O'z sessiyasini ochadi (javob oqimi endpoint
+    tugagandan keyin ham davom etadi) va faqat kerakli ustunlarni yield_per
+    bilan bo'lib-bo'lib o'qiydi — Postgres'da server-side cursor.
+    """
+    payments_sum = payments_sum_subquery()
+    paid_amount_col = func.coalesce(payments_sum.c.paid_amount, 0)
+    total_amount_col = func.coalesce(models.Order.total_amount, 0)
+
+    stmt = (
+        select(
+            models.Order.id,
+            models.Client.full_name,
+            models.Client.phone,
+            models.Order.created_at,
+            models.Order.status,
+            models.Order.payment_state,
+            models.Order.customer_type,
+            models.Order.doc_type,
+            models.Order.country,
+            models.Branch.name,
+            models.User.full_name,
+            models.Order.deadline,
+            total_amount_col,
+            paid_amount_col,
+            models.Order.payment_method,
+        )
+        .select_from(models.Order)
+        .join(models.Client, models.Client.id == models.Order.client_id)
+        .outerjoin(payments_sum, payments_sum.c.order_id == models.Order.id)
+        .outerjoin(models.Branch, models.Branch.id == models.Order.branch_id)
+        .outerjoin(models.User, models.User.id == models.Order.manager_id)
+        .where(*filters.clauses(paid_amount_col, total_amount_col))
+        .order_by(_sort_column(sort_by, sort_dir))
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    db = SessionLocal()
+    try:
+        for (oid, client_name, client_phone, created_at, status, stored, ctype,
+             doc_type, country, branch, manager, deadline, total, paid,
+             method) in db.execute(stmt):
+            order_total = float(total or 0)
+            paid_val = float(paid or 0)
+            balance = order_total - paid_val
+            if abs(balance) < 0.01:
+                balance = 0.0
+            stored_state = getattr(stored, "value", None)
+            state_value = stored_state if stored_state in PAYMENT_STATE_LABELS else resolve_payment_state(
+                order_total, paid_val)
+            yield [
+                oid,
+                client_name,
+                client_phone,
+                created_at.strftime("%Y-%m-%d") if created_at else None,
+                getattr(status, "value", status),
+                state_value,
+                PAYMENT_STATE_LABELS.get(state_value, state_value),
+                getattr(ctype, "value", None),
+                doc_type,
+                country,
+                branch,
+                manager,
+                deadline.strftime("%Y-%m-%d") if deadline else None,
+                order_total,
+                paid_val,
+                balance,
+                getattr(method, "value", None),
+            ]
+    finally:
+        db.close()
+
+
+def _csv_stream(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # BOM — Excel kirillcha/o'zbekcha matnni to'g'ri ochishi uchun
+    buf.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS)
+    yield buf.getvalue().encode("utf-8")  # birinchi baytlar darhol ketadi
+    buf.seek(0)
+    buf.truncate()
+
+    n = 0
+    for row in rows:
+        writer.writerow(row)
+        n += 1
+        if n % EXPORT_BATCH_SIZE == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _xlsx_stream(rows):
+    # ixtiyoriy bog'liqlik: faqat xlsx so'ralganda kerak
+    from openpyxl import Workbook
+
+    # write_only rejimida qatorlar vaqtinchalik faylga yoziladi — xotira o'zgarmas
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("orders")
+    ws.append(EXPORT_COLUMNS)
+    for row in rows:
+        ws.append(row)
+
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(1024 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+
+@router.get("/export")
+def export_orders(
+    filters: OrderFilters = Depends(),
+    format: str = Query("csv", regex="^(csv|xlsx)$"),
+    sort_by: str = "id",
+    sort_dir: str = "desc",
+):
+    """
+    list_orders filtrlari bo'yicha BARCHA buyurtmalarni CSV (yoki XLSX) qilib
+    oqim bilan qaytaradi. Sahifalash yo'q, xotira sarfi qatorlar soniga bog'liq emas.
+    """
+    stamp = datetime.now().strftime("%Y%m%d_%H%M")
+    rows = _export_rows(filters, sort_by, sort_dir)
+
+    if format == "xlsx":
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise HTTPException(
+                status_code=400, detail="XLSX eksport uchun openpyxl o'rnatilmagan")
+        return StreamingResponse(
+            _xlsx_stream(rows),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": f'attachment; filename="orders_{stamp}.xlsx"'},
+        )
+
+    return StreamingResponse(
+        _csv_stream(rows),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="orders_{stamp}.csv"'},
+    )
+
+
+@router.get("/archive")
+def list_archived_orders(
+    q: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    size: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_session),
+):
+    """Arxivga ko'chirilgan buyurtmalar (yangi arxivlanganlari birinchi)."""
+    return archive.list_archived(db, q, page, size)
+
+
 @router.get("/{order_id:int}")
-def get_order(order_id: int, db: Session = Depends(get_session)):
+def get_order(
+    order_id: int,
+    include_archived: bool = Query(False, description="Topilmasa arxivdan qidirish"),
+    db: Session = Depends(get_session),
+):
     """Bitta order tafsiloti (attachments va payments bilan)."""
     o = db.get(models.Order, order_id)
     if not o:
+        if include_archived:
+            archived = archive.get_archived_order(db, order_id)
+            if archived:
+                return archived
         raise HTTPException(status_code=404, detail="Order not found")
 
     paid = paid_sum(db, o.id)
@@ -231,6 +614,7 @@ def get_order(order_id: int, db: Session = Depends(get_session)):
     auto_state = resolve_payment_state(order_total, paid)
     state_value = stored_state if stored_state in PAYMENT_STATE_LABELS else auto_state
     pay_status = PAYMENT_STATE_LABELS.get(state_value, state_value)
+    refs = refdata.get(db)
 
     return {
         "id": o.id,
@@ -242,8 +626,8 @@ def get_order(order_id: int, db: Session = Depends(get_session)):
         "customer_type": getattr(o.customer_type, "value", None),
         "doc_type": o.doc_type,
         "country": o.country,
-        "branch": o.branch.name if o.branch else None,
-        "manager": o.manager.full_name if o.manager else None,
+        "branch": refs.branch_name(o.branch_id),
+        "manager": refs.user_name(o.manager_id),
         "deadline": o.deadline.strftime("%Y-%m-%d") if o.deadline else None,
         "total_amount": order_total,
         "paid_sum": paid,
@@ -286,6 +670,35 @@ def create_order(payload: schemas.OrderIn, db: Session = Depends(get_session)):
     return {"id": o.id}
 
 
+def _ensure_order(db: Session, order_id: int) -> None:
+    if db.scalar(select(models.Order.id).where(models.Order.id == order_id)) is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+
+def attachment_rows(db: Session, order_id: int, kind=None) -> list:
+    """
+    Buyurtma fayllari ro'yxati: filtr SQL'da (ix_attachments_order_id_kind_id),
+    faqat ro'yxatga kerakli ustunlar olinadi.
+    """
+    A = models.Attachment
+    q = select(A.id, A.original_name, A.filename, A.size, A.kind, A.mime, A.created_at)\
+        .where(A.order_id == order_id)
+    if kind is not None:
+        q = q.where(A.kind == kind)
+    return [
+        {
+            "id": r.id,
+            "display_name": r.original_name or r.filename,
+            "original_name": r.original_name,
+            "size": r.size or 0,
+            "kind": getattr(r.kind, "value", r.kind),
+            "mime": r.mime,
+            "created_at": r.created_at.strftime("%Y-%m-%d") if r.created_at else None,
+        }
+        for r in db.execute(q.order_by(A.id))
+    ]
+
+
 @router.get("/{order_id}/attachments")
 def list_attachments(
     order_id: int,
@@ -293,28 +706,77 @@ def list_attachments(
         default=None, description="Filter attachments by kind"),
     db: Session = Depends(get_session),
 ):
-    o = db.get(models.Order, order_id)
-    if not o:
-        raise HTTPException(status_code=404, detail="Order not found")
-
-    attachments = list(o.attachments or [])
+    kind_enum = None
     if kind:
         try:
             kind_enum = models.AttachmentKind(kind)
         except ValueError:
             raise HTTPException(
                 status_code=400, detail="Invalid attachment kind")
-        attachments = [a for a in attachments if a.kind == kind_enum]
+    _ensure_order(db, order_id)
+    return attachment_rows(db, order_id, kind_enum)
 
-    return [
-        {
-            "id": a.id,
-            "display_name": a.original_name or a.filename,
-            "size": a.size or 0,
-            "kind": getattr(a.kind, "value", a.kind),
-        }
-        for a in attachments
-    ]
+
+@router.get("/{order_id}/attachments/counts")
+def attachment_counts(order_id: int, db: Session = Depends(get_session)):
+    """Tur bo'yicha fayllar soni (drawer: "2 tarjima, 1 apostil") — qatorlarsiz."""
+    _ensure_order(db, order_id)
+    A = models.Attachment
+    by_kind = {k.value: 0 for k in models.AttachmentKind}
+    for kind, cnt in db.execute(
+        select(A.kind, func.count()).where(A.order_id == order_id).group_by(A.kind)
+    ):
+        by_kind[getattr(kind, "value", kind)] = cnt
+    return {"order_id": order_id, "total": sum(by_kind.values()), "by_kind": by_kind}
+
+
+def check_upload_type(filename: Optional[str], content_type: Optional[str]) -> str:
+    """MIME va kengaytma tekshiruvi (ALLOWED_MIME / ALLOWED_EXT); kengaytmani qaytaradi."""
+    # MIME tekshiruv
+    if ALLOWED_MIME and content_type not in ALLOWED_MIME:
+        raise HTTPException(status_code=400, detail="File type not allowed")
+
+    # Kengaytma tekshiruv
+    ext = ""
+    if filename and "." in filename:
+        ext = filename.rsplit(".", 1)[-1].lower()
+    if ALLOWED_EXT and ext not in ALLOWED_EXT:
+        raise HTTPException(
+            status_code=400, detail="File extension not allowed")
+    return ext
+
+
+def _store_upload(upload: UploadFile) -> dict:
+    """
+    MIME/kengaytma/hajmni tekshirib faylni UPLOAD_DIR/ab/cd/<uuid>.<ext> ga
+    oqim bilan yozadi. Attachment maydonlarini qaytaradi; xatoda HTTPException.
+    """
+    ext = check_upload_type(upload.filename, upload.content_type)
+
+    # Saqlash + hajm tekshiruv (oqim davomida)
+    key = storage.new_key(ext)
+    upload.file.seek(0)
+    try:
+        size, digest = storage.write_stream(
+            key, upload.file, limit=MAX_UPLOAD_MB * 1024 * 1024 if MAX_UPLOAD_MB else 0)
+    except storage.FileTooLarge:
+        raise HTTPException(status_code=400, detail="File too large")
+
+    return {
+        "filename": os.path.basename(key),
+        "storage_key": key,
+        "checksum_sha256": digest,
+        "original_name": sanitize_filename(upload.filename or "file"),
+        "mime": upload.content_type,
+        "size": size,
+    }
+
+
+def attachment_kind(kind: str) -> models.AttachmentKind:
+    try:
+        return models.AttachmentKind(kind)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid attachment kind")
 
 
 @router.post("/{order_id}/upload", status_code=201)
@@ -333,49 +795,86 @@ def upload_for_order(
     if not upload:
         raise HTTPException(status_code=400, detail="File is required")
 
+    kind_enum = attachment_kind(kind)
+    fields = _store_upload(upload)
+    att = models.Attachment(order_id=o.id, kind=kind_enum, **fields)
+    db.add(att)
     try:
-        kind_enum = models.AttachmentKind(kind)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid attachment kind")
-
-    # MIME tekshiruv
-    if ALLOWED_MIME and upload.content_type not in ALLOWED_MIME:
-        raise HTTPException(status_code=400, detail="File type not allowed")
+        db.flush()
+        images.queue_normalize(db, [att])  # IMAGE_NORMALIZE=1 bo'lsa fon vazifasi
+        db.commit()
+    except Exception:
+        storage.remove_quietly(storage.path_of(fields["storage_key"]))
+        raise
+    db.refresh(att)
+    publish("attachment.added", order_id=o.id,
+            attachment_id=att.id, kind=att.kind.value)
 
-    # Kengaytma tekshiruv
-    ext = ""
-    if upload.filename and "." in upload.filename:
-        ext = upload.filename.rsplit(".", 1)[-1].lower()
-    if ALLOWED_EXT and ext not in ALLOWED_EXT:
-        raise HTTPException(
-            status_code=400, detail="File extension not allowed")
+    return {"id": att.id, "kind": att.kind.value}
 
-    # Hajm tekshiruv
-    data = upload.file.read()
-    if MAX_UPLOAD_MB and len(data) > MAX_UPLOAD_MB * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large")
 
-    # Saqlash
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    safe_orig = sanitize_filename(upload.filename or "file")
-    stored_name = f"{uuid4().hex}.{ext or 'bin'}"
-    path = os.path.join(UPLOAD_DIR, stored_name)
-    with open(path, "wb") as out:
-        out.write(data)
-
-    att = models.Attachment(
-        order_id=o.id,
-        kind=kind_enum,
-        filename=stored_name,
-        original_name=safe_orig,
-        mime=upload.content_type,
-        size=len(data),
-    )
-    db.add(att)
-    db.commit()
-    db.refresh(att)
+@router.post("/{order_id}/upload/batch", status_code=201)
+def upload_many_for_order(
+    order_id: int,
+    files: list[UploadFile] = File(...),
+    kind: str = Form("translation"),
+    db: Session = Depends(get_session),
+):
+    """
+    Bir so'rovda MAX_FILES_PER_UPLOAD tagacha fayl. Fayllar parallel tekshirilib
+    yoziladi, barcha Attachment qatorlari bitta commit bilan qo'shiladi.
+    Natija har bir fayl uchun alohida (yaroqsizlari qolganlariga xalaqit bermaydi).
+    """
+    o = db.get(models.Order, order_id)
+    if not o:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if not files:
+        raise HTTPException(status_code=400, detail="File is required")
+    if len(files) > MAX_FILES_PER_UPLOAD:
+        raise HTTPException(status_code=400,
+                            detail=f"Bir so'rovda ko'pi bilan {MAX_FILES_PER_UPLOAD} ta fayl")
+    kind_enum = attachment_kind(kind)
 
-    return {"id": att.id, "kind": att.kind.value}
+    def store(upload):
+        try:
+            return _store_upload(upload), None
+        except HTTPException as e:
+            return None, e.detail
+        except Exception:
+            # disk to'lgan / ruxsat yo'q: yarim fayl write_stream'da o'chirilgan,
+            # boshqa fayllar saqlanib qatori yoziladi (yetim qolmaydi)
+            log.exception("upload failed: order=%s name=%r", order_id, upload.filename)
+            return None, "Faylni saqlab bo'lmadi"
+
+    with ThreadPoolExecutor(max(1, min(len(files), UPLOAD_CONCURRENCY))) as pool:
+        stored = list(pool.map(store, files))
+
+    atts = [models.Attachment(order_id=o.id, kind=kind_enum, **fields)
+            for fields, _ in stored if fields]
+    if atts:
+        db.add_all(atts)
+        try:
+            db.flush()
+            images.queue_normalize(db, atts)
+            db.commit()
+        except Exception:
+            for a in atts:
+                storage.remove_quietly(storage.path_of(a.storage_key))
+            raise
+        for a in atts:
+            publish("attachment.added", order_id=o.id, attachment_id=a.id, kind=kind_enum.value)
+
+    saved = iter(atts)
+    results = []
+    for upload, (fields, error) in zip(files, stored):
+        if fields:
+            a = next(saved)
+            results.append({"name": upload.filename, "ok": True, "id": a.id,
+                            "kind": kind_enum.value, "size": fields["size"]})
+        else:
+            results.append({"name": upload.filename, "ok": False, "error": error})
+    return {"ok": len(atts) == len(files), "uploaded": len(atts),
+            "failed": len(files) - len(atts), "results": results}
 
 
 @router.patch("/{order_id}/status")
@@ -392,6 +891,7 @@ def set_order_status(order_id: int, payload: schemas.OrderStatusUpdate, db: Sess
     o.status = new_status
     db.commit()
     db.refresh(o)
+    publish("order.status", order_id=o.id, status=o.status.value)
 
     return {"status": o.status.value}
 
@@ -423,6 +923,7 @@ def set_payment_method(order_id: int, body: dict, db: Session = Depends(get_sess
     # сохраняем как есть
     o.payment_method = models.PayMethod(raw)
     db.commit()
+    publish("order.payment_method", order_id=o.id, payment_method=raw)
 
 
 @router.patch("/{order_id}/payment-state")
@@ -436,6 +937,8 @@ def set_payment_state(order_id: int, payload: schemas.PaymentStateUpdate, db: Se
         _PS, payload.payment_state) else _PS(payload.payment_state)
     db.commit()
     db.refresh(o)
+    publish("order.payment_state", order_id=o.id,
+            payment_state=o.payment_state.value)
     return {"ok": True, "payment_state": o.payment_state.value}
 
 
@@ -446,9 +949,142 @@ def delete_order(order_id: int, db: Session = Depends(get_session)):
         raise HTTPException(status_code=404, detail="Order not found")
     o.deleted_at = datetime.utcnow()
     db.commit()
+    publish("order.deleted", order_id=o.id)
     return {"ok": True}
 
 
+@router.patch("/bulk")
+def bulk_update_orders(payload: schemas.OrderBulkUpdate, db: Session = Depends(get_session)):
+    """
+    Bir nechta buyurtmaga status / to'lov holati / to'lov turi / o'chirishni
+    bitta UPDATE va bitta commit bilan qo'llaydi. Har bir id uchun natija qaytadi.
+    """
+    values = {}
+    if payload.status:
+        values["status"] = models.OrderStatus(payload.status)
+    if payload.payment_state:
+        values["payment_state"] = models.PaymentState[payload.payment_state]
+    if payload.payment_method is not None:
+        raw = payload.payment_method.strip().lower()
+        if raw not in _METHOD_MAP:
+            raise HTTPException(status_code=400, detail="Noto‘g‘ri to‘lov turi")
+        values["payment_method"] = _METHOD_MAP[raw]
+    if payload.delete:
+        values["deleted_at"] = datetime.utcnow()
+    if not values:
+        raise HTTPException(status_code=400, detail="Hech qanday o'zgarish berilmagan")
+
+    ids = list(dict.fromkeys(payload.ids))
+    stmt = (
+        update(models.Order)
+        .where(models.Order.id.in_(ids), models.Order.deleted_at.is_(None))
+        .values(**values)
+    )
+    if db.bind.dialect.update_returning:
+        updated = set(db.execute(stmt.returning(models.Order.id)).scalars())
+    else:
+        updated = set(
+            db.scalars(
+                select(models.Order.id).where(
+                    models.Order.id.in_(ids), models.Order.deleted_at.is_(None))
+            )
+        )
+        db.execute(stmt, execution_options={"synchronize_session": False})
+    db.commit()
+
+    changes = {
+        k: getattr(v, "value", v) if k != "deleted_at" else True
+        for k, v in values.items()
+    }
+    if updated:
+        publish("orders.bulk", order_ids=sorted(updated), changes=changes)
+
+    return {
+        "updated": len(updated),
+        "results": [
+            {"id": i, "ok": i in updated,
+                "detail": None if i in updated else "Order not found"}
+            for i in ids
+        ],
+    }
+
+
+@router.get("/calendar")
+def orders_calendar(
+    month: str = Query(..., regex=r"^\d{4}-\d{2}$", description="YYYY-MM"),
+    mode: str = Query("created", regex="^(created|deadline)$"),
+    db: Session = Depends(get_session),
+):
+    """
+    Oy kalendari uchun kunlik yig'indilar (bitta GROUP BY): buyurtmalar soni,
+    umumiy summa, to'langan, qoldiq, qarzdorlar va muddati o'tganlar soni.
+    To'langan summa — to'lovlar yig'indisi (payments_sum_subquery), ro'yxat va
+    debt-aging bilan bir xil. Kun bosilganda to'liq qatorlar /orders/by-date dan.
+    """
+    try:
+        first = datetime.strptime(f"{month}-01", "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="month formati: YYYY-MM")
+    nxt = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+    O = models.Order
+    if mode == "created":
+        if db.bind.dialect.name == "postgresql":
+            day_col = cast(O.created_at, SA_Date)
+        else:
+            day_col = func.date(O.created_at)
+        in_month = [
+            O.created_at >= datetime.combine(first, datetime.min.time()),
+            O.created_at < datetime.combine(nxt, datetime.min.time()),
+        ]
+    else:
+        day_col = O.deadline
+        in_month = [O.deadline >= first, O.deadline < nxt]
+
+    payments_sum = payments_sum_subquery()
+    total_col = func.coalesce(O.total_amount, 0)
+    paid_col = func.coalesce(payments_sum.c.paid_amount, 0)
+    balance = total_col - paid_col
+    overdue = and_(
+        O.deadline < date.today(),
+        or_(O.status.is_(None), O.status != models.OrderStatus.topshirildi),
+    )
+    stmt = (
+        select(
+            day_col.label("day"),
+            func.count().label("orders"),
+            func.sum(total_col).label("total_amount"),
+            func.sum(paid_col).label("paid_amount"),
+            func.sum(case((balance > 0, balance), else_=0)).label("outstanding"),
+            func.sum(case((balance > 0, 1), else_=0)).label("debtors"),
+            func.sum(case((overdue, 1), else_=0)).label("overdue"),
+        )
+        .outerjoin(payments_sum, payments_sum.c.order_id == O.id)
+        .where(O.deleted_at.is_(None), *in_month)
+        .group_by(day_col)
+    )
+    found = {str(r.day)[:10]: r for r in db.execute(stmt)}
+
+    keys = ("orders", "total_amount", "paid_amount", "outstanding", "debtors", "overdue")
+    month_totals = dict.fromkeys(keys, 0)
+    days = []
+    d = first
+    while d < nxt:
+        r = found.get(d.isoformat())
+        item = {"date": d.isoformat()}
+        for k in keys:
+            v = getattr(r, k) if r is not None else 0
+            v = round(float(v or 0), 2) if k in ("total_amount", "paid_amount", "outstanding") else int(v or 0)
+            item[k] = v
+            month_totals[k] += v
+        days.append(item)
+        d += timedelta(days=1)
+
+    for k in ("total_amount", "paid_amount", "outstanding"):
+        month_totals[k] = round(month_totals[k], 2)
+    return {"month": month, "mode": mode, "totals": month_totals, "days": days}
+
+
 @router.get("/by-date")
 def orders_by_date(
     date: date = Query(..., description="YYYY-MM-DD"),
@@ -461,6 +1097,10 @@ def orders_by_date(
     - mode='deadline' -> deadline bo‘yicha (aniq sana)
     Qaytuvchi format: list_orders() dagi bilan bir xil.
     """
+    return _list_cache.get_or_set(("by-date", date, mode), lambda: _orders_by_date(db, date, mode))
+
+
+def _orders_by_date(db: Session, date: date, mode: str) -> dict:
     qs = (
         db.query(models.Order)
         .join(models.Client)
@@ -479,6 +1119,9 @@ def orders_by_date(
     qs = qs.order_by(models.Order.id.desc())
     rows = qs.all()
 
+    comments = comment_stats(db, [o.id for o in rows])
+    last_atts = last_attachments(db, [o.id for o in rows])
+    refs = refdata.get(db)
     items = []
     for o in rows:
         # to'lovlar yig'indisi
@@ -491,15 +1134,6 @@ def orders_by_date(
         state_value = stored_state if stored_state in PAYMENT_STATE_LABELS else auto_state
         pay_status = PAYMENT_STATE_LABELS.get(state_value, state_value)
 
-        last_att = None
-        if getattr(o, "attachments", None):
-            a = o.attachments[-1]
-            last_att = {
-                "id": a.id,
-                "display_name": a.original_name or a.filename,
-                "size": (a.size or 0),
-            }
-
         items.append(
             {
                 "id": o.id,
@@ -511,15 +1145,16 @@ def orders_by_date(
                 "customer_type": getattr(o.customer_type, "value", None),
                 "doc_type": o.doc_type,
                 "country": o.country,
-                "branch": o.branch.name if o.branch else None,
-                "manager": o.manager.full_name if o.manager else None,
+                "branch": refs.branch_name(o.branch_id),
+                "manager": refs.user_name(o.manager_id),
                 "deadline": o.deadline.strftime("%Y-%m-%d") if o.deadline else None,
                 "total_amount": order_total,
                 "paid_sum": paid,
                 "balance": balance,
                 "payment_method": getattr(o.payment_method, "value", None),
                 "status": getattr(o.status, "value", o.status),
-                "last_attachment": last_att,
+                "last_attachment": last_atts.get(o.id),
+                **comments.get(o.id, NO_COMMENTS),
             }
         )
 
@@ -531,12 +1166,14 @@ def payment_stats(
     granularity: str = "daily",
     date_from: Optional[date] = None,
     date_to: Optional[date] = None,
+    include_archived: bool = False,
     db: Session = Depends(get_session),
 ):
     """
     Kunlik/haftalik/oylik kesimda buyurtmalar bo'yicha to'lov statistikasini qaytaradi.
     Natijada har bir davr uchun umumiy to'langan summa va to'lov holatlari bo'yicha
-    kesim beriladi.
+    kesim beriladi. include_archived=true — arxivdagi buyurtmalar ham qo'shiladi
+    (ARCHIVE_CLOSED_AFTER_DAYS dan eski davrlar uchun).
     """
     if granularity not in ("daily", "weekly", "monthly"):
         granularity = "daily"
@@ -548,17 +1185,16 @@ def payment_stats(
     dialect_name = getattr(dialect_name, "name",
                            "sqlite") if dialect_name else "sqlite"
 
-    if dialect_name == "postgresql":
-        trunc_unit = {"daily": "day", "weekly": "week",
-                      "monthly": "month"}[granularity]
-        fmt_pg = {"daily": "YYYY-MM-DD", "weekly": "IYYY-IW",
-                  "monthly": "YYYY-MM"}[granularity]
-        bucket_expr = func.to_char(func.date_trunc(
-            trunc_unit, models.Order.created_at), fmt_pg)
-    else:
-        bucket_expr = func.strftime(fmt, models.Order.created_at)
+    def bucket_of(created_col):
+        if dialect_name == "postgresql":
+            trunc_unit = {"daily": "day", "weekly": "week",
+                          "monthly": "month"}[granularity]
+            fmt_pg = {"daily": "YYYY-MM-DD", "weekly": "IYYY-IW",
+                      "monthly": "YYYY-MM"}[granularity]
+            return func.to_char(func.date_trunc(trunc_unit, created_col), fmt_pg)
+        return func.strftime(fmt, created_col)
 
-    bucket_expr = bucket_expr.label("bucket")
+    bucket_expr = bucket_of(models.Order.created_at).label("bucket")
 
     payments_sum = (
         db.query(
@@ -591,6 +1227,33 @@ def payment_stats(
         q = q.filter(models.Order.created_at < end_dt)
 
     q = q.order_by(bucket_expr, models.Order.id)
+    result_rows = q.all()
+
+    if include_archived:
+        A, P = models.orders_archive, models.payments_archive
+        archived_paid = (
+            select(P.c.order_id, P.c.archived_at,
+                   func.coalesce(func.sum(P.c.amount), 0).label("paid_amount"))
+            .group_by(P.c.order_id, P.c.archived_at)
+            .subquery()
+        )
+        aq = (
+            select(
+                bucket_of(A.c.created_at).label("bucket"),
+                A.c.id,
+                func.coalesce(A.c.total_amount, 0),
+                func.coalesce(archived_paid.c.paid_amount, 0),
+                A.c.payment_state,
+            )
+            .outerjoin(archived_paid, and_(archived_paid.c.order_id == A.c.id,
+                                           archived_paid.c.archived_at == A.c.archived_at))
+            .where(A.c.deleted_at.is_(None))
+        )
+        if date_from:
+            aq = aq.where(A.c.created_at >= start_dt)
+        if date_to:
+            aq = aq.where(A.c.created_at < end_dt)
+        result_rows += db.execute(aq).all()
 
     def make_state_bucket():
         return {
@@ -609,7 +1272,7 @@ def payment_stats(
         }
     )
 
-    for bucket, _order_id, total_amount, paid_amount, stored_state in q.all():
+    for bucket, _order_id, total_amount, paid_amount, stored_state in result_rows:
         bucket_key = bucket or "noma'lum"
         bucket_data = buckets[bucket_key]
         bucket_data["bucket"] = bucket_key
@@ -662,3 +1325,124 @@ def payment_stats(
         )
 
     return {"granularity": granularity, "rows": rows}
+
+
+AGING_BUCKETS = ("current", "0-7", "8-30", "31-90", "90+")
+
+
+def _days_overdue(db: Session, as_of: date):
+    """
+    as_of - (deadline yoki yaratilgan kun), kunlarda. Deadline kelmagan bo'lsa manfiy.
+    """
+    O = models.Order
+    if db.bind.dialect.name == "postgresql":
+        ref = func.coalesce(O.deadline, cast(O.created_at, SA_Date))
+        return literal(as_of, SA_Date) - ref  # date - date = integer
+    # SQLite: CAST(... AS DATE) sonli bo'lib qoladi, shuning uchun date()/julianday()
+    ref = func.coalesce(O.deadline, func.date(O.created_at))
+    return cast(func.julianday(as_of.isoformat()) - func.julianday(ref), Integer)
+
+
+@router.get("/stats/debt-aging")
+def debt_aging(
+    as_of: Optional[date] = None,
+    branch_id: Optional[int] = None,
+    manager_id: Optional[int] = None,
+    db: Session = Depends(get_session),
+):
+    """
+    Qarzdorlik yoshi bo'yicha: current (muddati kelmagan), 0-7, 8-30, 31-90, 90+
+    kun (deadline'dan, u bo'lmasa yaratilgan kundan). Filial, menejer va mijoz turi
+    kesimida soni va qoldiq summasi.
+
+    Bitta GROUP BY so'rov; qarz = total_amount - to'lovlar yig'indisi —
+    list_orders(debt_only=True) va /orders/facets bilan bir xil jonli hisob
+    (denormal paid_amount ustuniga tayanilmaydi).
+    """
+    as_of = as_of or date.today()
+    O = models.Order
+    age = _days_overdue(db, as_of)
+    payments_sum = payments_sum_subquery()
+    paid_amount_col = func.coalesce(payments_sum.c.paid_amount, 0)
+    total_amount_col = func.coalesce(O.total_amount, 0)
+    inner = (
+        select(
+            O.branch_id,
+            O.manager_id,
+            O.customer_type,
+            case(
+                (age < 0, "current"),
+                (age <= 7, "0-7"),
+                (age <= 30, "8-30"),
+                (age <= 90, "31-90"),
+                else_="90+",
+            ).label("bucket"),
+            (total_amount_col - paid_amount_col).label("balance"),
+        )
+        .outerjoin(payments_sum, payments_sum.c.order_id == O.id)
+        .where(O.deleted_at.is_(None), total_amount_col > paid_amount_col)
+    )
+    if branch_id is not None:
+        inner = inner.where(O.branch_id == branch_id)
+    if manager_id is not None:
+        inner = inner.where(O.manager_id == manager_id)
+    inner = inner.subquery()
+
+    stmt = (
+        select(
+            inner.c.branch_id,
+            models.Branch.name,
+            inner.c.manager_id,
+            models.User.full_name,
+            inner.c.customer_type,
+            inner.c.bucket,
+            func.count().label("cnt"),
+            func.sum(inner.c.balance).label("amount"),
+        )
+        .outerjoin(models.Branch, models.Branch.id == inner.c.branch_id)
+        .outerjoin(models.User, models.User.id == inner.c.manager_id)
+        .group_by(inner.c.branch_id, models.Branch.name, inner.c.manager_id,
+                  models.User.full_name, inner.c.customer_type, inner.c.bucket)
+    )
+
+    def empty():
+        return {
+            "count": 0,
+            "amount": 0.0,
+            "buckets": {b: {"count": 0, "amount": 0.0} for b in AGING_BUCKETS},
+        }
+
+    totals = empty()
+    by_branch, by_manager, by_type = {}, {}, {}
+    for b_id, b_name, m_id, m_name, ctype, bucket, cnt, amount in db.execute(stmt):
+        amount = float(amount or 0)
+        ctype = getattr(ctype, "value", ctype)
+        groups = (
+            totals,
+            by_branch.setdefault(b_id, {"branch_id": b_id, "branch": b_name, **empty()}),
+            by_manager.setdefault(m_id, {"manager_id": m_id, "manager": m_name, **empty()}),
+            by_type.setdefault(ctype, {"customer_type": ctype, **empty()}),
+        )
+        for g in groups:
+            g["count"] += cnt
+            g["amount"] += amount
+            g["buckets"][bucket]["count"] += cnt
+            g["buckets"][bucket]["amount"] += amount
+
+    def finish(g):
+        g["amount"] = round(g["amount"], 2)
+        for v in g["buckets"].values():
+            v["amount"] = round(v["amount"], 2)
+        return g
+
+    def ordered(d):
+        return sorted((finish(g) for g in d.values()), key=lambda g: -g["amount"])
+
+    return {
+        "as_of": str(as_of),
+        "buckets": list(AGING_BUCKETS),
+        "totals": finish(totals),
+        "by_branch": ordered(by_branch),
+        "by_manager": ordered(by_manager),
+        "by_customer_type": ordered(by_type),
+    }
@@ -1,37 +1,342 @@
-from fastapi import APIRouter, Depends, HTTPException
+import codecs
+import csv
+import io
+import math
+import re
+from datetime import date, datetime
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Header
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.database import get_session
+from sqlalchemy import func, select, update, insert, case, cast, and_
+from app.database import begin_write, get_session
 from app import models, schemas
+from app.config import IMPORT_BATCH_SIZE
+from app.events import publish
 
 router = APIRouter(prefix="/payments", tags=["payments"])
 
-@router.post("/{order_id}", status_code=201)
-def add_payment(order_id: int, payload: schemas.PaymentIn, db: Session = Depends(get_session)):
+def payment_state_expr(paid, total):
+    """paid/total SQL ifodalaridan payment_state (UNPAID / PARTIAL / PAID)."""
+    return cast(
+        case(
+            (paid <= 0, models.PaymentState.UNPAID.name),
+            (and_(total > 0, paid >= total), models.PaymentState.PAID.name),
+            else_=models.PaymentState.PARTIAL.name,
+        ),
+        models.Order.payment_state.type,
+    )
+
+
+def _replay(db: Session, order_id: int, key: str, amount: float):
+    """Shu kalit bilan to'lov bor bo'lsa — o'sha javobni qaytaradi (yangi to'lovsiz)."""
+    p = db.scalar(select(models.Payment).where(models.Payment.idempotency_key == key))
+    if p is None:
+        return None
+    if p.order_id != order_id or round(float(p.amount), 2) != round(float(amount), 2):
+        raise HTTPException(409, "Idempotency-Key boshqa to'lov uchun ishlatilgan")
     o = db.get(models.Order, order_id)
-    if not o:
+    return {"ok": True, "payment_id": p.id, "replayed": True,
+            "paid_amount": float(o.paid_amount or 0), "payment_state": o.payment_state.value}
+
+
+@router.post("/{order_id:int}", status_code=201)
+def add_payment(
+    order_id: int,
+    payload: schemas.PaymentIn,
+    db: Session = Depends(get_session),
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key", max_length=64),
+):
+    """
+    To'lov va buyurtma summasi bitta tranzaksiyada: buyurtma qatori qulflanadi
+    (Postgres FOR UPDATE, SQLite BEGIN IMMEDIATE), paid_amount ga delta qo'shiladi.
+    Parallel to'lovlar bir-birini yo'qotmaydi, Idempotency-Key bilan qayta
+    yuborilgan so'rov avvalgi natijani qaytaradi.
+    """
+    key = (idempotency_key or "").strip() or None
+    if key and (res := _replay(db, order_id, key, payload.amount)):
+        return res
+
+    O = models.Order
+    begin_write(db)
+    if db.scalar(select(O.id).where(O.id == order_id).with_for_update()) is None:
+        db.rollback()
         raise HTTPException(status_code=404, detail="Order not found")
+    # qulfni kutgan parallel retry birinchisining natijasini ko'radi
+    if key and (res := _replay(db, order_id, key, payload.amount)):
+        db.rollback()
+        return res
+
     p = models.Payment(
         order_id=order_id,
         amount=payload.amount,
         method=payload.method if isinstance(payload.method, str) else payload.method.value,
         paid_at=payload.paid_at,
         note=payload.note,
+        idempotency_key=key,
     )
     db.add(p)
+    try:
+        db.flush()
+    except IntegrityError:
+        # kalit boshqa buyurtmaga tegishli (unique index)
+        db.rollback()
+        if key and (res := _replay(db, order_id, key, payload.amount)):
+            return res
+        raise
+    paid = func.coalesce(O.paid_amount, 0) + payload.amount
+    stmt = (
+        update(O)
+        .where(O.id == order_id)
+        .values(paid_amount=paid,
+                payment_state=payment_state_expr(paid, func.coalesce(O.total_amount, 0)))
+        .execution_options(synchronize_session=False)
+    )
+    if db.bind.dialect.update_returning:
+        paid_amount, state = db.execute(stmt.returning(O.paid_amount, O.payment_state)).one()
+    else:
+        # RETURNING yo'q (MySQL, eski SQLite): qator qulflangan, shu tranzaksiyada o'qiymiz
+        db.execute(stmt)
+        paid_amount, state = db.execute(
+            select(O.paid_amount, O.payment_state).where(O.id == order_id)).one()
     db.commit()
 
-    # recalc
-    paid = db.query(func.coalesce(func.sum(models.Payment.amount), 0)).filter(models.Payment.order_id == order_id).scalar() or 0
-    o.paid_amount = paid
-    total = float(o.total_amount or 0)
-    if paid <= 0:
-        o.payment_state = models.PaymentState.UNPAID
-    elif total > 0 and paid >= total:
-        o.payment_state = models.PaymentState.PAID
+    publish("payment.added", order_id=order_id, payment_id=p.id,
+            paid_amount=float(paid_amount), payment_state=state.value)
+    return {"ok": True, "payment_id": p.id,
+            "paid_amount": float(paid_amount), "payment_state": state.value}
+
+
+# ---------------- CSV import ----------------
+
+def recalc_paid_amounts(db: Session, order_ids) -> None:
+    """
+    paid_amount / payment_state ni berilgan buyurtmalar uchun bitta set-based
+    UPDATE bilan qayta hisoblaydi (add_payment dagi qoidaga mos).
+    """
+    ids = sorted(set(order_ids))
+    paid = (
+        select(func.coalesce(func.sum(models.Payment.amount), 0))
+        .where(models.Payment.order_id == models.Order.id)
+        .scalar_subquery()
+    )
+    state = payment_state_expr(paid, func.coalesce(models.Order.total_amount, 0))
+    for i in range(0, len(ids), IMPORT_BATCH_SIZE):
+        chunk = ids[i:i + IMPORT_BATCH_SIZE]
+        db.execute(
+            update(models.Order)
+            .where(models.Order.id.in_(chunk))
+            .values(paid_amount=paid, payment_state=state)
+            .execution_options(synchronize_session=False)
+        )
+
+
+_THOUSANDS_RE = {sep: re.compile(r"^\d{1,3}(%s\d{3})+$" % re.escape(sep)) for sep in ",."}
+_NUMBER_RE = re.compile(r"^\d+(\.\d+)?$")
+
+
+def _parse_amount(raw: str) -> float:
+    """
+    "150000", "150 000", "150,000", "1.500.000", "1,500.50", "1.500,50", "150,5".
+    Ikkala ajratkich bo'lsa oxirgisi — kasr qismi; bitta vergul va undan keyin
+    aynan 3 raqam — minglik ajratkich. nan/inf/eksponenta qabul qilinmaydi.
+    """
+    s = (raw or "").replace("\u00a0", "").replace(" ", "").replace("'", "")
+    if not s:
+        raise ValueError("amount bo'sh")
+    if "," in s and "." in s:
+        thousands = "," if s.rfind(",") < s.rfind(".") else "."
+        s = s.replace(thousands, "").replace(",", ".")
+    elif _THOUSANDS_RE[","].match(s) or (s.count(".") > 1 and _THOUSANDS_RE["."].match(s)):
+        s = s.replace(",", "").replace(".", "")
     else:
-        o.payment_state = models.PaymentState.PARTIAL
+        s = s.replace(",", ".")
+    if not _NUMBER_RE.match(s):
+        raise ValueError(f"noto'g'ri summa: {raw!r}")
+    v = float(s)
+    if not math.isfinite(v) or v <= 0:
+        raise ValueError("amount musbat bo'lishi kerak")
+    return v
 
-    db.commit()
-    db.refresh(o)
-    return {"ok": True, "paid_amount": float(o.paid_amount), "payment_state": o.payment_state.value}
+
+def _sniff_encoding(f, sample_size: int = 64 * 1024) -> str:
+    """UTF-8 (BOM bilan/siz), UTF-16 (BOM) yoki cp1251 — bank eksportlari uchun."""
+    head = f.read(sample_size)
+    f.seek(0)
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # namuna oxiridagi kesilgan ko'p baytli belgi xato emas (final=False)
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1251"
+
+
+def _parse_method(raw: str) -> models.PayMethod:
+    v = (raw or "").strip().lower()
+    try:
+        return models.PayMethod(v)
+    except ValueError:
+        if v in models.PayMethod.__members__:
+            return models.PayMethod[v]
+    raise ValueError(f"noma'lum to'lov turi: {raw!r}")
+
+
+def _parse_date(raw: str) -> date:
+    v = (raw or "").strip()
+    if not v:
+        return date.today()
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(v[:10], fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"noto'g'ri sana: {raw!r}")
+
+
+def _resolve_batch(db: Session, batch: list) -> None:
+    """Batchdagi order_id / telefonlarni ikkita IN so'rov bilan tekshiradi."""
+    ids = {r["order_id"] for r in batch if r.get("order_id")}
+    phones = {r["phone"] for r in batch if not r.get("order_id") and r.get("phone")}
+
+    existing = set()
+    if ids:
+        existing = set(db.scalars(
+            select(models.Order.id).where(
+                models.Order.id.in_(ids), models.Order.deleted_at.is_(None))
+        ))
+
+    by_phone = {}
+    if phones:
+        rows = db.execute(
+            select(models.Client.phone, models.Order.id)
+            .join(models.Order, models.Order.client_id == models.Client.id)
+            .where(models.Client.phone.in_(phones), models.Order.deleted_at.is_(None))
+            # avval to'liq to'lanmaganlar, keyin eng yangisi
+            .order_by(
+                case((models.Order.payment_state == models.PaymentState.PAID, 1), else_=0),
+                models.Order.id.desc(),
+            )
+        )
+        for phone, oid in rows:
+            by_phone.setdefault(phone, oid)
+
+    for r in batch:
+        if r.get("order_id"):
+            if r["order_id"] not in existing:
+                r["error"] = "Order not found"
+        elif r["phone"] in by_phone:
+            r["order_id"] = by_phone[r["phone"]]
+        else:
+            r["error"] = "Bu telefon bo'yicha buyurtma topilmadi"
+
+
+@router.post("/import")
+def import_payments(
+    file: UploadFile = File(...),
+    delimiter: str = Query(",", min_length=1, max_length=1),
+    dry_run: bool = False,
+    db: Session = Depends(get_session),
+):
+    """
+    Bank ko'chirmasi / CSV dan to'lovlarni import qilish.
+    Ustunlar: amount, method, paid_at, order_id yoki phone (client_phone), note.
+    Fayl qatorma-qator o'qiladi, to'lovlar IMPORT_BATCH_SIZE bo'yicha qo'shiladi,
+    ta'sirlangan buyurtmalar summasi oxirida bir marta qayta hisoblanadi.
+    """
+    encoding = _sniff_encoding(file.file)
+    text = io.TextIOWrapper(file.file, encoding=encoding, newline="")
+    reader = csv.DictReader(text, delimiter=delimiter)
+    try:
+        fieldnames = reader.fieldnames
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"CSV o'qib bo'lmadi ({encoding}): {e}")
+    if not fieldnames or "amount" not in [h.strip().lower() for h in fieldnames]:
+        raise HTTPException(status_code=400, detail="CSV sarlavhasida 'amount' ustuni yo'q")
+
+    report = []
+    affected = set()
+    inserted = 0
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        _resolve_batch(db, batch)
+        good = [r for r in batch if not r.get("error")]
+        if good:
+            db.execute(insert(models.Payment), [
+                {
+                    "order_id": r["order_id"],
+                    "amount": r["amount"],
+                    "method": r["method"],
+                    "paid_at": r["paid_at"],
+                    "note": r["note"],
+                }
+                for r in good
+            ])
+            inserted += len(good)
+            affected.update(r["order_id"] for r in good)
+        for r in batch:
+            report.append({
+                "row": r["row"],
+                "ok": not r.get("error"),
+                "order_id": r.get("order_id"),
+                "amount": r.get("amount"),
+                "error": r.get("error"),
+            })
+        batch.clear()
+
+    rows = enumerate(reader, start=2)
+    while True:
+        try:
+            line_no, raw = next(rows)
+        except StopIteration:
+            break
+        except (UnicodeDecodeError, csv.Error) as e:
+            # fayl o'rtasida buzilgan bo'lsa — qisman import qilinmaydi
+            db.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail=f"CSV {reader.line_num + 1}-qatordan keyin o'qib bo'lmadi ({encoding}): {e}",
+            )
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in raw.items()}
+        item = {"row": line_no}
+        try:
+            item["amount"] = _parse_amount(row.get("amount"))
+            item["method"] = _parse_method(row.get("method"))
+            item["paid_at"] = _parse_date(row.get("paid_at"))
+            item["note"] = row.get("note") or None
+            oid = row.get("order_id")
+            item["order_id"] = int(oid) if oid else None
+            item["phone"] = row.get("phone") or row.get("client_phone") or None
+            if not item["order_id"] and not item["phone"]:
+                raise ValueError("order_id yoki phone kerak")
+        except ValueError as e:
+            report.append({"row": line_no, "ok": False, "order_id": None,
+                           "amount": item.get("amount"), "error": str(e)})
+            continue
+        batch.append(item)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+
+    if affected:
+        recalc_paid_amounts(db, affected)
+
+    if dry_run:
+        db.rollback()
+    else:
+        db.commit()
+        if affected:
+            publish("payments.imported", order_ids=sorted(affected), count=inserted)
+
+    return {
+        "dry_run": dry_run,
+        "inserted": 0 if dry_run else inserted,
+        "valid": inserted,
+        "failed": sum(1 for r in report if not r["ok"]),
+        "orders_updated": len(affected),
+        "rows": sorted(report, key=lambda r: r["row"]),
+    }
@@ -0,0 +1,292 @@
+# app/routers/upload_sessions.py
+"""
+Bo'laklab (resumable) yuklash — sekin va uzilib qoladigan mobil tarmoqlar uchun.
+
+    POST   /orders/{id}/uploads                  {filename, size, mime?, kind?, sha256?}
+                                                 -> {upload_id, offset, chunk_size, expires_at}
+    PUT    /orders/{id}/uploads/{uid}            tana = bo'lak, Upload-Offset: <offset>
+                                                 [X-Chunk-SHA256: <hex>] -> {offset}
+    GET    /orders/{id}/uploads/{uid}            -> {offset, size}  (uzilishdan keyin davom etish)
+    POST   /orders/{id}/uploads/{uid}/complete   -> {id, kind}  (Attachment)
+    DELETE /orders/{id}/uploads/{uid}
+
+Bo'laklar UPLOAD_DIR/.sessions/<uid>.part ga yoziladi. Umumiy sha256 jarayon
+xotirasida bo'lakma-bo'lak hisoblanadi (jarayon qayta ishga tushsa — fayldan
+tiklanadi). Muddati o'tgan sessiyalarni "uploads.cleanup" fon vazifasi o'chiradi.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import images, models, schemas, storage
+from app.config import (
+    CHUNKED_UPLOAD_MAX_MB,
+    UPLOAD_CHUNK_MAX_MB,
+    UPLOAD_SESSION_TTL_HOURS,
+    sanitize_filename,
+)
+from app.database import SessionLocal, get_session
+from app.events import publish
+from app.routers.orders import attachment_kind, check_upload_type
+
+router = APIRouter(prefix="/orders", tags=["attachments"])
+
+_MB = 1024 * 1024
+_CHUNK_MAX = UPLOAD_CHUNK_MAX_MB * _MB
+
+# upload_id -> (offset, sha256 obyekti); jarayon ichida, chegaralangan
+_hashes: OrderedDict = OrderedDict()
+_hashes_lock = threading.Lock()
+# upload_id -> [Lock, kutayotganlar soni]; oxirgi foydalanuvchi chiqqanda o'chadi,
+# shuning uchun lug'at faqat hozir ishlanayotgan sessiyalar hajmida
+_session_locks: dict = {}
+
+
+@contextmanager
+def _session_lock(upload_id: str):
+    with _hashes_lock:
+        entry = _session_locks.setdefault(upload_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _hashes_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _session_locks.pop(upload_id, None)
+
+
+def _forget(upload_id: str) -> None:
+    with _hashes_lock:
+        _hashes.pop(upload_id, None)
+
+
+def _running_hash(upload_id: str, offset: int, path: str):
+    """offset gacha bo'lgan sha256 (nusxa — keshdagisi commit'gacha o'zgarmaydi);
+    keshda bo'lmasa fayldan qayta hisoblanadi."""
+    with _hashes_lock:
+        entry = _hashes.get(upload_id)
+    if entry is not None and entry[0] == offset:
+        return entry[1].copy()
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        left = offset
+        while left > 0 and (block := f.read(min(_MB, left))):
+            h.update(block)
+            left -= len(block)
+    return h
+
+
+def _remember(upload_id: str, offset: int, h) -> None:
+    with _hashes_lock:
+        _hashes[upload_id] = (offset, h)
+        _hashes.move_to_end(upload_id)
+        while len(_hashes) > 1000:
+            _hashes.popitem(last=False)
+
+
+def _expires() -> datetime:
+    return datetime.utcnow() + timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+
+
+def _get_session(db: Session, order_id: int, upload_id: str) -> models.UploadSession:
+    s = db.get(models.UploadSession, upload_id)
+    if not s or s.order_id != order_id:
+        raise HTTPException(404, "Upload session not found")
+    if s.expires_at < datetime.utcnow():
+        raise HTTPException(410, "Upload session expired")
+    return s
+
+
+def _offset_conflict(current: int) -> HTTPException:
+    return HTTPException(409, detail={"message": "Offset mismatch", "offset": current},
+                         headers={"Upload-Offset": str(current)})
+
+
+@router.post("/{order_id}/uploads", status_code=201)
+def create_upload_session(order_id: int, payload: schemas.UploadSessionIn,
+                          db: Session = Depends(get_session)):
+    if not db.get(models.Order, order_id):
+        raise HTTPException(status_code=404, detail="Order not found")
+    if payload.size > CHUNKED_UPLOAD_MAX_MB * _MB:
+        raise HTTPException(status_code=400, detail="File too large")
+    ext = check_upload_type(payload.filename, payload.mime)
+    s = models.UploadSession(
+        order_id=order_id,
+        kind=attachment_kind(payload.kind),
+        original_name=sanitize_filename(payload.filename),
+        mime=payload.mime,
+        ext=ext,
+        size=payload.size,
+        received=0,
+        sha256=payload.sha256.lower() if payload.sha256 else None,
+        expires_at=_expires(),
+    )
+    db.add(s)
+    db.flush()
+    os.makedirs(storage.SESSIONS_DIR, exist_ok=True)
+    open(storage.session_part_path(s.id), "wb").close()
+    db.commit()
+    return {"upload_id": s.id, "offset": 0, "size": s.size, "chunk_size": _CHUNK_MAX,
+            "expires_at": s.expires_at.isoformat(timespec="seconds")}
+
+
+@router.get("/{order_id}/uploads/{upload_id}")
+def upload_session_status(order_id: int, upload_id: str, response: Response,
+                          db: Session = Depends(get_session)):
+    s = _get_session(db, order_id, upload_id)
+    response.headers["Upload-Offset"] = str(s.received)
+    return {"upload_id": s.id, "offset": s.received, "size": s.size,
+            "expires_at": s.expires_at.isoformat(timespec="seconds")}
+
+
+def _append(order_id: int, upload_id: str, offset: int, data: bytes,
+            chunk_sha256: Optional[str]) -> dict:
+    if chunk_sha256 and hashlib.sha256(data).hexdigest() != chunk_sha256.strip().lower():
+        raise HTTPException(400, "Chunk checksum mismatch")
+    S = models.UploadSession
+    with _session_lock(upload_id):
+        db = SessionLocal()
+        try:
+            s = _get_session(db, order_id, upload_id)
+            if offset != s.received:
+                raise _offset_conflict(s.received)
+            if offset + len(data) > s.size:
+                raise HTTPException(400, "Chunk exceeds declared size")
+            path = storage.session_part_path(s.id)
+            h = _running_hash(s.id, offset, path)
+            new_offset = offset + len(data)
+            # avval oraliqni "band qilamiz": shartli UPDATE qator qulfini commit'gacha
+            # ushlab turadi, boshqa jarayon shu offsetga yozolmaydi (0 qator -> 409)
+            res = db.execute(
+                update(S).where(S.id == s.id, S.received == offset)
+                .values(received=new_offset, expires_at=_expires())
+            )
+            if res.rowcount == 0:
+                db.rollback()
+                _forget(s.id)
+                raise _offset_conflict(db.get(S, s.id).received)
+            with open(path, "r+b") as f:
+                f.seek(offset)
+                f.write(data)
+                f.truncate()
+            h.update(data)
+            db.commit()
+            _remember(s.id, new_offset, h)
+            return {"offset": new_offset, "size": s.size}
+        finally:
+            db.close()
+
+
+@router.put("/{order_id}/uploads/{upload_id}")
+async def put_upload_chunk(
+    order_id: int,
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    chunk_sha256: Optional[str] = Header(default=None, alias="X-Chunk-SHA256"),
+):
+    """Bo'lak tanasi xom baytlar. Disk va DB ishi threadpool'da — event loop band bo'lmaydi."""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > _CHUNK_MAX:
+        raise HTTPException(413, f"Chunk too large (max {UPLOAD_CHUNK_MAX_MB} MB)")
+    body = bytearray()
+    async for part in request.stream():
+        body += part
+        if len(body) > _CHUNK_MAX:
+            raise HTTPException(413, f"Chunk too large (max {UPLOAD_CHUNK_MAX_MB} MB)")
+    if not body:
+        raise HTTPException(400, "Empty chunk")
+    res = await run_in_threadpool(_append, order_id, upload_id, upload_offset,
+                                  bytes(body), chunk_sha256)
+    response.headers["Upload-Offset"] = str(res["offset"])
+    return res
+
+
+@router.post("/{order_id}/uploads/{upload_id}/complete", status_code=201)
+def complete_upload_session(order_id: int, upload_id: str, db: Session = Depends(get_session)):
+    with _session_lock(upload_id):
+        s = _get_session(db, order_id, upload_id)
+        if s.received != s.size:
+            raise _offset_conflict(s.received)
+        part = storage.session_part_path(s.id)
+        digest = _running_hash(s.id, s.size, part).hexdigest()
+        if s.sha256 and s.sha256 != digest:
+            storage.remove_quietly(part)
+            db.delete(s)
+            db.commit()
+            _forget(upload_id)
+            raise HTTPException(400, "Checksum mismatch — faylni qaytadan yuklang")
+
+        key = storage.new_key(s.ext)
+        dest = storage.path_of(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(part, dest)
+        att = models.Attachment(
+            order_id=s.order_id,
+            kind=s.kind,
+            filename=os.path.basename(key),
+            storage_key=key,
+            checksum_sha256=digest,
+            original_name=s.original_name,
+            mime=s.mime,
+            size=s.size,
+        )
+        db.add(att)
+        db.delete(s)
+        try:
+            db.flush()
+            images.queue_normalize(db, [att])
+            db.commit()
+        except Exception:
+            os.replace(dest, part)  # sessiya saqlanib qoladi — complete ni qayta chaqirish mumkin
+            raise
+    _forget(upload_id)
+    publish("attachment.added", order_id=order_id, attachment_id=att.id, kind=att.kind.value)
+    return {"id": att.id, "kind": att.kind.value, "size": att.size}
+
+
+@router.delete("/{order_id}/uploads/{upload_id}", status_code=204)
+def abort_upload_session(order_id: int, upload_id: str, db: Session = Depends(get_session)):
+    s = db.get(models.UploadSession, upload_id)
+    if not s or s.order_id != order_id:
+        raise HTTPException(404, "Upload session not found")
+    db.delete(s)
+    db.commit()
+    storage.remove_quietly(storage.session_part_path(upload_id))
+    _forget(upload_id)
+
+
+def cleanup_expired(db: Session, batch: int = 500) -> int:
+    """Muddati o'tgan sessiyalar va egasiz .part fayllarni o'chiradi."""
+    S = models.UploadSession
+    now = datetime.utcnow()
+    removed = 0
+    while ids := db.scalars(select(S.id).where(S.expires_at < now).limit(batch)).all():
+        db.execute(delete(S).where(S.id.in_(ids)))
+        db.commit()
+        for uid in ids:
+            storage.remove_quietly(storage.session_part_path(uid))
+            _forget(uid)
+        removed += len(ids)
+    # sessiyasi yo'q (masalan, DB tiklangan) va TTL dan eski qism fayllar
+    if os.path.isdir(storage.SESSIONS_DIR):
+        cutoff = now.timestamp() - UPLOAD_SESSION_TTL_HOURS * 3600
+        with os.scandir(storage.SESSIONS_DIR) as it:
+            for e in it:
+                if e.name.endswith(".part") and e.stat().st_mtime < cutoff \
+                        and db.get(S, e.name[:-len(".part")]) is None:
+                    storage.remove_quietly(e.path)
+                    removed += 1
+    return removed
@@ -1,9 +1,10 @@
-import os, uuid, hashlib
+import os, hashlib
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from sqlalchemy.orm import Session
 from app.database import get_session
-from app import models
-from app.config import UPLOAD_DIR, MAX_UPLOAD_MB, ALLOWED_MIME
+from app import models, storage
+from app.config import MAX_UPLOAD_MB, ALLOWED_MIME
+from app.events import publish
 try: import magic
 except Exception: magic=None
 router=APIRouter(prefix="/orders",tags=["attachments"])
@@ -17,17 +18,18 @@ async def upload_attachment(order_id:int, file:UploadFile=File(...), kind:str=Fo
     mime = magic.from_buffer(data, mime=True) if magic else (file.content_type or "application/octet-stream")
     if mime not in ALLOWED_MIME: raise HTTPException(400,"faqat JPG yoki PDF ruxsat")
     ext=".jpg" if mime=="image/jpeg" else ".pdf"
-    subdir=f"orders/{order_id}"; os.makedirs(os.path.join(UPLOAD_DIR,subdir), exist_ok=True)
-    fname=f"{uuid.uuid4().hex}{ext}"; storage=os.path.join(UPLOAD_DIR,subdir,fname)
-    with open(storage,"wb") as f: f.write(data)
+    key=storage.new_key(ext.lstrip(".")); storage.write_file(key, data)
     if kind=="initial_doc":
         ex=db.query(models.Attachment).filter_by(order_id=order_id, kind="initial_doc").first()
         if ex:
-            try: os.remove(ex.storage_key)
+            try: os.remove(storage.resolve(ex))
             except Exception: pass
             db.delete(ex); db.commit()
-    att=models.Attachment(order_id=order_id, kind=kind, original_name=file.filename, mime=mime, size_bytes=len(data), storage_key=storage, checksum_sha256=_sha256(data), uploaded_by=order.manager_id)
-    db.add(att); db.commit(); return {"ok":True,"id":att.id,"url":f"/files/{subdir}/{fname}"}
+    att=models.Attachment(order_id=order_id, kind=kind, original_name=file.filename, mime=mime, filename=os.path.basename(key), size=len(data), storage_key=key, checksum_sha256=_sha256(data), uploaded_by=order.manager_id)
+    db.add(att); db.commit(); publish("attachment.added", order_id=order_id, attachment_id=att.id, kind=kind)
+    return {"ok":True,"id":att.id,"url":f"/files/{key}"}
 @router.get("/{order_id}/attachments")
 def list_attachments(order_id:int, db:Session=Depends(get_session)):
-    return db.query(models.Attachment).filter_by(order_id=order_id).order_by(models.Attachment.id.desc()).all()
+    # ORM obyektlar o'rniga faqat kerakli ustunlar (orders.list_attachments bilan bir xil)
+    from app.routers.orders import attachment_rows
+    return attachment_rows(db, order_id)
@@ -2,8 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, Form
 from sqlalchemy.orm import Session
 from app.database import get_session
 from app.models import VerifiedDoc
-from app.config import QR_DIR, VERIFY_BASE_URL
-import qrcode, os
+from app.config import VERIFY_BASE_URL
+from app.jobs import enqueue
 from datetime import datetime
 
 router = APIRouter(prefix="/verify", tags=["verify"])
@@ -35,21 +35,16 @@ def create_verified_doc(
         order_id=order_id,
     )
     db.add(vd)
-    db.commit()
-    db.refresh(vd)
+    db.flush()  # id va public_id
 
     # QR link (public_id bilan)
     url = f"{VERIFY_BASE_URL}/{vd.public_id}"
 
-    # QR rasmni saqlaymiz
+    # QR rasm fon vazifasida chiziladi (app/tasks.py), hujjat bilan bitta commit;
+    # tayyor bo'lgach qr_filename to'ldiriladi, holati: GET /jobs/{qr_job_id}
     filename = f"qr_{vd.public_id}.png"
-    path = os.path.join(QR_DIR, filename)
-    img = qrcode.make(url)
-    img.save(path)
-
-    vd.qr_filename = filename
+    job = enqueue(db, "qr.render", {"doc_id": vd.id, "url": url, "filename": filename})
     db.commit()
-    db.refresh(vd)
 
     return {
         "ok": True,
@@ -57,6 +52,7 @@ def create_verified_doc(
         "public_id": vd.public_id,
         "verify_url": url,
         "qr_image": f"/static/qr/{filename}",
+        "qr_job_id": job.id,
     }
 
 @router.get("/{public_id}")
@@ -4,6 +4,8 @@ from datetime import date
 from datetime import datetime
 from typing import Optional
 
+from app.config import BULK_MAX_IDS
+
 
 class LoginIn(BaseModel):
     username: str
@@ -88,6 +90,17 @@ class OrderStatusUpdate(BaseModel):
         pattern="^(hali_boshlanmagan|jarayonda|tayyor|topshirildi)$")
 
 
+class OrderBulkUpdate(BaseModel):
+    """PATCH /orders/bulk — bir nechta buyurtmaga bitta o'zgarish."""
+    ids: list[int] = Field(min_length=1, max_length=BULK_MAX_IDS)
+    status: Optional[str] = Field(
+        default=None, pattern="^(hali_boshlanmagan|jarayonda|tayyor|topshirildi)$")
+    payment_state: Optional[str] = Field(
+        default=None, pattern="^(UNPAID|PARTIAL|PAID)$")
+    payment_method: Optional[str] = None
+    delete: bool = False
+
+
 class CommentCreate(BaseModel):
     text: str
     author: str | None = None
@@ -102,3 +115,11 @@ class CommentOut(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class UploadSessionIn(BaseModel):
+    filename: str
+    size: int = Field(gt=0)
+    mime: Optional[str] = None
+    kind: str = "translation"
+    sha256: Optional[str] = Field(default=None, pattern="^[0-9a-fA-F]{64}$")
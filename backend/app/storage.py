@@ -0,0 +1,495 @@
+# app/storage.py
+"""
+Yuklangan fayllar ombori (UPLOAD_DIR): yo'llar, migratsiya va yaxlitlik tekshiruvi.
+
+Attachment.storage_key — UPLOAD_DIR ga nisbatan yo'l. Yangi fayllar
+"ab/cd/<uuid>.<ext>" ko'rinishida (new_key) — bitta katalogda yuz minglab fayl
+bo'lmaydi. Eski qatorlarda faqat filename bor (tekis UPLOAD_DIR) yoki
+"orders/<id>/..." — key_of()/resolve() hammasini tushunadi.
+
+    python -m app.storage migrate                 # eski fayllarni ab/cd/ ga ko'chirish
+                                                  # (yoki POST /admin/storage/migrate — fon vazifasi)
+
+    python -m app.storage scan                    # hisobot: JSON qatorlar + yakun
+    python -m app.storage scan --verify-hash      # sha256 ni ham solishtirish
+    python -m app.storage scan --fill-checksums   # bo'sh checksum_sha256 ni to'ldirish
+    python -m app.storage scan --quarantine       # yetim fayllar -> STORAGE_QUARANTINE_DIR
+    python -m app.storage scan --prune-dangling   # fayli yo'q qatorlarni o'chirish
+
+Xotira chegaralangan: daraxt generator bilan aylanadi, fayllar STORAGE_SCAN_BATCH
+tadan olinib bitta IN (...) so'rov bilan bazaga solishtiriladi, stat/sha256
+STORAGE_SCAN_WORKERS oqimli pool'da. Qatorlar id bo'yicha keyset bilan o'qiladi.
+Nuqta bilan boshlanadigan kataloglar (.quarantine va h.k.) o'tkazib yuboriladi.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Iterator, Optional
+from uuid import uuid4
+
+from starlette.staticfiles import StaticFiles
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import (
+    STORAGE_MIGRATE_BATCH,
+    STORAGE_ORPHAN_MIN_AGE_SEC,
+    STORAGE_QUARANTINE_DIR,
+    STORAGE_SCAN_BATCH,
+    STORAGE_SCAN_WORKERS,
+    UPLOAD_DIR,
+)
+
+_ROOT = os.path.normpath(UPLOAD_DIR)
+# bo'laklab yuklash qismlari (nuqtali katalog — skan va /files ko'rmaydi)
+SESSIONS_DIR = os.path.join(_ROOT, ".sessions")
+
+
+def key_of(storage_key: Optional[str], filename: Optional[str]) -> str:
+    """Qatordan ombordagi kalit (UPLOAD_DIR ga nisbatan yo'l)."""
+    if storage_key:
+        return storage_key
+    return os.path.basename(filename or "")
+
+
+def path_of(key: str) -> str:
+    """Kalit -> absolyut yo'l; UPLOAD_DIR dan chiqib ketsa ValueError."""
+    path = os.path.normpath(os.path.join(_ROOT, key))
+    if not key or not path.startswith(_ROOT + os.sep):
+        raise ValueError(f"noto'g'ri storage key: {key!r}")
+    return path
+
+
+def attachment_path(att) -> str:
+    return path_of(key_of(att.storage_key, att.filename))
+
+
+_SHARDED = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[^/]+$")
+_HEX = re.compile(r"^[0-9a-f]{4}")
+
+
+def new_key(ext: str) -> str:
+    """Yangi fayl uchun kalit: ab/cd/<uuid>.<ext>."""
+    u = uuid4().hex
+    return f"{u[:2]}/{u[2:4]}/{u}.{ext or 'bin'}"
+
+
+def shard_key(key: str) -> str:
+    """Eski (tekis yoki orders/<id>/) kalitning ab/cd/ dagi o'rni."""
+    name = os.path.basename(key)
+    h = name.lower() if _HEX.match(name.lower()) else hashlib.md5(name.encode()).hexdigest()
+    return f"{h[:2]}/{h[2:4]}/{name}"
+
+
+def is_sharded(key: Optional[str]) -> bool:
+    return bool(key and _SHARDED.match(key))
+
+
+def resolve(att) -> Optional[str]:
+    """
+    Mavjud fayl yo'li yoki None. Migratsiya paytida qator eski kalit bilan
+    o'qilgan bo'lsa, fayl allaqachon ab/cd/ ga ko'chgan bo'lishi mumkin.
+    """
+    try:
+        key = key_of(att.storage_key, att.filename)
+        for k in (key,) if is_sharded(key) else (key, shard_key(key)):
+            path = path_of(k)
+            if os.path.isfile(path):
+                return path
+    except ValueError:
+        pass
+    return None
+
+
+def session_part_path(upload_id: str) -> str:
+    return os.path.join(SESSIONS_DIR, f"{os.path.basename(upload_id)}.part")
+
+
+def write_file(key: str, data: bytes) -> str:
+    path = path_of(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as out:
+        out.write(data)
+    return path
+
+
+class FileTooLarge(ValueError):
+    pass
+
+
+def write_stream(key: str, src, limit: int = 0, chunk: int = 1024 * 1024) -> tuple:
+    """
+    Fayl obyektini bo'laklab yozadi (butun fayl xotiraga o'qilmaydi).
+    (hajm, sha256) qaytaradi; limit oshsa yoki xato bo'lsa yarim fayl o'chiriladi.
+    """
+    path = path_of(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while block := src.read(chunk):
+                size += len(block)
+                if limit and size > limit:
+                    raise FileTooLarge(key)
+                h.update(block)
+                out.write(block)
+    except BaseException:
+        remove_quietly(path)
+        raise
+    return size, h.hexdigest()
+
+
+def remove_quietly(path: Optional[str]) -> None:
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class UploadStaticFiles(StaticFiles):
+    """/files: eski URL lar (/files/<name>, /files/orders/5/<name>) ab/cd/ dan topiladi."""
+
+    def lookup_path(self, path: str):
+        if any(part.startswith(".") for part in path.split("/")):
+            return "", None  # .quarantine va boshqa xizmat kataloglari
+        full, st = super().lookup_path(path)
+        if st is None and not is_sharded(path.strip("/")):
+            full, st = super().lookup_path(shard_key(path))
+        return full, st
+
+
+# ---------------- Migratsiya (tekis -> ab/cd/) ----------------
+
+
+def _place(old: str, new: str) -> bool:
+    """Faylni yangi joyga hardlink (bo'lmasa nusxa) qiladi; eski joy keyin o'chiriladi."""
+    os.makedirs(os.path.dirname(new), exist_ok=True)
+    try:
+        os.link(old, new)
+    except FileExistsError:
+        # oldingi uzilgan urinish: xuddi shu fayl bo'lsa davom etamiz
+        return os.path.samefile(old, new) or os.path.getsize(old) == os.path.getsize(new)
+    except OSError:
+        shutil.copy2(old, new)
+    return True
+
+
+def migrate_batch(db: Session, after: int = 0, batch: int = STORAGE_MIGRATE_BATCH) -> dict:
+    """
+    id > after bo'lgan, hali ab/cd/ da bo'lmagan `batch` ta qatorni ko'chiradi.
+    Tartib: link -> qator commit -> eski faylni o'chirish, shuning uchun har
+    qanday paytda o'qiyotgan so'rov faylni topadi (resolve eski/yangi ikkalasini
+    tekshiradi). Qayta ishga tushirish xavfsiz — ko'chganlar filtrdan o'tmaydi.
+    """
+    A = models.Attachment
+    rows = db.execute(
+        select(A.id, A.storage_key, A.filename)
+        .where(A.id > after, or_(A.storage_key.is_(None), ~A.storage_key.like("__/__/%")))
+        .order_by(A.id)
+        .limit(batch)
+    ).all()
+    res = {"rows": len(rows), "moved": 0, "missing": 0,
+           "last_id": rows[-1].id if rows else after, "done": len(rows) < batch}
+    updates, olds = [], []
+    for r in rows:
+        key = key_of(r.storage_key, r.filename)
+        try:
+            old, new_k = path_of(key), shard_key(key)
+            new = path_of(new_k)
+        except ValueError:
+            res["missing"] += 1
+            continue
+        if not os.path.isfile(old):
+            if os.path.isfile(new):
+                updates.append({"id": r.id, "storage_key": new_k})
+            else:
+                res["missing"] += 1  # dangling — scan hisobotida ko'rinadi
+            continue
+        if not _place(old, new):
+            new_k = new_key(os.path.splitext(key)[1].lstrip("."))  # nom to'qnashuvi
+            new = path_of(new_k)
+            _place(old, new)
+        updates.append({"id": r.id, "storage_key": new_k})
+        olds.append(old)
+    if updates:
+        db.execute(update(A), updates)
+        db.commit()
+    for old in olds:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    res["moved"] = len(updates)
+    return res
+
+
+def migrate(db: Session, batch: int = STORAGE_MIGRATE_BATCH, pause: float = 0,
+            max_batches: Optional[int] = None) -> dict:
+    total = {"rows": 0, "moved": 0, "missing": 0, "batches": 0}
+    after = 0
+    while max_batches is None or total["batches"] < max_batches:
+        res = migrate_batch(db, after, batch)
+        after = res["last_id"]
+        total["batches"] += 1
+        for k in ("rows", "moved", "missing"):
+            total[k] += res[k]
+        if res["done"]:
+            break
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def sha256_file(path: str, chunk: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(chunk):
+            h.update(block)
+    return h.hexdigest()
+
+
+def walk(root: str = _ROOT) -> Iterator[tuple]:
+    """(key, DirEntry) — faqat fayllar; xotirada faqat kataloglar steki."""
+    skip = os.path.normpath(STORAGE_QUARANTINE_DIR)
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                if e.name.startswith("."):
+                    continue
+                if e.is_dir(follow_symlinks=False):
+                    if os.path.normpath(e.path) != skip:
+                        stack.append(e.path)
+                elif e.is_file(follow_symlinks=False):
+                    yield os.path.relpath(e.path, root).replace(os.sep, "/"), e
+
+
+def _chunks(it, n):
+    it = iter(it)
+    while chunk := list(islice(it, n)):
+        yield chunk
+
+
+class ScanReport:
+    """Topilmalarni JSON qatorlar sifatida yozadi va sanaydi."""
+
+    def __init__(self, out=None):
+        self.out = out
+        self.counts: dict = {}
+
+    def add(self, kind: str, n: int = 1) -> None:
+        self.counts[kind] = self.counts.get(kind, 0) + n
+
+    def emit(self, issue: str, /, **data) -> None:
+        self.add(issue)
+        if self.out is not None:
+            self.out.write(json.dumps({"issue": issue, **data}, ensure_ascii=False, default=str) + "\n")
+
+
+def _quarantine(key: str, stamp: str) -> str:
+    dst = os.path.join(STORAGE_QUARANTINE_DIR, stamp, key)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    shutil.move(path_of(key), dst)  # bir FS da os.rename
+    return dst
+
+
+class _Ref:
+    """Fayl egasi: attachments yoki attachments_archive qatori (asl rasm ham)."""
+    __slots__ = ("id", "size", "checksum_sha256", "archived")
+
+    def __init__(self, id_, size, checksum, archived):
+        self.id, self.size, self.checksum_sha256, self.archived = id_, size, checksum, archived
+
+
+def _owners(db: Session, keys: list) -> dict:
+    """key -> _Ref. Arxivlangan buyurtmalar fayllari ham band (restore ularga tayanadi)."""
+    found = {}
+    for t, archived in ((models.Attachment.__table__, False), (models.attachments_archive, True)):
+        c = t.c
+        for r in db.execute(
+            select(c.id, c.storage_key, c.filename, c.size, c.checksum_sha256,
+                   c.original_key, c.original_size)
+            .where(or_(c.storage_key.in_(keys),
+                       c.original_key.in_(keys),
+                       and_(c.storage_key.is_(None), c.filename.in_(keys))))
+        ):
+            found.setdefault(key_of(r.storage_key, r.filename),
+                             _Ref(r.id, r.size, r.checksum_sha256, archived))
+            if r.original_key:
+                # normalizatsiyadan oldingi asl rasm (IMAGE_KEEP_ORIGINAL)
+                found.setdefault(r.original_key, _Ref(r.id, r.original_size, None, archived))
+    return found
+
+
+def scan_files(db: Session, pool: ThreadPoolExecutor, rep: ScanReport, *,
+               verify_hash: bool = False, fill_checksums: bool = False,
+               quarantine: bool = False, min_age: int = STORAGE_ORPHAN_MIN_AGE_SEC,
+               batch: int = STORAGE_SCAN_BATCH) -> None:
+    """Diskdagi fayllar -> qatorlar: yetim fayllar, hajm/hash farqlari."""
+    A = models.Attachment
+    cutoff = time.time() - min_age
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    for chunk in _chunks(walk(), batch):
+        rows = _owners(db, [k for k, _ in chunk])
+
+        def check(item):
+            key, entry = item
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                return key, None, None, None  # skan paytida o'chirildi
+            row = rows.get(key)
+            digest = None
+            if row is not None and (verify_hash and row.checksum_sha256
+                                    or fill_checksums and not row.checksum_sha256
+                                    and not row.archived):
+                digest = sha256_file(entry.path)
+            return key, st, row, digest
+
+        fills = []
+        for key, st, row, digest in pool.map(check, chunk):
+            rep.add("files")
+            if st is None:
+                continue
+            if row is None:
+                if st.st_mtime > cutoff:
+                    rep.add("young_unmatched")  # qatori hali commit bo'lmagan bo'lishi mumkin
+                    continue
+                data = {"key": key, "size": st.st_size}
+                if quarantine:
+                    data["moved_to"] = _quarantine(key, stamp)
+                rep.emit("orphan_file", **data)
+                continue
+            if row.archived:
+                rep.add("archived_files")
+            if row.size is not None and row.size != st.st_size:
+                rep.emit("size_mismatch", id=row.id, key=key, expected=row.size, actual=st.st_size,
+                         archived=row.archived)
+            if digest is not None:
+                if row.checksum_sha256 and row.checksum_sha256 != digest:
+                    rep.emit("hash_mismatch", id=row.id, key=key, archived=row.archived,
+                             expected=row.checksum_sha256, actual=digest)
+                elif not row.checksum_sha256:
+                    fills.append({"id": row.id, "checksum_sha256": digest})
+        if fills:
+            db.execute(update(A), fills)
+            db.commit()
+            rep.add("checksums_filled", len(fills))
+
+
+def scan_rows(db: Session, pool: ThreadPoolExecutor, rep: ScanReport, *,
+              prune: bool = False, batch: int = STORAGE_SCAN_BATCH) -> None:
+    """Qatorlar -> disk: fayli yo'q (dangling) qatorlar. Arxiv qatorlari faqat hisobotda."""
+    for t, archived in ((models.Attachment.__table__, False), (models.attachments_archive, True)):
+        _scan_table_rows(db, pool, rep, t, archived=archived,
+                         prune=prune and not archived, batch=batch)
+
+
+def _scan_table_rows(db: Session, pool: ThreadPoolExecutor, rep: ScanReport, t, *,
+                     archived: bool, prune: bool, batch: int) -> None:
+    c = t.c
+    pk = c.archive_id if archived else c.id
+    cols = (c.id, c.order_id, c.kind, c.storage_key, c.filename, c.original_name,
+            c.mime, c.size, c.checksum_sha256, c.created_at)
+
+    def exists(r) -> bool:
+        try:
+            return os.path.isfile(path_of(key_of(r.storage_key, r.filename)))
+        except ValueError:
+            return False
+
+    last = 0
+    while True:
+        rows = db.execute(
+            select(pk.label("_pk"), *cols).where(pk > last).order_by(pk).limit(batch)).all()
+        if not rows:
+            break
+        last = rows[-1]._pk
+        rep.add("archived_rows" if archived else "rows", len(rows))
+        dangling = [r for r, ok in zip(rows, pool.map(exists, rows)) if not ok]
+        for r in dangling:
+            # to'liq qator hisobotda qoladi — kerak bo'lsa qayta tiklash mumkin
+            data = {k: getattr(v, "value", v) for k, v in r._mapping.items() if k != "_pk"}
+            rep.emit("dangling_row", pruned=prune, archived=archived, **data)
+        if prune and dangling:
+            db.execute(delete(t).where(c.id.in_([r.id for r in dangling])))
+            db.commit()
+
+
+def scan(db: Session, out=None, *, workers: int = STORAGE_SCAN_WORKERS, **opts) -> dict:
+    rep = ScanReport(out)
+    t0 = time.perf_counter()
+    prune = opts.pop("prune_dangling", False)
+    batch = opts.get("batch", STORAGE_SCAN_BATCH)
+    with ThreadPoolExecutor(max(1, workers), thread_name_prefix="scan") as pool:
+        scan_files(db, pool, rep, **opts)
+        scan_rows(db, pool, rep, prune=prune, batch=batch)
+    return {"root": _ROOT, "elapsed_sec": round(time.perf_counter() - t0, 2), **rep.counts}
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Fayl ombori: tekshiruv va tozalash")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    mp = sub.add_parser("migrate", help="eski fayllarni ab/cd/<nom> ga ko'chirish")
+    mp.add_argument("--batch", type=int, default=STORAGE_MIGRATE_BATCH)
+    mp.add_argument("--pause", type=float, default=0.0, help="batchlar orasida kutish (s)")
+    mp.add_argument("--max-batches", type=int, default=None)
+    sp = sub.add_parser("scan", help="yetim fayllar va fayli yo'q qatorlar")
+    sp.add_argument("--workers", type=int, default=STORAGE_SCAN_WORKERS)
+    sp.add_argument("--batch", type=int, default=STORAGE_SCAN_BATCH)
+    sp.add_argument("--min-age", type=int, default=STORAGE_ORPHAN_MIN_AGE_SEC,
+                    help="shundan yosh (soniya) fayllar yetim hisoblanmaydi")
+    sp.add_argument("--verify-hash", action="store_true")
+    sp.add_argument("--fill-checksums", action="store_true")
+    sp.add_argument("--quarantine", action="store_true")
+    sp.add_argument("--prune-dangling", action="store_true")
+    sp.add_argument("--report", default="-", help="JSON qatorlar fayli (standart: stdout)")
+    args = ap.parse_args(argv)
+
+    from app.database import SessionLocal, init_db
+    from app import cache
+    from app.events import bus
+    init_db()
+    # API keshlari bu jarayon yozuvlarini ham ko'rsin (EVENTS_BROKER_URL orqali)
+    cache.install(SessionLocal)
+    bus.start()
+    if args.cmd == "migrate":
+        db = SessionLocal()
+        try:
+            print(json.dumps(migrate(db, args.batch, args.pause, args.max_batches)))
+        finally:
+            db.close()
+        return
+    out = sys.stdout if args.report == "-" else open(args.report, "w", encoding="utf-8")
+    db = SessionLocal()
+    try:
+        summary = scan(db, out, workers=args.workers, batch=args.batch, min_age=args.min_age,
+                       verify_hash=args.verify_hash, fill_checksums=args.fill_checksums,
+                       quarantine=args.quarantine, prune_dangling=args.prune_dangling)
+        print(json.dumps({"summary": summary}, ensure_ascii=False), file=sys.stderr)
+    finally:
+        db.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
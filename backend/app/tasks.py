@@ -0,0 +1,114 @@
+# app/tasks.py
+"""
+Fon vazifalari handlerlari (app/jobs.py). Worker va API shu modulni import
+qiladi — handlerlar ro'yxatdan o'tadi.
+
+Handlerlar idempotent bo'lishi kerak: lease tugab qayta olinsa yoki commit'dan
+oldin worker o'lsa, vazifa yana bajariladi.
+"""
+import hashlib
+import os
+import shutil
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app import images, models, storage
+from app.config import (
+    IMAGE_KEEP_ORIGINAL,
+    QR_DIR,
+    STORAGE_MIGRATE_PAUSE_SEC,
+    UPLOAD_SESSION_CLEANUP_SEC,
+)
+from app.jobs import enqueue, handler
+
+
+@handler("qr.render")
+def render_qr(db: Session, payload: dict) -> None:
+    """payload: doc_id, url, filename — PNG ni QR_DIR ga yozib, qr_filename ni to'ldiradi."""
+    import qrcode  # og'ir (PIL) — faqat kerak bo'lganda yuklaymiz
+
+    filename = os.path.basename(payload["filename"])
+    path = os.path.join(QR_DIR, filename)
+    tmp = path + ".tmp"
+    qrcode.make(payload["url"]).save(tmp, format="PNG")
+    os.replace(tmp, path)  # yarim yozilgan fayl /static/qr da ko'rinmasin
+    db.execute(
+        update(models.VerifiedDoc)
+        .where(models.VerifiedDoc.id == payload["doc_id"])
+        .values(qr_filename=filename)
+    )
+
+
+@handler("file.delete")
+def delete_file(db: Session, payload: dict) -> None:
+    """payload: path — fayl yo'q bo'lsa ham muvaffaqiyatli (idempotent)."""
+    try:
+        os.remove(payload["path"])
+    except FileNotFoundError:
+        pass
+
+
+@handler("storage.migrate")
+def migrate_storage(db: Session, payload: dict) -> None:
+    """payload: after — bitta batch, qolgan bo'lsa o'zini keyingi batch uchun qayta qo'yadi."""
+    res = storage.migrate_batch(db, after=int(payload.get("after") or 0))
+    if not res["done"]:
+        enqueue(db, "storage.migrate", {"after": res["last_id"]}, delay=STORAGE_MIGRATE_PAUSE_SEC)
+
+
+@handler("uploads.cleanup")
+def cleanup_upload_sessions(db: Session, payload: dict) -> None:
+    """Muddati o'tgan bo'laklab yuklash sessiyalari; har UPLOAD_SESSION_CLEANUP_SEC da."""
+    from app.routers.upload_sessions import cleanup_expired
+
+    cleanup_expired(db)
+    enqueue(db, "uploads.cleanup", {}, delay=UPLOAD_SESSION_CLEANUP_SEC)
+
+
+@handler("image.normalize")
+def normalize_image(db: Session, payload: dict) -> None:
+    """
+    payload: attachment_id — rasmni o'sha kalit ostida almashtiradi (berilgan
+    /files havolalari ishlashda davom etadi), asl hajm original_size ga yoziladi.
+    """
+    att = db.get(models.Attachment, payload["attachment_id"])
+    if att is None or att.normalized_at or not images.wants_normalize(att.mime):
+        return
+    src = storage.resolve(att)
+    if src is None:
+        return  # fayl yo'q — scan hisobotida ko'rinadi
+    att.original_size = os.path.getsize(src)
+    att.normalized_at = datetime.utcnow()
+    data = images.normalize(src, att.mime)
+    if data is None:
+        return
+
+    original = None
+    if IMAGE_KEEP_ORIGINAL:
+        # asl nusxa yangi kalitga (hardlink — nusxa ko'chirilmaydi)
+        original = storage.new_key(os.path.splitext(src)[1].lstrip("."))
+        dst = storage.path_of(original)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+        att.original_key = original
+    att.size = len(data)
+    att.checksum_sha256 = hashlib.sha256(data).hexdigest()
+    # nuqtali vaqtinchalik fayl: scan/walk va /files uni ko'rmaydi
+    tmp = os.path.join(os.path.dirname(src), f".{os.path.basename(src)}.tmp")
+    try:
+        with open(tmp, "wb") as out:
+            out.write(data)
+        db.flush()
+        # commit'dan oldin: commit yiqilsa vazifa qayta ishlaydi va allaqachon
+        # normallangan faylni ko'rib o'zgartirmaydi (normalize -> None)
+        os.replace(tmp, src)
+    except Exception:
+        storage.remove_quietly(tmp)
+        if original:
+            storage.remove_quietly(storage.path_of(original))
+        raise
@@ -1,8 +1,26 @@
 from passlib.context import CryptContext
-from jose import jwt
+from jose import jwt, JWTError
 from datetime import datetime, timedelta
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.orm import Session
 from app.config import JWT_SECRET, JWT_ALG
+from app.database import get_session
+from app import models
 pwd=CryptContext(schemes=["bcrypt"], deprecated="auto")
 def hash_pw(p): return pwd.hash(p)
 def verify_pw(p,h): return pwd.verify(p,h)
 def create_token(sub:str, minutes=60*8): return jwt.encode({"sub":sub,"exp":datetime.utcnow()+timedelta(minutes=minutes)}, JWT_SECRET, algorithm=JWT_ALG)
+
+bearer=HTTPBearer(auto_error=False)
+def decode_token(token:str)->int|None:
+    try: return int(jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG]).get("sub"))
+    except (JWTError, TypeError, ValueError): return None
+def get_current_user(cred:HTTPAuthorizationCredentials|None=Depends(bearer), db:Session=Depends(get_session))->models.User:
+    uid=decode_token(cred.credentials) if cred else None
+    user=db.get(models.User, uid) if uid else None
+    if not user: raise HTTPException(401,"Avtorizatsiya talab qilinadi")
+    return user
+def require_admin(user:models.User=Depends(get_current_user))->models.User:
+    if user.role!=models.Role.admin: raise HTTPException(403,"Faqat admin uchun")
+    return user
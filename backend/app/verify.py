@@ -3,7 +3,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Form
 from sqlalchemy.orm import Session
 from datetime import date as ddate
-import os, qrcode
+import os
 
 from app.database import get_session
 from app import models
@@ -43,6 +43,7 @@ def create_verified_doc(
     os.makedirs(QR_DIR, exist_ok=True)
     qr_name = f"{public_id}.png"
     qr_path = os.path.join(QR_DIR, qr_name)
+    import qrcode  # og'ir (PIL) — faqat kerak bo'lganda yuklaymiz
     img = qrcode.make(verify_url)
     img.save(qr_path)
 
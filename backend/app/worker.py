@@ -0,0 +1,50 @@
+# app/worker.py
+"""
+Alohida fon vazifalari worker'i:
+
+    python -m app.worker                 # doimiy ishlaydi (Ctrl+C — to'xtash)
+    python -m app.worker --once          # navbat bo'shaguncha bajarib chiqadi
+    python -m app.worker --concurrency 4
+
+Bir nechta worker (va API ichidagi JOBS_EMBEDDED_WORKER) bir vaqtda ishlashi
+mumkin — navbatdan olish atomar (app/jobs.py).
+"""
+import argparse
+import logging
+import signal
+
+from app import cache, tasks  # noqa: F401  (tasks: handlerlarni ro'yxatdan o'tkazadi)
+from app.config import EVENTS_BROKER_URL, JOB_CONCURRENCY, JOB_POLL_SEC, LOG_LEVEL, ensure_dirs
+from app.database import SessionLocal, init_db
+from app.events import bus
+from app.jobs import Worker
+
+log = logging.getLogger(__name__)
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Fon vazifalari worker'i")
+    ap.add_argument("--concurrency", type=int, default=JOB_CONCURRENCY)
+    ap.add_argument("--poll", type=float, default=JOB_POLL_SEC)
+    ap.add_argument("--once", action="store_true", help="navbat bo'shaganda chiqish")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    ensure_dirs()
+    init_db()
+    # vazifalar orders/attachments ga yozadi — API keshlari broker orqali eskiradi
+    cache.install(SessionLocal)
+    bus.start()
+    if not EVENTS_BROKER_URL:
+        log.warning("EVENTS_BROKER_URL berilmagan: API jarayonlari bu worker yozuvlarini "
+                    "keshda ko'rmaydi — broker bering yoki API'da CACHE_ENABLED=0")
+    worker = Worker(SessionLocal, concurrency=args.concurrency, poll=args.poll)
+    signal.signal(signal.SIGTERM, lambda *_: worker._stop.set())
+    try:
+        worker.run(once=args.once)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# bench/ — sintetik ma'lumotlar generatori va end-to-end benchmark
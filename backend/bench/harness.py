@@ -0,0 +1,293 @@
+# bench/harness.py
+"""
+End-to-end benchmark: har bir router bo'yicha ssenariylarni ishlatib,
+throughput, p50/p95/p99 va so'rov boshiga SQL statementlar sonini chiqaradi.
+
+    cd backend
+    DATABASE_URL=sqlite:///./bench.db python -m bench.datagen --scale 10k --reset
+    DATABASE_URL=sqlite:///./bench.db python -m bench.harness --requests 200
+    # Postgres bilan ham xuddi shunday, faqat DATABASE_URL boshqa
+    # Ishlab turgan uvicorn'ga qarshi (METRICS_ENABLED=1 bo'lsa Server-Timing'dan SQL soni olinadi):
+    python -m bench.harness --base-url http://127.0.0.1:8000
+
+Odatiy rejimda FastAPI TestClient ishlatiladi (tarmoqsiz, bitta jarayon), SQL
+statementlar engine hodisasi orqali sanaladi. --json natijani faylga yozadi —
+ikki yugurishni solishtirib regressiyani raqamda ko'rish uchun.
+
+attachments.download faqat diskda fayli bor qo'shimchalar bilan ishlaydi
+(datagen --write-files); fayllar bo'lmasa ssenariy o'tkazib yuboriladi.
+events.connect (SSE: ulanish -> birinchi kadr) faqat --base-url bilan:
+TestClient cheksiz oqim tugashini kutib qoladi.
+
+Keshlar (app/cache.py, refdata): bir xil parametrli takroriy so'rovlar keshdan
+qaytadi va SQL'ni o'lchamaydi. --cache off (keshsiz), on (iliq kesh) yoki both
+(odatiy: har ssenariy ikki marta, alohida qatorlarda, keshli qatorda hit rate
+bilan). --base-url bilan keshni server boshqaradi — keshsiz raqamlar uchun
+serverni CACHE_ENABLED=0 bilan ishga tushiring.
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from sqlalchemy import event, select
+
+from app import cache, models, refdata, storage
+from app.database import SessionLocal, engine
+
+_SERVER_TIMING_RE = re.compile(r'desc="(\d+) queries"')
+
+
+class _StatementCounter:
+    """
+    TestClient endpointni boshqa threadda bajaradi, shuning uchun umumiy hisoblagich:
+    ssenariy oxirida jami / so'rovlar soni olinadi (warmup hisobga kirmaydi).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.total += 1
+
+
+counter = _StatementCounter()
+
+
+class Fixture:
+    """Ssenariylar uchun real id'lar (seed bo'yicha tanlanadi)."""
+
+    def __init__(self, rng: random.Random, sample: int = 500):
+        db = SessionLocal()
+        try:
+            self.order_ids = list(db.scalars(
+                select(models.Order.id).where(models.Order.deleted_at.is_(None))
+                .order_by(models.Order.id.desc()).limit(sample)))
+            # faqat fayli mavjudlari — aks holda download 404 ni o'lchaydi
+            self.attachment_ids = [
+                a.id for a in db.execute(
+                    select(models.Attachment.id, models.Attachment.storage_key,
+                           models.Attachment.filename)
+                    .order_by(models.Attachment.id.desc()).limit(sample))
+                if storage.resolve(a)
+            ]
+            self.public_ids = list(db.scalars(
+                select(models.VerifiedDoc.public_id).limit(sample)))
+            days = db.scalars(
+                select(models.Order.created_at).order_by(models.Order.id.desc()).limit(1)).first()
+            self.last_day = days.date() if days else date.today()
+        finally:
+            db.close()
+        if not self.order_ids:
+            raise SystemExit("Buyurtmalar yo'q — avval `python -m bench.datagen` ni ishga tushiring")
+        self.rng = rng
+
+    def order(self):
+        return self.rng.choice(self.order_ids)
+
+    def attachment(self):
+        return self.rng.choice(self.attachment_ids)
+
+    def public_id(self):
+        return self.rng.choice(self.public_ids) if self.public_ids else "missing"
+
+
+def scenarios(fx: Fixture, include_writes: bool, live: bool):
+    """
+    (nom, (method, path, kwargs) qaytaruvchi funksiya) ro'yxati va o'tkazib
+    yuborilganlar {nom: sabab}. kwargs["sse"] — oqimning birinchi qatorigacha.
+    """
+    day = fx.last_day
+    month_ago = day - timedelta(days=30)
+    month = day.strftime("%Y-%m")
+    skipped = {}
+    s = [
+        ("auth.login", lambda: ("POST", "/auth/login",
+                                {"json": {"username": "bench-admin@lt.uz", "password": "admin"}})),
+        ("orders.list", lambda: ("GET", "/orders", {"params": {"size": 50}})),
+        ("orders.list.debt", lambda: ("GET", "/orders", {"params": {"debt_only": True}})),
+        ("orders.list.partial", lambda: ("GET", "/orders", {"params": {"payment_state": "PARTIAL"}})),
+        ("orders.list.search", lambda: ("GET", "/orders", {"params": {"q": "Mijoz 12"}})),
+        ("orders.get", lambda: ("GET", f"/orders/{fx.order()}", {})),
+        ("orders.by_date", lambda: ("GET", "/orders/by-date", {"params": {"date": str(day)}})),
+        ("orders.stats", lambda: ("GET", "/orders/stats/payments",
+                                  {"params": {"granularity": "monthly"}})),
+        ("orders.debt_aging", lambda: ("GET", "/orders/stats/debt-aging", {})),
+        ("orders.facets", lambda: ("GET", "/orders/facets", {})),
+        ("orders.facets.debt", lambda: ("GET", "/orders/facets", {"params": {"debt_only": True}})),
+        ("orders.calendar", lambda: ("GET", "/orders/calendar", {"params": {"month": month}})),
+        ("orders.calendar.deadline", lambda: ("GET", "/orders/calendar",
+                                              {"params": {"month": month, "mode": "deadline"}})),
+        ("dashboard.summary", lambda: ("GET", "/dashboard/summary", {})),
+        ("orders.export.month", lambda: ("GET", "/orders/export",
+                                         {"params": {"created_from": str(month_ago)}})),
+        ("orders.attachments", lambda: ("GET", f"/orders/{fx.order()}/attachments", {})),
+        ("comments.list", lambda: ("GET", f"/orders/{fx.order()}/comments", {})),
+        ("clients.list", lambda: ("GET", "/clients", {"params": {"q": "Mijoz 1"}})),
+        ("verify.view", lambda: ("GET", f"/verify/{fx.public_id()}", {})),
+    ]
+    if fx.attachment_ids:
+        s.append(("attachments.download",
+                  lambda: ("GET", f"/attachments/{fx.attachment()}/download", {})))
+    else:
+        skipped["attachments.download"] = "diskda fayllar yo'q (datagen --write-files)"
+    if live:
+        s.append(("events.connect", lambda: ("GET", "/orders/events", {"sse": True})))
+    else:
+        skipped["events.connect"] = "SSE faqat --base-url bilan"
+    if include_writes:
+        s += [
+            ("payments.add", lambda: ("POST", f"/payments/{fx.order()}",
+                                      {"json": {"amount": 1000, "method": "naqd", "note": "bench"}})),
+            ("orders.status", lambda: ("PATCH", f"/orders/{fx.order()}/status",
+                                       {"json": {"status": "jarayonda"}})),
+            ("comments.add", lambda: ("POST", f"/orders/{fx.order()}/comments",
+                                      {"json": {"text": "bench", "author": "bench"}})),
+        ]
+    return s, skipped
+
+
+def _set_cache(enabled: bool) -> None:
+    """TestClient rejimida keshni yoqadi/o'chiradi va bo'shatadi
+    (config.CACHE_ENABLED import paytida o'qilgan — modul nusxalarini almashtiramiz)."""
+    cache.CACHE_ENABLED = refdata.CACHE_ENABLED = enabled
+    for c in cache._caches:
+        c.clear()
+    refdata._snapshot = None
+
+
+def _cache_counts() -> tuple:
+    hits = sum(c.hits for c in cache._caches)
+    return hits, hits + sum(c.misses for c in cache._caches)
+
+
+def _percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def _call(client, method, path, kw):
+    if kw.pop("sse", False):
+        with client.stream(method, path, **kw) as r:
+            next(r.iter_lines(), None)
+        return r
+    r = client.request(method, path, **kw)
+    _ = r.content
+    return r
+
+
+def run_scenario(client, make, requests: int, concurrency: int, warmup: int):
+    for _ in range(warmup):
+        _call(client, *make())
+
+    def one(_):
+        method, path, kw = make()
+        t = time.perf_counter()
+        r = _call(client, method, path, kw)
+        elapsed = time.perf_counter() - t
+        m = _SERVER_TIMING_RE.search(r.headers.get("server-timing", ""))
+        return elapsed, int(m.group(1)) if m else None, r.status_code
+
+    before = counter.total
+    hits0, lookups0 = _cache_counts()
+    t0 = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(one, range(requests)))
+    else:
+        results = [one(i) for i in range(requests)]
+    wall = time.perf_counter() - t0
+    timed = [r[1] for r in results if r[1] is not None]
+    if timed:
+        queries = statistics.fmean(timed)
+    else:
+        queries = (counter.total - before) / requests if requests else 0
+
+    lat = sorted(r[0] * 1000 for r in results)
+    errors = sum(1 for r in results if r[2] >= 500)
+    hits1, lookups1 = _cache_counts()
+    lookups = lookups1 - lookups0
+    return {
+        "requests": requests,
+        "rps": round(requests / wall, 1) if wall else 0,
+        "p50_ms": round(_percentile(lat, 50), 2),
+        "p95_ms": round(_percentile(lat, 95), 2),
+        "p99_ms": round(_percentile(lat, 99), 2),
+        "mean_ms": round(statistics.fmean(lat), 2) if lat else 0,
+        "queries_per_req": round(queries, 1),
+        "errors_5xx": errors,
+        "cache_hit_rate": round((hits1 - hits0) / lookups, 2) if lookups else None,
+        "status": sorted({r[2] for r in results}),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lingua CRM end-to-end benchmark")
+    ap.add_argument("--requests", type=int, default=100, help="har bir ssenariy uchun")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--warmup", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--only", default="", help="vergul bilan ssenariy nomlari (prefiks)")
+    ap.add_argument("--writes", action="store_true", help="yozuvchi ssenariylarni ham qo'shish")
+    ap.add_argument("--base-url", default="", help="TestClient o'rniga ishlab turgan server")
+    ap.add_argument("--cache", choices=("off", "on", "both"), default="both",
+                    help="TestClient rejimida keshsiz / iliq kesh bilan / ikkalasi")
+    ap.add_argument("--json", default="", help="natijani JSON faylga yozish")
+    args = ap.parse_args()
+
+    if args.base_url:
+        import httpx
+        client = httpx.Client(base_url=args.base_url, timeout=120)
+        modes = ["server"]
+    else:
+        from fastapi.testclient import TestClient
+        from app.main import app
+        client = TestClient(app)
+        client.__enter__()
+        event.listen(engine, "after_cursor_execute", counter)
+        modes = {"off": ["nocache"], "on": ["cache"], "both": ["nocache", "cache"]}[args.cache]
+
+    fx = Fixture(random.Random(args.seed))
+    only = [x.strip() for x in args.only.split(",") if x.strip()]
+    dialect = engine.dialect.name
+    print(f"dialect={dialect} orders(sample)={len(fx.order_ids)} "
+          f"requests={args.requests} concurrency={args.concurrency}")
+    print(f"{'scenario':24} {'cache':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'q/req':>7} {'hit%':>5}  status")
+
+    selected, skipped = scenarios(fx, args.writes, live=bool(args.base_url))
+    report = {"dialect": dialect, "args": vars(args), "results": {}, "skipped": {}}
+    for name, reason in skipped.items():
+        if not only or any(name.startswith(o) for o in only):
+            report["skipped"][name] = reason
+            print(f"{name:24} o'tkazib yuborildi: {reason}", flush=True)
+    for name, make in selected:
+        if only and not any(name.startswith(o) for o in only):
+            continue
+        for mode in modes:
+            if mode != "server":
+                _set_cache(mode == "cache")
+            res = run_scenario(client, make, args.requests, args.concurrency, args.warmup)
+            report["results"].setdefault(name, {})[mode] = res
+            hit = "-" if res["cache_hit_rate"] is None else int(res["cache_hit_rate"] * 100)
+            print(f"{name:24} {mode:>7} {res['rps']:>8} {res['p50_ms']:>8} {res['p95_ms']:>8} "
+                  f"{res['p99_ms']:>8} {res['queries_per_req']:>7} {hit:>5}  {res['status']}",
+                  flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
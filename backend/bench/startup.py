@@ -0,0 +1,97 @@
+# bench/startup.py
+"""
+Worker "sovuq start" vaqtini o'lchaydi: har bir urinish yangi python jarayonida.
+
+    cd backend
+    python -m bench.startup --runs 10
+    DATABASE_URL=postgresql+psycopg://... python -m bench.startup --json startup.json
+
+Bosqichlar:
+    import_ms    — `import app.main` (DB'ga ulanmasligi kerak)
+    lifespan_ms  — lifespan startup: papkalar, init_db, broker
+    first_ms     — birinchi GET /health
+    process_ms   — jarayon ishga tushishidan chiqishgacha (interpreter bilan)
+Qo'shimcha tekshiruv: importdan keyin qrcode/PIL yuklanmagan bo'lishi kerak.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+heavy = sorted(m for m in ("qrcode", "PIL", "openpyxl") if m in sys.modules)
+from fastapi.testclient import TestClient
+client = TestClient(app.main.app)
+t2 = time.perf_counter()
+client.__enter__()
+t3 = time.perf_counter()
+r = client.get("/health")
+t4 = time.perf_counter()
+client.__exit__(None, None, None)
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "lifespan_ms": (t3 - t2) * 1000,
+    "first_ms": (t4 - t3) * 1000,
+    "status": r.status_code,
+    "modules": len(sys.modules),
+    "heavy_imported": heavy,
+}))
+"""
+
+PHASES = ("import_ms", "lifespan_ms", "first_ms", "process_ms")
+
+
+def run_once(env) -> dict:
+    t = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND_ROOT, env=env,
+                         capture_output=True, text=True)
+    process_ms = (time.perf_counter() - t) * 1000
+    if out.returncode != 0:
+        sys.exit(f"child failed:\n{out.stderr[-2000:]}")
+    # oxirgi qator — JSON (oldingi print'lar diagnostika bo'lishi mumkin)
+    res = json.loads(out.stdout.strip().splitlines()[-1])
+    res["process_ms"] = process_ms
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lingua CRM startup benchmark")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--json", default="", help="natijani JSON faylga yozish")
+    args = ap.parse_args()
+
+    env = dict(os.environ)
+    runs = [run_once(env) for _ in range(args.runs)]
+
+    summary = {
+        phase: {
+            "min": round(min(r[phase] for r in runs), 1),
+            "median": round(statistics.median(r[phase] for r in runs), 1),
+            "max": round(max(r[phase] for r in runs), 1),
+        }
+        for phase in PHASES
+    }
+    print(f"runs={args.runs} modules={runs[-1]['modules']} "
+          f"heavy_imported={runs[-1]['heavy_imported'] or 'none'}")
+    print(f"{'phase':12} {'min':>8} {'median':>8} {'max':>8}")
+    for phase in PHASES:
+        s = summary[phase]
+        print(f"{phase:12} {s['min']:>8} {s['median']:>8} {s['max']:>8}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"runs": runs, "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
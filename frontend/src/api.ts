@@ -71,6 +71,97 @@ api.interceptors.response.use(
 
 export default api
 
+// ===================== ORDER EVENTS (SSE) =====================
+
+export const ORDER_EVENT_TYPES = [
+    'order.status',
+    'order.payment_state',
+    'order.payment_method',
+    'order.deleted',
+    'orders.bulk',
+    'orders.archived',
+    'order.restored',
+    'payment.added',
+    'payments.imported',
+    'attachment.added',
+    'attachment.deleted',
+    'comment.added',
+    'comment.deleted',
+    'reset',
+] as const
+
+/**
+ * Подписка на /orders/events. EventSource сам переподключается и шлёт
+ * Last-Event-ID, так что пропущенные события догоняются с сервера.
+ * Возвращает функцию отписки.
+ */
+export function subscribeOrderEvents(onEvent: (type: string, data: any) => void) {
+    if (typeof EventSource === 'undefined') return () => { }
+    const es = new EventSource(`${baseURL}/orders/events`)
+    const handler = (ev: MessageEvent) => {
+        let data: any = {}
+        try {
+            data = JSON.parse(ev.data || '{}')
+        } catch { }
+        onEvent(ev.type, data)
+    }
+    ORDER_EVENT_TYPES.forEach(t => es.addEventListener(t, handler as EventListener))
+    return () => es.close()
+}
+
+// ===================== CALENDAR =====================
+
+export interface CalendarDay {
+    date: string
+    orders: number
+    total_amount: number
+    paid_amount: number
+    outstanding: number
+    debtors: number
+    overdue: number
+}
+
+export interface CalendarMonth {
+    month: string
+    mode: 'created' | 'deadline'
+    totals: Omit<CalendarDay, 'date'>
+    days: CalendarDay[]
+}
+
+/** Oy bo'yicha kunlik yig'indilar; kun qatorlari — /orders/by-date */
+export async function fetchOrderCalendar(
+    month: string,
+    mode: 'created' | 'deadline' = 'created'
+) {
+    const { data } = await api.get<CalendarMonth>('/orders/calendar', {
+        params: { month, mode },
+    })
+    return data
+}
+
+// ===================== FACETS =====================
+
+export type OrderFacet =
+    | 'status' | 'payment_state' | 'branch' | 'manager'
+    | 'customer_type' | 'doc_type' | 'country'
+
+export interface FacetValue {
+    value: string | number | null
+    label: string | null
+    count: number
+}
+
+export interface OrderFacets {
+    total: number
+    facets: Record<OrderFacet, FacetValue[]>
+}
+
+/** Filtrlar uchun qiymatlar soni; parametrlar — GET /orders bilan bir xil */
+export async function fetchOrderFacets(params: Record<string, unknown> = {}) {
+    const { data } = await api.get<OrderFacets>('/orders/facets', { params })
+    return data
+}
+
 // ===================== COMMENTS API =====================
 
 export interface CommentOut {
@@ -86,12 +177,28 @@ export interface CommentCreate {
     author?: string
 }
 
-/** Получить комментарии заказа */
-export async function fetchComments(orderId: number) {
-    const { data } = await api.get<CommentOut[]>(
-        `/orders/${orderId}/comments`
+export interface CommentsPage {
+    items: CommentOut[]
+    /** before_id для следующей страницы; null — больше нет */
+    nextCursor: number | null
+}
+
+/** Страница комментариев (новые первыми), курсор — X-Next-Cursor */
+export async function fetchCommentsPage(
+    orderId: number,
+    opts: { limit?: number; beforeId?: number | null } = {}
+): Promise<CommentsPage> {
+    const { data, headers } = await api.get<CommentOut[]>(
+        `/orders/${orderId}/comments`,
+        { params: { limit: opts.limit ?? 50, before_id: opts.beforeId ?? undefined } }
     )
-    return data
+    const next = headers['x-next-cursor']
+    return { items: data, nextCursor: next ? Number(next) : null }
+}
+
+/** Получить комментарии заказа (первая страница) */
+export async function fetchComments(orderId: number, limit = 50) {
+    return (await fetchCommentsPage(orderId, { limit })).items
 }
 
 /** Добавить комментарий (через объект) */
@@ -123,6 +230,37 @@ export async function deleteComment(
     await api.delete(`/orders/${orderId}/comments/${commentId}`)
 }
 
+// ===================== PAYMENTS API =====================
+
+export interface PaymentIn {
+    amount: number
+    method: string
+    paid_at?: string
+    note?: string
+}
+
+export interface PaymentResult {
+    ok: boolean
+    payment_id: number
+    paid_amount: number
+    payment_state: string
+    replayed?: boolean
+}
+
+/** Ключ для Idempotency-Key: один на одно действие пользователя (повтор — тот же ключ) */
+export function newIdempotencyKey(): string {
+    if (typeof crypto !== 'undefined' && 'randomUUID' in crypto) return crypto.randomUUID()
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+}
+
+/** Добавить оплату; повторный запрос с тем же ключом не создаст вторую оплату */
+export async function addPayment(orderId: number, body: PaymentIn, idempotencyKey?: string) {
+    const { data } = await api.post<PaymentResult>(`/payments/${orderId}`, body, {
+        headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined,
+    })
+    return data
+}
+
 // ===================== ATTACHMENTS API =====================
 
 export type AttachmentKind = 'translation' | 'apostille' | 'notary'
@@ -142,6 +280,115 @@ export async function fetchOrderAttachments(orderId: number) {
     return Array.isArray(data) ? data : []
 }
 
+export interface AttachmentCounts {
+    order_id: number
+    total: number
+    by_kind: Record<string, number>
+}
+
+/** Количество файлов по видам (без загрузки списка) */
+export async function fetchAttachmentCounts(orderId: number) {
+    const { data } = await api.get<AttachmentCounts>(
+        `/orders/${orderId}/attachments/counts`
+    )
+    return data
+}
+
+export interface UploadResult {
+    name: string
+    ok: boolean
+    id?: number
+    kind?: string
+    size?: number
+    error?: string
+}
+
+export interface UploadBatchResult {
+    ok: boolean
+    uploaded: number
+    failed: number
+    results: UploadResult[]
+}
+
+/** Файлы больше порога идут через возобновляемую загрузку по частям */
+export const RESUMABLE_THRESHOLD = 8 * 1024 * 1024
+
+/**
+ * Возобновляемая загрузка: сессия + части с Upload-Offset. При обрыве связи
+ * спрашиваем у сервера текущий offset и продолжаем с него, а не с нуля.
+ */
+export async function uploadFileResumable(
+    orderId: number | string,
+    file: File,
+    kind?: AttachmentKind | string,
+    onProgress?: (sent: number, total: number) => void,
+    retries = 5
+): Promise<UploadResult> {
+    const base = `/orders/${orderId}/uploads`
+    const { data: s } = await api.post<{ upload_id: string; chunk_size: number }>(base, {
+        filename: file.name,
+        size: file.size,
+        mime: file.type || undefined,
+        kind,
+    })
+    let offset = 0
+    let fails = 0
+    while (offset < file.size) {
+        try {
+            const { data } = await api.put<{ offset: number }>(
+                `${base}/${s.upload_id}`,
+                file.slice(offset, offset + s.chunk_size),
+                { headers: { 'Upload-Offset': String(offset), 'Content-Type': 'application/octet-stream' } }
+            )
+            offset = data.offset
+            fails = 0
+            onProgress?.(offset, file.size)
+        } catch (e: any) {
+            const status = e?.response?.status
+            if ((status && status !== 409 && status < 500) || ++fails > retries) throw e
+            await new Promise(r => setTimeout(r, 1000 * fails))
+            const { data } = await api.get<{ offset: number }>(`${base}/${s.upload_id}`)
+            offset = data.offset
+        }
+    }
+    const { data } = await api.post<{ id: number; kind: string; size: number }>(
+        `${base}/${s.upload_id}/complete`
+    )
+    return { name: file.name, ok: true, id: data.id, kind: data.kind, size: data.size }
+}
+
+/** Несколько файлов одним запросом (до MAX_FILES_PER_UPLOAD на сервере); большие — по частям */
+export async function uploadOrderFiles(
+    orderId: number | string,
+    files: File[],
+    kind?: AttachmentKind | string
+) {
+    const small = files.filter(f => f.size <= RESUMABLE_THRESHOLD)
+    const large = files.filter(f => f.size > RESUMABLE_THRESHOLD)
+    const results: UploadResult[] = []
+    if (small.length) {
+        const fd = new FormData()
+        for (const f of small) fd.append('files', f)
+        if (kind) fd.append('kind', kind)
+        const { data } = await api.post<UploadBatchResult>(`/orders/${orderId}/upload/batch`, fd)
+        results.push(...data.results)
+    }
+    for (const f of large) {
+        try {
+            results.push(await uploadFileResumable(orderId, f, kind))
+        } catch (e: any) {
+            const detail = e?.response?.data?.detail
+            results.push({ name: f.name, ok: false, error: typeof detail === 'string' ? detail : 'Yuklashda xato' })
+        }
+    }
+    const uploaded = results.filter(r => r.ok).length
+    return { ok: uploaded === results.length, uploaded, failed: results.length - uploaded, results } as UploadBatchResult
+}
+
+/** Текст ошибок по неудачным файлам (null — всё загружено) */
+export const uploadErrors = (r: UploadBatchResult) =>
+    r.failed ? r.results.filter(x => !x.ok).map(x => `${x.name}: ${x.error}`).join('\n') : null
+
 /** Помощник для прямой ссылки на скачивание файла */
 export const buildAttachmentDownloadUrl = (id: number) =>
     `${baseURL}/attachments/${id}/download`
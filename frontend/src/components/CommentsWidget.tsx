@@ -1,7 +1,7 @@
 ﻿import { useEffect, useState } from "react";
 import dayjs from "dayjs";
 import {
-    fetchComments,
+    fetchCommentsPage,
     addComment,
     deleteComment,
     type CommentOut,
@@ -25,17 +25,26 @@ export default function CommentsWidget({
     const [text, setText] = useState("");
     const [loading, setLoading] = useState(false);
     const [sending, setSending] = useState(false);
+    const [nextCursor, setNextCursor] = useState<number | null>(null);
 
     const load = async () => {
         setLoading(true);
         try {
-            const rows = await fetchComments(orderId);
-            setComments(rows);
+            const page = await fetchCommentsPage(orderId);
+            setComments(page.items);
+            setNextCursor(page.nextCursor);
         } finally {
             setLoading(false);
         }
     };
 
+    const loadMore = async () => {
+        if (nextCursor == null) return;
+        const page = await fetchCommentsPage(orderId, { beforeId: nextCursor });
+        setComments((prev) => [...prev, ...page.items]);
+        setNextCursor(page.nextCursor);
+    };
+
     useEffect(() => {
         if (orderId) load();
         // eslint-disable-next-line react-hooks/exhaustive-deps
@@ -113,6 +122,14 @@ export default function CommentsWidget({
                     ))}
                 </ul>
             )}
+            {nextCursor != null && (
+                <button
+                    onClick={loadMore}
+                    className="mt-3 text-sm text-blue-600 hover:underline"
+                >
+                    Ko‘proq ko‘rsatish
+                </button>
+            )}
         </div>
     );
 }
@@ -2,7 +2,7 @@
 import { useEffect, useMemo, useState } from "react";
 import dayjs from "dayjs";
 import {
-    fetchComments,
+    fetchCommentsPage,
     addCommentText,
     deleteComment,
     type CommentOut,
@@ -74,13 +74,21 @@ export default function OrderDrawer({ order, open, onClose, currentUser }: Props
     // ===== комментарии =====
     const [comments, setComments] = useState<CommentOut[]>([]);
     const [text, setText] = useState("");
+    const [nextCursor, setNextCursor] = useState<number | null>(null);
 
+    // сервер отдаёт новые первыми, по страницам
     const loadComments = async () => {
         if (!order?.id) return;
-        const data = await fetchComments(order.id);
-        // сортировка по убыванию даты
-        data.sort((a, b) => (a.created_at < b.created_at ? 1 : -1));
-        setComments(data);
+        const page = await fetchCommentsPage(order.id);
+        setComments(page.items);
+        setNextCursor(page.nextCursor);
+    };
+
+    const loadMoreComments = async () => {
+        if (!order?.id || nextCursor == null) return;
+        const page = await fetchCommentsPage(order.id, { beforeId: nextCursor });
+        setComments((p) => [...p, ...page.items]);
+        setNextCursor(page.nextCursor);
     };
 
     useEffect(() => {
@@ -194,6 +202,14 @@ export default function OrderDrawer({ order, open, onClose, currentUser }: Props
                             <div className="text-sm text-gray-500">Hozircha izoh yo‘q.</div>
                         )}
                     </ul>
+                    {nextCursor != null && (
+                        <button
+                            onClick={loadMoreComments}
+                            className="mt-3 text-sm text-gray-600 hover:underline"
+                        >
+                            Ko‘proq ko‘rsatish
+                        </button>
+                    )}
                 </div>
             </div>
         </div>
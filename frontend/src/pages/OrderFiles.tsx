@@ -1,7 +1,7 @@
 ﻿// frontend/src/pages/OrderFiles.tsx
 import { useParams, Link as RLink } from 'react-router-dom'
 import { useEffect, useState } from 'react'
-import api, { API_BASE } from '../api'   // ⬅️ API_BASE import
+import api, { API_BASE, uploadErrors, uploadOrderFiles } from '../api'   // ⬅️ API_BASE import
 
 type FileRow = { id: number; display_name: string; size: number }
 
@@ -26,11 +26,11 @@ export default function OrderFiles() {
 
     useEffect(() => { load() }, [id])
 
-    const uploadOne = async (file: File) => {
-        const fd = new FormData()
-        fd.append('file', file)
-        await api.post(`/orders/${id}/upload`, fd)
-         
+    // barcha tanlangan fayllar bitta so'rovda
+    const uploadMany = async (list: FileList) => {
+        const res = await uploadOrderFiles(id!, Array.from(list))
+        const errors = uploadErrors(res)
+        if (errors) alert(errors)
     }
 
     const handleDrop = async (e: React.DragEvent<HTMLDivElement>) => {
@@ -38,7 +38,7 @@ export default function OrderFiles() {
         setDragging(false)
         if (!e.dataTransfer.files?.length) return
         try {
-            for (const f of Array.from(e.dataTransfer.files)) await uploadOne(f)
+            await uploadMany(e.dataTransfer.files)
             await load()
         } catch (e: any) {
             alert(e?.response?.data?.detail || 'Yuklashda xato')
@@ -48,7 +48,7 @@ export default function OrderFiles() {
     const pickFiles = async (e: React.ChangeEvent<HTMLInputElement>) => {
         if (!e.target.files?.length) return
         try {
-            for (const f of Array.from(e.target.files)) await uploadOne(f)
+            await uploadMany(e.target.files)
             e.target.value = ''
             await load()
         } catch (e: any) {
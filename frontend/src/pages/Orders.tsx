@@ -1,6 +1,6 @@
-import { useCallback, useEffect, useMemo, useState } from 'react'
+import { useCallback, useEffect, useMemo, useRef, useState } from 'react'
 import { Link } from 'react-router-dom'
-import api from '../api'
+import api, { addPayment, newIdempotencyKey, subscribeOrderEvents } from '../api'
 import PaymentStateSelect from '../components/PaymentStateSelect'
 import OrderStatusSelect from '../components/OrderStatusSelect'
 import OrderDrawer from '../components/OrderDrawer'
@@ -25,6 +25,8 @@ type Row = {
     balance: number
     payment_method: string
     status: string
+    comments_count?: number
+    last_comment_at?: string | null
 }
 
 const METHODS = ['naqd', 'terminal', "o`tkazma", 'payme'] as const
@@ -102,6 +104,21 @@ export default function Orders() {
         load()
     }, [load])
 
+    // boshqa menejerlarning o'zgarishlari: SSE hodisasi kelsa ro'yxatni yangilaymiz
+    const reloadTimer = useRef<ReturnType<typeof setTimeout> | null>(null)
+    // qatordagi kiritilgan to'lov uchun Idempotency-Key: xato/qayta bosishda o'sha kalit
+    const payKeys = useRef<Record<number, { sig: string; key: string }>>({})
+    useEffect(() => {
+        const unsubscribe = subscribeOrderEvents(() => {
+            if (reloadTimer.current) clearTimeout(reloadTimer.current)
+            reloadTimer.current = setTimeout(() => { load() }, 300)
+        })
+        return () => {
+            unsubscribe()
+            if (reloadTimer.current) clearTimeout(reloadTimer.current)
+        }
+    }, [load])
+
     const setMethodInput = useCallback(async (id: number, val: Method) => {
         setEditMethod(prev => ({ ...prev, [id]: val })) // оптимистично
         try {
@@ -123,7 +140,11 @@ export default function Orders() {
         const method: Method = editMethod[row.id] || (row.payment_method as Method) || 'naqd'
         setSaving(s => ({ ...s, [row.id]: true }))
         try {
-            await api.post(`/payments/${row.id}`, { amount: add, method, note: 'jadvaldan kiritildi' })
+            const sig = `${add}|${method}`
+            let pk = payKeys.current[row.id]
+            if (!pk || pk.sig !== sig) pk = payKeys.current[row.id] = { sig, key: newIdempotencyKey() }
+            await addPayment(row.id, { amount: add, method, note: 'jadvaldan kiritildi' }, pk.key)
+            delete payKeys.current[row.id]
             setEditPaid(p => {
                 const copy = { ...p }
                 delete copy[row.id]
@@ -266,6 +287,14 @@ export default function Orders() {
                                         >
                                             {r.client_name}
                                         </button>
+                                        {!!r.comments_count && (
+                                            <span
+                                                className="ml-2 inline-block rounded-full bg-gray-100 px-2 text-xs text-gray-600"
+                                                title={r.last_comment_at ? `Oxirgi izoh: ${r.last_comment_at}` : undefined}
+                                            >
+                                                {r.comments_count} izoh
+                                            </span>
+                                        )}
                                     </td>
 
                                     <td className="px-4 py-3">{r.client_phone}</td>
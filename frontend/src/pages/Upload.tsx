@@ -1,6 +1,6 @@
 import { useParams, useNavigate } from 'react-router-dom'
 import { useEffect, useMemo, useRef, useState } from 'react'
-import api /*, { API_BASE } */ from '../api'
+import api, { uploadErrors, uploadOrderFiles } /*, { API_BASE } */ from '../api'
 
 type AttachmentKind = 'translation' | 'apostille' | 'notary'
 
@@ -49,7 +49,7 @@ export default function Upload() {
     const [filesByKind, setFilesByKind] = useState<Record<AttachmentKind, Attachment[]>>(
         makeRecord<Attachment[]>(() => []),
     )
-    const [selected, setSelected] = useState<Record<AttachmentKind, File | null>>(makeRecord<File | null>(null))
+    const [selected, setSelected] = useState<Record<AttachmentKind, File[]>>(makeRecord<File[]>(() => []))
     const [messages, setMessages] = useState<Record<AttachmentKind, string | null>>(makeRecord<string | null>(null))
     const [busy, setBusy] = useState<Record<AttachmentKind, boolean>>(makeRecord(false))
     const [loading, setLoading] = useState(false)
@@ -92,28 +92,28 @@ export default function Upload() {
     }, [id])
 
     const handleFileChange = (kind: AttachmentKind, files: FileList | null) => {
-        const file = files?.[0] || null
-        setSelected(prev => ({ ...prev, [kind]: file }))
+        setSelected(prev => ({ ...prev, [kind]: files ? Array.from(files) : [] }))
         setMessages(prev => ({ ...prev, [kind]: null }))
     }
 
     const uploadOne = async (kind: AttachmentKind) => {
         if (!id) return
-        const file = selected[kind]
-        if (!file) {
+        const files = selected[kind]
+        if (!files.length) {
             setMessages(prev => ({ ...prev, [kind]: 'Fayl tanlang' }))
             return
         }
-        const fd = new FormData()
-        fd.append('f', file)
-        fd.append('kind', kind)
 
         setBusy(prev => ({ ...prev, [kind]: true }))
         setMessages(prev => ({ ...prev, [kind]: null }))
         try {
-            await api.post(`/orders/${id}/upload`, fd)
-            setMessages(prev => ({ ...prev, [kind]: '✅ Fayl yuklandi' }))
-            setSelected(prev => ({ ...prev, [kind]: null }))
+            // barcha tanlangan fayllar bitta so'rovda
+            const res = await uploadOrderFiles(id, files, kind)
+            setMessages(prev => ({
+                ...prev,
+                [kind]: uploadErrors(res) ?? (res.uploaded > 1 ? `✅ ${res.uploaded} ta fayl yuklandi` : '✅ Fayl yuklandi'),
+            }))
+            setSelected(prev => ({ ...prev, [kind]: [] }))
             if (fileRefs.current[kind]) {
                 fileRefs.current[kind]!.value = ''
             }
@@ -200,12 +200,13 @@ export default function Upload() {
                                     fileRefs.current[kind] = el
                                 }}
                                 type="file"
+                                multiple
                                 accept=".pdf,.jpg,.jpeg,.png"
                                 onChange={e => handleFileChange(kind, e.target.files)}
                             />
                             <button
                                 onClick={() => uploadOne(kind)}
-                                disabled={busy[kind] || !selected[kind]}
+                                disabled={busy[kind] || !selected[kind].length}
                                 style={{
                                     background: busy[kind] ? '#374151' : '#111827',
                                     cursor: busy[kind] ? 'not-allowed' : 'pointer',